@@ -1,11 +1,21 @@
 """Main entry point for minesweeper game."""
 
 import os, sys
+import json
 
 from .board import Board, BOMB
 from .game import MineSweeperGame
+from .bitboard import BitboardGame
+from .chunked import ChunkedBoard, ChunkedGame
 from .render import render_interactive_board
 from .ai import MineSweeperAI
+from .runner import run_batch
+from .corpus import BoardCorpus, open_corpus
+from .batched import BatchedGames, BatchedAI
+from .autoplay import AutoPlayer
+from .trace import Trace, TraceWriter
+from .server import GameServer
+from .client import GameClient, RemoteGame
 
 
 # ----------------------------------------------------------------------------------
@@ -20,28 +30,49 @@ def interactive():
 
 # ----------------------------------------------------------------------------------
 # Batch mode to gather stats.
-def batch():
+def batch(workers=None, seed=None, stats_file=None, corpus=None, trace_dir=None):
+    """Play a batch of games with the AI and print statistics about how it did.
+
+    Parameters:
+        workers: The number of processes to play games in, None for one per CPU
+        seed: The base seed for the batch, None to pick one at random
+        stats_file: A path to write per-game timers and counters to, as one JSON object per
+                    line, or None to leave instrumentation off
+        corpus: The path of a corpus file (see corpus.py) to play the boards of, rather than
+                generating new ones
+        trace_dir: A directory to record every move of every game to, one trace file per game
+                   (see trace.py), for replaying them later without the AI
+    """
 
     NUM_GAMES     = 100
     BOARD_WIDTH   = 100
     BOARD_HEIGHT  = 100
     BOARD_DENSITY = 0.2
 
+    if corpus:
+        boards = open_corpus(corpus)
+        NUM_GAMES     = min(NUM_GAMES, len(boards))
+        BOARD_WIDTH   = boards.width
+        BOARD_HEIGHT  = boards.height
+        BOARD_DENSITY = boards.density
+
     # 100 games
     log_wins = []
     log_moves = []
-    for i in range(NUM_GAMES):
+    stats_out = open(stats_file, "w") if stats_file else None
+    for i, result in enumerate(run_batch(NUM_GAMES, BOARD_WIDTH, BOARD_HEIGHT, BOARD_DENSITY,
+                                         workers=workers, seed=seed, stats=stats_out is not None,
+                                         corpus=corpus, trace_dir=trace_dir)):
 
-        board = Board(BOARD_WIDTH, BOARD_HEIGHT, BOARD_DENSITY)
-        game  = MineSweeperGame(board)
-        ai    = MineSweeperAI(game)
+        if stats_out:
+            stats_out.write(json.dumps(result) + "\n")
 
-        while not game.finished:
-            ai.move()
+        log_wins.append(result["won"])
+        log_moves.append(result["moves"])
+        print(f"[{i}/{NUM_GAMES}] game {result['index']} win? {result['won']}, moves: {result['moves']}")
 
-        log_wins.append(game.won)
-        log_moves.append(game.moves)
-        print(f"[{i}/{NUM_GAMES}] win? {game.won}, moves: {game.moves}")
+    if stats_out:
+        stats_out.close()
 
     # Print summary
     print(f"Board with {BOARD_WIDTH}x{BOARD_HEIGHT} WxH, mine density={BOARD_DENSITY}")
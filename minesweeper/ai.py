@@ -3,21 +3,111 @@
 The structure does not actually separate the AI from the game/board through a standard Player
 interface, meaning the AI can cheat if it wishes.  It doesn't, though.  Honest."""
 
-from .game import FLAGGED
+import time
+from itertools import islice
+
+from .board import BOMB
+import numpy as np
+
+from .game import FLAGGED, OBSERVED_UNKNOWN, OBSERVED_STATES
+from .probability import ProbabilityEngine
+from .sampling import MonteCarloEstimator
+from .deduction import ConstraintSystem
+from .stats import make_stats
+
+# Kinds of entry in the AI's journal, see #MineSweeperAI.snapshot: a cell of the view changed, a
+# number queued on the worklist, a hidden number dropped from the frontier and worklist, certain
+# moves forgotten, the sets of cells copied before a move, and the view read afresh
+_SEEN    = 0
+_QUEUED  = 1
+_DROPPED = 2
+_UNSURE  = 3
+_SETS    = 4
+_RESYNC  = 5
+
+
+class ProbabilityMap:
+    """The estimates the heuristic stage made for every unknown cell: its chance of being a mine
+    (or, for the "local" heuristic, its score).
+
+    Only the cells along the frontier have estimates of their own, and every other unknown cell
+    shares one, so the map costs memory in proportion to the frontier rather than the board.
+    It is never changed once made."""
+
+    def __init__(self, probabilities, other, width, height):
+        """Create a map of the estimates given.
+
+        Parameters:
+            probabilities: Maps cells (by index y * width + x) to their estimate
+            other: The estimate for any unknown cell not in probabilities
+            width: The width of the board, in cells
+            height: The height of the board, in cells
+        """
+
+        self.probabilities = dict(probabilities)
+        self.other         = other
+        self.width         = width
+        self.height        = height
+
+        # The cells with estimates of their own, sorted, and their estimates, for #window
+        self.cells  = np.sort(np.fromiter(self.probabilities, dtype=np.int64, count=len(self.probabilities)))
+        self.values = np.array([self.probabilities[i] for i in self.cells.tolist()], dtype=np.float64)
+
+    def estimate(self, x, y):
+        """The estimate for cell x, y, assuming it is unknown."""
+
+        return self.probabilities.get(y * self.width + x, self.other)
+
+    def window(self, columns, rows):
+        """The estimates for the cells in the sorted arrays of columns and rows given, assuming
+        they are unknown, as a (len(rows), len(columns)) array of floats."""
+
+        columns, rows = np.asarray(columns, dtype=np.int64), np.asarray(rows, dtype=np.int64)
+        window        = np.full((len(rows), len(columns)), self.other, dtype=np.float64)
+        if len(self.cells) and len(columns) and len(rows):
+            ys, xs = np.divmod(self.cells, self.width)
+            i = np.minimum(np.searchsorted(rows, ys), len(rows) - 1)
+            j = np.minimum(np.searchsorted(columns, xs), len(columns) - 1)
+            inside = (rows[i] == ys) & (columns[j] == xs)
+            window[i[inside], j[inside]] = self.values[inside]
+
+        return window
+
 
 class MineSweeperAI:
     """An AI for minesweeper.  self-documenting code, innit."""
 
-    def __init__(self, game, board_density_threshold=0.2):
+    def __init__(self, game, board_density_threshold=0.2, heuristic="local", linear_deduction=True,
+                 stats=False, slice_size=256):
         """Create a new MineSweeperAI to play the game given on the board given.
 
         Parameters:
             game: The game object to play
             board_density_threshold: The proportion (0-1) of the board seen before the AI will use
                                      observed bombs to estimate remaining bomb probabilities.
+            heuristic: How to pick a move when nothing can be deduced for certain.  "local" scores
+                       unknown cells from the numbers next to them, "exact" computes the true
+                       probability of a mine in every unknown cell (see probability.py) and
+                       falls back to "local" if the frontier is too tangled to solve, and
+                       "sampled" estimates those probabilities within a time budget (see
+                       sampling.py), however big the frontier.
+            linear_deduction: True to look for certain moves across overlapping numbers (see
+                              deduction.py) before resorting to the heuristic.
+            stats: True to record timers and counters for each stage of a move in self.stats
+                   (see stats.py)
+            slice_size: When #move is given a deadline or action limit, the most numbered cells
+                        to look at between checks of it.  Smaller slices keep closer to the
+                        deadline, bigger ones waste less time checking.
         """
 
         self.game  = game
+        self.width = game.board_width()
+
+        self.num_cells = game.board_width() * game.board_height()
+
+        # Lookup of every cell's neighbours, shared with the board; cells are addressed by index
+        # y * width + x
+        self.neighbours = game.board.neighbours
 
         # Behaviour params
 
@@ -25,202 +115,440 @@ class MineSweeperAI:
         # of seeing a mine in an unknown square
         self.board_density_threshold = board_density_threshold
 
-    @staticmethod
-    def _write_with_limit(obj, x, y, val):
-        """Given a 2D array, obj structured such that obj[y][x] accesses row x and column y,
-        write val into the array iff x and y are within the bounds of the array.
+        # Which heuristic stage to run when the deterministic solver is stuck
+        self.heuristic          = heuristic
+        self.probability_engine = ProbabilityEngine()
+        self.sampler            = MonteCarloEstimator()
+        self.linear_deduction   = linear_deduction
+
+        # Incremental view of the board, kept in step with the game by the changes it publishes
+        # after every move (ours or anyone else's).  view[y * width + x] holds the last observed
+        # game.cell(x, y) of every revealed or flagged cell; unknown cells are left out.
+        self.view = None
+        # Numbered cells that still touch at least one unknown cell
+        self.frontier = set()
+        # Numbered cells whose surroundings have changed since we last looked at them
+        self.worklist = set()
+        # Running totals of unknown and flagged cells in the view
+        self.unknown_count = 0
+        self.flag_count    = 0
+        # Constraints from every frontier number, kept reduced between moves
+        self.constraint_system = None
+
+        # Cells found to be certainly mines or certainly safe, not yet flagged or clicked because
+        # a move ran out of time or actions
+        self.pending_flags  = set()
+        self.pending_clicks = set()
+        # Whether the last call to #move stopped part way through, and if so whether it had
+        # already acted; the next call carries on with the same move
+        self.in_progress = False
+        self.acted       = False
+        # The limits on the current call to #move, see there
+        self.slice_size   = slice_size
+        self.deadline     = None
+        self.actions_left = None
+
+        # The ProbabilityMap the heuristic stage last worked out, see #_publish_probabilities
+        self.probability_map = None
+
+        # Undo log of changes since the first live snapshot, or None when there isn't one, and
+        # whether the sets of cells have been saved in it since the last snapshot; see #snapshot
+        self.journal    = None
+        self.sets_saved = False
+
+        self.stats = make_stats(stats)
+
+        self.game.subscribe(self._observe, snapshots=self)
+
+    def snapshot(self):
+        """Take a snapshot of what the AI knows, that #restore can later return it to.
+
+        The game calls this whenever a snapshot of it is taken (see MineSweeperGame#snapshot),
+        so that restoring the game puts the AI back as it was too, rather than leaving it to
+        work out its constraints again from the whole view.  As for the game, this starts a
+        journal of the changes made to the view, frontier and worklist as moves are observed,
+        and the constraint system takes a snapshot of its own, so both cost in proportion to
+        the cells changed in between.  Should the AI move before the snapshot is restored, its
+        sets of cells are copied into the journal as it starts.
 
-        Parameters:
-            obj: The 2D array to write into
-            x: The row offset, 0-based
-            y: The column offset, 0-based
-            val: The value to insert into the array, if in bounds
+        Returns:
+            An opaque token to pass to #restore
         """
 
-        if x < 0 or x >= len(obj[0]):
-            return
-        if y < 0 or y >= len(obj):
-            return
-
-        obj[y][x] = val
+        if self.journal is None:
+            self.journal = []
+        self.sets_saved = False
 
-    @staticmethod
-    def _count_adjacent(obj, x, y, condition, skip_centre=True):
-        """Given a 2D array, obj, such that obj[y][x] addresses column y at row x, count all
-        cells such that condition(value) is true for all cells in a ring around x, y.
+        system = self.constraint_system
+        return (len(self.journal), self.view, self.unknown_count, self.flag_count, system,
+                system.snapshot() if system is not None else None, self.in_progress, self.acted,
+                self.probability_map)
 
-        This returns not just the count of cells, but also the cell addresses themselves as
-        tuples of (x, y).  If skip_centre is set to True, we'll miss x,y itself.
+    def restore(self, snapshot):
+        """Return the AI to what it knew when a snapshot was taken.
 
-        Essentially, we run condition like this:
-          condition(obj[y-1][x-1])
-          condition(obj[y-1][x])
-          condition(obj[y-1][x+1])
-          ...
-        and count one if condition(...) is truthy.
+        The game calls this as it is restored, before telling the AI of the cells it changed
+        back, which then agree with the view and are passed over.
 
         Parameters:
-            obj: The 2D array to write into
-            x: The row offset, 0-based
-            y: The column offset, 0-based
-            condition: A procedure to call with the value of obj[][] surrounding x,y
-            skip_centre: True to avoid counting x,y itself
-
-        Returns:
-            count: A number showing how many times condition was true.  <=8 if skip_centre, else <=9
-            which: A list of (x,y) tuples showing condition(obj[y][x]) == True
+            snapshot: A token returned by #snapshot
         """
 
-        count = 0
-        which = []
-        for i in [-1, 0, 1]:
-            for j in [-1, 0, 1]:
+        position = snapshot[0]
+        if self.journal is None or len(self.journal) < position:
+            raise ValueError("The snapshot is no longer valid")
+
+        view = self.view
+        while len(self.journal) > position:
+            entry = self.journal.pop()
+            kind  = entry[0]
+            if kind == _SEEN:
+                _, i, old = entry
+                if old is None:
+                    view.pop(i, None)
+                else:
+                    view[i] = old
+            elif kind == _QUEUED:
+                self.worklist.discard(entry[1])
+            elif kind == _DROPPED:
+                _, i, in_frontier, in_worklist = entry
+                if in_frontier:
+                    self.frontier.add(i)
+                if in_worklist:
+                    self.worklist.add(i)
+            elif kind == _UNSURE:
+                _, self.pending_flags, self.pending_clicks = entry
+            elif kind == _SETS:
+                _, self.frontier, self.worklist, self.pending_flags, self.pending_clicks = entry
+            else:
+                view = entry[1]
+
+        (_, self.view, self.unknown_count, self.flag_count, self.constraint_system,
+         system_snapshot, self.in_progress, self.acted, self.probability_map) = snapshot
+        if system_snapshot is not None:
+            self.constraint_system.restore(system_snapshot)
+        self.sets_saved = False
+
+    def forget_snapshots(self):
+        """Stop journalling changes, invalidating every snapshot taken so far."""
+
+        self.journal = None
+        if self.constraint_system is not None:
+            self.constraint_system.forget_snapshots()
+
+    def _coords(self, i):
+        """Convert a flat cell index into an (x, y) tuple."""
+
+        return i % self.width, i // self.width
+
+    def _count_adjacent(self, obj, i, condition):
+        """Given a dict, obj, of cell states keyed by index (y * width + x), count all cells such
+        that condition(state) is true in the ring around cell i.  Cells missing from obj have
+        state None.
+
+        This returns not just the count of cells, but also the cell indices themselves.
 
-                # Skip centre
-                if i == 0 and j == 0 and skip_centre:
-                    continue
+        Parameters:
+            obj: The dict to read from
+            i: The index of the cell in the centre of the ring
+            condition: A procedure to call with the state of each cell around i
 
-                if x+i < 0 or x+i >= len(obj[0]):
-                    continue
-                if y+j < 0 or y+j >= len(obj):
-                    continue
+        Returns:
+            count: A number showing how many times condition was true, <=8
+            which: A list of indices j showing condition(obj.get(j)) == True
+        """
 
-                if condition(obj[y+j][x+i]):
-                    count += 1
-                    which.append( (x+i, y+j) )
+        which = [j for j in self.neighbours.neighbours(i) if condition(obj.get(j))]
 
-        return count, which
+        return len(which), which
 
     def _read_observable_state(self):
-        """Get observable state and basic knowledge of the board.
+        """Get the observable state of the board.
 
-        The cell list is formatted as in the board class: each entry in the array shows the status
-        of the cell as known on the board.  This may be a number 0-8 showing the number of adjacent
-        bombs, or 'f' if the cell is flagged by the user.  Bombs should never be returned as
-        observing a bomb means the game must be over.
+        The cells are formatted as in the board class: each entry shows the status of the cell as
+        known on the board.  This may be a number 0-8 showing the number of adjacent bombs, or 'f'
+        if the cell is flagged by the user.  Bombs should never be returned as observing a bomb
+        means the game must be over.
 
-        Knowledge acts as a "todo list", it's a mask showing what the AI knows, vs what it does not.
-        Cells in the knowledge array may be None, indicating total unknown state or a number between
-        0 and 1 reflecting the absolute probability that the cell contains a bomb.
+        Reads the game's observation array where it has one, in a few array operations.
+        Otherwise only revealed and flagged cells are read, so this costs as much as the part of
+        the board that has been played, not the whole board.
 
         Returns:
-            cells: A 2D array with the observable state of each cell (see above)
-            knowledge: A 2D array with knowledge about each cell
+            cells: A dict of the state of every revealed or flagged cell, keyed by y * width + x.
+                   Cells not in it are unknown.
         """
 
-        # Precompute our view of the board, censored according to revealed status
-        cells = [[self.game.cell(x, y) for x in range(self.game.board_width())] \
-                  for y in range(self.game.board_height())]
+        self.stats.count("board_reads")
 
-        # Things we know about the board, p[bomb]
-        knowledge = [[None] * self.game.board_width() for _ in range(self.game.board_height())]
+        observation = getattr(self.game, "observation", None)
+        if observation is not None:
+            codes = observation.ravel()
+            known = np.flatnonzero(codes != OBSERVED_UNKNOWN)
+            cells = {i: OBSERVED_STATES.get(code, code)
+                     for i, code in zip(known.tolist(), codes[known].tolist())}
+        else:
+            width = self.width
+            cells = {y * width + x: state for x, y, state in self.game.revealed_cell_tuples()}
+            cells.update((y * width + x, FLAGGED) for x, y in self.game.flags)
 
-        # known facts about 0 cells
-        for y in range(len(cells)):
-            for x in range(len(cells[y])):
-                # print(f"-> {x}, {y} = {cells[y][x]}")
-                #self._prob(x, y, observations)
+        self.stats.count("cells_scanned", len(cells))
 
-                state = cells[y][x]
+        return cells
 
-                # Unknown cell --- not informative
-                if state is None:
-                    continue
-                # Flagged cell --- we know it's not a bome
-                if state is FLAGGED:
-                    knowledge[y][x] = 1
-                    continue
+    @staticmethod
+    def _is_number(state):
+        """Is an observed cell state a revealed number above 0, i.e. a clue about its neighbours?"""
+
+        return state is not None and state != FLAGGED and state != BOMB and state > 0
+
+    def _resync(self):
+        """Build the incremental view from scratch by reading the board.
 
-                # Numbered cells definitely do not have bombs in
-                knowledge[y][x] = 0
+        Only needed once, before our first move; after that #_observe keeps the view current."""
+
+        self.stats.count("resyncs")
+        if self.journal is not None:
+            self.journal.append((_RESYNC, self.view))
+        with self.stats.timer("read_observable_state"):
+            self.view = self._read_observable_state()
+        self.frontier = set()
+        self.worklist = {i for i, state in self.view.items() if MineSweeperAI._is_number(state)}
+
+        self.flag_count    = sum(1 for state in self.view.values() if state == FLAGGED)
+        self.unknown_count = self.num_cells - len(self.view)
+
+        self.pending_flags  = set()
+        self.pending_clicks = set()
+
+        self._rebuild_constraints()
+
+    def _constraint(self, i):
+        """Read the constraint that the number at cell i gives about its neighbours.
+
+        Returns:
+            unknowns: A list of the indices of the unknown cells around i
+            mines: How many of those unknown cells are mines, i.e. the number less the flags
+        """
 
-                # Anything around 0 doesn't have a bomb in
-                if state == 0:
-                    MineSweeperAI._write_with_limit(knowledge, x-1, y-1, 0)
-                    MineSweeperAI._write_with_limit(knowledge, x,   y-1, 0)
-                    MineSweeperAI._write_with_limit(knowledge, x+1, y-1, 0)
-                    MineSweeperAI._write_with_limit(knowledge, x-1, y,   0)
-                    MineSweeperAI._write_with_limit(knowledge, x+1, y,   0)
-                    MineSweeperAI._write_with_limit(knowledge, x-1, y+1, 0)
-                    MineSweeperAI._write_with_limit(knowledge, x,   y+1, 0)
-                    MineSweeperAI._write_with_limit(knowledge, x+1, y+1, 0)
+        view     = self.view
+        unknowns = []
+        flags    = 0
+        for j in self.neighbours.neighbours(i):
+            neighbour = view.get(j)
+            if neighbour is None:
+                unknowns.append(j)
+            elif neighbour == FLAGGED:
+                flags += 1
 
-        return cells, knowledge
+        return unknowns, view[i] - flags
+
+    def _rebuild_constraints(self):
+        """Build the constraint system afresh from every number in the view."""
+
+        if not self.linear_deduction:
+            return
+
+        self.constraint_system = ConstraintSystem()
+        for i, state in self.view.items():
+            if MineSweeperAI._is_number(state):
+                self.constraint_system.add(i, *self._constraint(i))
+
+    def _update_constraints(self, changes):
+        """Bring the constraint system up to date with a list of changed cell indices, whose new
+        states have already been applied to the view."""
+
+        view = self.view
+
+        # Cells are known once revealed or flagged...
+        for i in changes:
+            if i in view:
+                self.constraint_system.set_value(i, 1 if view[i] == FLAGGED else 0)
+        # ...and revealed numbers bring new constraints
+        for i in changes:
+            if MineSweeperAI._is_number(view.get(i)):
+                self.constraint_system.add(i, *self._constraint(i))
+
+    def _changed(self, i):
+        """Record that cell i has changed in our view, queueing every numbered cell whose
+        surroundings (or own state) that affects."""
+
+        view     = self.view
+        worklist = self.worklist
+        journal  = self.journal
+
+        for j in (i, *self.neighbours.neighbours(i)):
+            if MineSweeperAI._is_number(view.get(j)) and j not in worklist:
+                worklist.add(j)
+                if journal is not None:
+                    journal.append((_QUEUED, j))
+
+    def _observe(self, changes):
+        """Apply a list of (x, y, state) changes published by the game to our view."""
+
+        # Not started yet; the view will be read in full on the first move
+        if self.view is None:
+            return
+
+        view      = self.view
+        journal   = self.journal
+        changed   = []
+        forgotten = False
+        for x, y, state in changes:
+            i   = y * self.width + x
+            old = view.get(i)
+
+            # Already known, e.g. a cell changed back by MineSweeperGame.restore after we were
+            # restored along with it
+            if old == state:
+                continue
+            if journal is not None:
+                journal.append((_SEEN, i, old))
+
+            self.unknown_count += (state is None) - (old is None)
+            self.flag_count    += (state == FLAGGED) - (old == FLAGGED)
+
+            # A flag removed, or a cell hidden again by MineSweeperGame.restore
+            forgotten = forgotten or (old is not None and old != state
+                                      and (old == FLAGGED or state is None))
+
+            if state is None:
+                view.pop(i, None)
+            else:
+                view[i] = state
+            self._changed(i)
+            changed.append(i)
+
+            # A hidden number no longer tells us anything
+            if state is None:
+                if journal is not None:
+                    journal.append((_DROPPED, i, i in self.frontier, i in self.worklist))
+                self.frontier.discard(i)
+                self.worklist.discard(i)
+
+        self.stats.count("changes_observed", len(changed))
+
+        # Un-knowing a cell can't be undone in the reduced constraints
+        if self.constraint_system is not None:
+            with self.stats.timer("update_constraints"):
+                if forgotten:
+                    self._rebuild_constraints()
+                    # What we were sure of may rest on what's been forgotten
+                    if journal is not None:
+                        journal.append((_UNSURE, self.pending_flags, self.pending_clicks))
+                    self.pending_flags  = set()
+                    self.pending_clicks = set()
+                else:
+                    self._update_constraints(changed)
 
     def _move_determinstic(self):
         """Deduce the moves that are guaranteed to be correct due to the hints given by
         cell numbers.
 
-        Returns only when all actions that could be taken have been taken"""
-
-        # Have we done anything to change the board this tick?
-        action_this_loop = True
-        # Have we done anything at all this method?
-        action = False
-        while action_this_loop:
-
-            cells, knowledge = self._read_observable_state()
-            action_this_loop = False
-
-            # PASS 1
-            # If a number has a certain number of unknowns, all are bombs and should be set as such
-            for y in range(len(cells)):
-                for x in range(len(cells[y])):
-
-                    state = cells[y][x]
-
-                    # Unknown cell: skip
-                    if state is None or state == FLAGGED:
-                        continue
-
-                    if state > 0:
-                        # Count adjacent unknowns
-                        adjacent_unknown_count, coords = MineSweeperAI._count_adjacent(knowledge, x, y, lambda x: x is None or x == 1)
-
-                        # If we have exactly the number of unknowns as cell number, set all to flags.
-                        # Because setting a cell as flagged in the game only affects a single cell we can keep
-                        # track of the knowledge changes by dead reckoning, no need to re-read the board
-                        if adjacent_unknown_count == state:
-                            for target_x, target_y in coords:
-                                if not self.game.cell_flagged(target_x, target_y):
-                                    self.game.toggle_flag(target_x, target_y)
-                                    action_this_loop = True
-                                    knowledge[target_y][target_x] = 1
-
-
-            # PASS 2
-            # After flagging, if something has only unknowns left, all are not bombs
-            for y in range(len(cells)):
-                for x in range(len(cells[y])):
-
-                    state = cells[y][x]
-
-                    # Unknown cell: skip
-                    if state is None or state == FLAGGED:
-                        continue
-
-                    if state > 0:
-                        # Count adjacent unknowns
-                        adjacent_flag_count, _ = MineSweeperAI._count_adjacent(knowledge, x, y, lambda x: x == 1)
-                        adjacent_unknown_count, coords = MineSweeperAI._count_adjacent(knowledge, x, y, lambda x: x is None)
-
-                        # Click to reveal those cells that are around these numbers but known to not be
-                        # bombs
-                        #
-                        # After clicking we have to re-read the board because the click could have
-                        # revealed a large area of board
-                        if adjacent_flag_count == state and adjacent_unknown_count > 0:
-                            for target_x, target_y in coords:
-                                self.game.click(target_x, target_y)
-                                action_this_loop = True
-                                knowledge[target_y][target_x] = 0
-
-            # Keep track for return of method
-            action = action_this_loop or action
+        Works through the worklist of numbered cells whose surroundings have changed, so the cost
+        depends on how much of the board changed rather than its size.  Each numbered cell is
+        checked for two cases:
+
+         1. It has exactly as many unknown-or-flagged neighbours as its number: all are bombs
+         2. It has exactly as many flagged neighbours as its number: all unknowns are safe
+
+        Returns only when all actions that could be taken have been taken, or the limits on
+        this move (see #move) have been reached"""
+
+        if self.view is None:
+            self._resync()
+
+        # Have we done anything at all this method?  Start with anything left over from last time.
+        action = self._act_pending()
+        while self.worklist and not self.game.finished and not self._exhausted():
+
+            # Decide on everything in the worklist, then act on it all in one go.  Acting
+            # refills the worklist with the numbers around whatever changed.  With limits on
+            # the move, take a slice of the worklist at a time instead.
+            to_flag  = set()
+            to_click = set()
+            if self.deadline is None and self.actions_left is None:
+                worklist, self.worklist = self.worklist, set()
+            else:
+                worklist = set(islice(self.worklist, self.slice_size))
+                self.worklist -= worklist
+            self.stats.count("deterministic_iterations")
+            self.stats.count("deterministic_cells_checked", len(worklist))
+            for i in worklist:
+                unknowns, mines = self._constraint(i)
+
+                # Nothing left to learn from this cell
+                if not unknowns:
+                    self.frontier.discard(i)
+                    continue
+                self.frontier.add(i)
+
+                # Every unknown around this number is a bomb
+                if mines == len(unknowns):
+                    to_flag.update(unknowns)
+
+                # Every bomb around this number has been found, so the rest are safe
+                elif mines == 0:
+                    to_click.update(unknowns)
+
+            self.pending_flags  |= to_flag
+            self.pending_clicks |= to_click
+            action = self._act_pending() or action
 
         # Say if we did anything during this method
         return action
 
+    def _exhausted(self):
+        """Has the current move run out of time or actions?"""
+
+        return self.actions_left == 0 or (self.deadline is not None
+                                          and time.perf_counter() >= self.deadline)
+
+    def _act_pending(self):
+        """Flag and click the cells found to be certain, as many as the current move is allowed.
+
+        Cells are flagged before any are clicked, each in reading order.  Those revealed or
+        flagged since they were found are skipped.
+
+        Returns:
+            True if anything was flagged or clicked
+        """
+
+        if not self.pending_flags and not self.pending_clicks:
+            return False
+
+        flags  = sorted(i for i in self.pending_flags if i not in self.view)
+        clicks = sorted(i for i in self.pending_clicks if i not in self.view)
+        if self.actions_left is not None:
+            flags, self.pending_flags   = flags[:self.actions_left], set(flags[self.actions_left:])
+            self.actions_left          -= len(flags)
+            clicks, self.pending_clicks = clicks[:self.actions_left], set(clicks[self.actions_left:])
+            self.actions_left          -= len(clicks)
+        else:
+            self.pending_flags  = set()
+            self.pending_clicks = set()
+
+        if flags:
+            self.game.flag_many([self._coords(i) for i in flags])
+        if clicks:
+            self.game.click_many([self._coords(i) for i in clicks])
+
+        return bool(flags or clicks)
+
+    def _move_linear(self):
+        """Find the cells made certain by combinations of overlapping numbers, and flag or click
+        them.
+
+        Returns:
+            True if we acted, else False
+        """
+
+        safe, mines = self.constraint_system.deduce()
+        self.pending_flags  |= mines
+        self.pending_clicks |= safe
+        self._act_pending()
+
+        return bool(safe or mines)
 
     def _move_heuristic(self):
         """Look at unknown cells and score them for how likely they are to be mines.
@@ -229,7 +557,9 @@ class MineSweeperAI:
 
         Returns after a single action."""
 
-        cells, knowledge = self._read_observable_state()
+        if self.view is None:
+            self._resync()
+        cells = self.view
 
         # Compute basic probability there is a mine left in any cell.
         # Do this by looking at what we know about the board, and assuming roughly uniform distribution,
@@ -239,98 +569,243 @@ class MineSweeperAI:
         #
         # FIXME: This is imperfect because cells are not entirely independent.
         num_flags = 0
-        num_unknown = 0
+        num_unknown = self.unknown_count + self.flag_count
         baseline_probability = 0
-        for y in range(len(cells)):
-            for x in range(len(cells[y])):
-                if cells[y][x] is None:
-                    num_unknown += 1
-                elif cells[y][x] is FLAGGED:
-                    num_unknown += 1
         if num_unknown > 0 and self.game.board_width() * self.game.board_height() / (num_unknown + num_flags):
             baseline_probability = num_flags / num_unknown
 
+        # Only unknown cells next to a revealed cell have anything to go on, and those are all
+        # next to the frontier.  Everything else scores the baseline.
+        constrained = sorted({j for i in self.frontier for j in self.neighbours.neighbours(i)
+                              if j not in cells})
+
         # PASS 1
         # If a number has a certain number of unknowns, all are bombs and should be set as such
         unknown_cell_penalty = {}
-        for y in range(len(cells)):
-            for x in range(len(cells[y])):
+        for i in constrained:
+
+            # Cell with adjacent unknown.  We want to discount the number of known mines
+            # around this cell, then penalise the unknown cells by however many mines are
+            # left indicated.  The sum of these overlaps will be proportional to the probability
+            # that the unknown cell is mined
+            adjacent_numbered_count, coords = self._count_adjacent(cells, i, lambda x: x is not None and x != FLAGGED)
+
+            # For each numbered cell, count the number of flags around it, and subtract
+            # that from its total
+            normalise = 0
+            for target in coords:
+                cell_number = cells[target]
+                adjacent_flag_count, _ = self._count_adjacent(cells, target, lambda x: x == FLAGGED)
+                remaining_adjacent_mines = cell_number - adjacent_flag_count
+
+                # If this number still has some knowledge remaining, allocate evenly between cells we don't know about
+                # yet.
+                if remaining_adjacent_mines == 0:
+                    continue
 
-                state = cells[y][x]
+                # We must be one of these remaining adjacent unknowns
+                remaining_unknown_count, _ = self._count_adjacent(cells, target, lambda x: x == None)
+                penalty = remaining_adjacent_mines / remaining_unknown_count
 
-                # Look at unknowns only
-                if state is not None:
-                    continue
+                if i not in unknown_cell_penalty:
+                    unknown_cell_penalty[i] = 0 # FIXME: should this been baseline_probability?
+                unknown_cell_penalty[i] += penalty
+                normalise += 1
 
-                # Cell with adjacent unknown.  We want to discount the number of known mines
-                # around this cell, then penalise the unknown cells by however many mines are
-                # left indicated.  The sum of these overlaps will be proportional to the probability
-                # that the unknown cell is mined
-                adjacent_numbered_count, coords = MineSweeperAI._count_adjacent(cells, x, y, lambda x: x is not None and x != FLAGGED)
-                # print(f"Found {adjacent_numbered_count} numbered cells near {x},{y}: {coords} => {[cells[y][x] for y, x in coords]}")
-
-                # If we find no numbered cells nearby, we simply have to guess at the basic probability
-                # that there is a mine in this cell, independent of other cells.
-                if adjacent_numbered_count == 0:
-                    unknown_cell_penalty[(x, y)] = baseline_probability
-                else:
-                    # For each numbered cell, count the number of flags around it, and subtract
-                    # that from its total
-                    normalise = 0
-                    for target_x, target_y in coords:
-                        cell_number = cells[target_y][target_x]
-                        # print(f" ## {cell_number} ({target_y}, {target_x})")
-                        adjacent_flag_count, _ = MineSweeperAI._count_adjacent(cells, target_x, target_y, lambda x: x == FLAGGED)
-                        remaining_adjacent_mines = cell_number - adjacent_flag_count
-
-                        # print(f"# [{x}, {y}] -> {target_x}, {target_y} ({cell_number} - {adjacent_flag_count})")
-                        # If this number still has some knowledge remaining, allocate evenly between cells we don't know about
-                        # yet.
-                        if remaining_adjacent_mines == 0:
-                            continue
-
-                        # We must be one of these remaining adjacent unknowns
-                        remaining_unknown_count, _ = MineSweeperAI._count_adjacent(knowledge, target_x, target_y, lambda x: x == None)
-                        penalty = remaining_adjacent_mines / remaining_unknown_count
-
-                        # print(f"{remaining_adjacent_mines=}, {penalty=}")
-                        if (x, y) not in unknown_cell_penalty:
-                            unknown_cell_penalty[(x, y)] = 0 # FIXME: should this been baseline_probability?
-                        unknown_cell_penalty[(x, y)] += penalty
-                        normalise += 1
-
-                    # Divide penalty by the number of cells that contributed it, i.e. normalise
-                    unknown_cell_penalty[(x, y)] /= normalise
+            # Every number around it already has all its mines flagged, so none of them says
+            # anything about this cell; it's left to the guess below like any unconstrained cell
+            if normalise == 0:
+                continue
 
+            # Divide penalty by the number of cells that contributed it, i.e. normalise
+            unknown_cell_penalty[i] /= normalise
+
+        # If we find no numbered cells nearby, we simply have to guess at the basic probability
+        # that there is a mine in this cell, independent of other cells.  Ties go to the first
+        # cell in reading order, so only the first such cell is worth finding.
+        unconstrained = next((i for i in range(self.num_cells)
+                              if i not in cells and i not in unknown_cell_penalty), None)
+        if unconstrained is not None:
+            unknown_cell_penalty[unconstrained] = baseline_probability
+        self._publish_probabilities(unknown_cell_penalty, baseline_probability)
 
         if len(unknown_cell_penalty) == 0:
             # Can't do anything!
             return False
 
-        # print(f" -> {unknown_cell_penalty}")
-        # Find the lowest score and click it
-        cell_coord, penalty = sorted(unknown_cell_penalty.items(), key=lambda item: item[1])[0]
-        # print(f"Lowest penalty is #{cell_coord} with penalty={penalty}")
-        self.game.click(cell_coord[0], cell_coord[1])
+        # Find the lowest score, earliest in reading order, and click it
+        cell_index, penalty = min(unknown_cell_penalty.items(), key=lambda item: (item[1], item[0]))
+        self.game.click(*self._coords(cell_index))
         return True
 
 
-    def move(self):
+    def _move_exact(self):
+        """Compute the exact probability of a mine in every unknown cell and act on it.
+
+        Any cells certain to be safe are clicked and any certain to be mines are flagged, which
+        catches patterns the deterministic solver misses.  Otherwise the least likely cell to be a
+        mine is clicked.
+
+        Returns:
+            True if we acted, False if nothing could be done, or None if the frontier was too
+            big to solve exactly and another heuristic should be tried.
+        """
+
+        # Each frontier number says how many of its unknown neighbours are mines
+        constraints = [self._constraint(i) for i in self.frontier]
+
+        result = self.probability_engine.probabilities(constraints, self.unknown_count,
+                                                       self.game.num_bombs() - self.flag_count)
+        if result is None:
+            return None
+        probabilities, other = result
+        self._publish_probabilities(probabilities, other)
+
+        # Act on everything we're certain of
+        safe  = [cell for cell, p in probabilities.items() if p == 0]
+        mines = [cell for cell, p in probabilities.items() if p == 1]
+        if safe or mines:
+            self.pending_flags  |= set(mines)
+            self.pending_clicks |= set(safe)
+            self._act_pending()
+            return True
+
+        return self._guess(probabilities, other)
+
+    def _move_sampled(self):
+        """Estimate the probability of a mine in every unknown cell by sampling, and click the
+        least likely.
+
+        Estimates are never certain, so nothing is flagged, and only one cell is clicked.
+
+        Returns:
+            True if we acted, False if nothing could be done, or None if the numbers on the
+            board could not be made sense of and another heuristic should be tried.
+        """
+
+        constraints = [self._constraint(i) for i in self.frontier]
+
+        result = self.sampler.probabilities(constraints, self.unknown_count,
+                                            self.game.num_bombs() - self.flag_count)
+        if result is None:
+            return None
+        self._publish_probabilities(*result)
+
+        return self._guess(*result)
+
+    def _publish_probabilities(self, probabilities, other):
+        """Keep the estimates the heuristic stage made as self.probability_map, a ProbabilityMap.
+
+        The map holds only the frontier's estimates, so publishing one costs the same on a board
+        far bigger than memory (see chunked.py) as on a small one.  A new map is made every time
+        rather than changing the last, so anything holding it (such as the renderer, on another
+        thread) sees a whole map or none of it.
+
+        Parameters:
+            probabilities: Maps cells to their estimate
+            other: The estimate for any unknown cell not in probabilities
+        """
+
+        self.probability_map = ProbabilityMap(probabilities, other, self.width, self.game.board_height())
+
+    def _guess(self, probabilities, other):
+        """Click the cell least likely to be a mine, either on the frontier or in the
+        unconstrained cells beyond it.
+
+        Parameters:
+            probabilities: Maps frontier cells to the probability that they are mines
+            other: The probability that any unconstrained unknown cell is a mine
+
+        Returns:
+            True if we clicked, False if there was nothing left to click
+        """
+
+        guess = None
+        if probabilities:
+            guess, p = min(sorted(probabilities.items()), key=lambda item: item[1])
+            if self.unknown_count > len(probabilities) and other < p:
+                guess = None
+        if guess is None:
+            guess = next((i for i in range(self.num_cells)
+                          if i not in self.view and i not in probabilities), None)
+        if guess is None:
+            return False
+
+        self.game.click(*self._coords(guess))
+        return True
+
+    def move(self, deadline=None, max_actions=None):
         """Interface to AI classes, acting as a request to act on the game.
 
         Because the deterministic solver calls the game class directly, this may actually move
-        more than once."""
+        more than once.  On a big board that can take a while, so the work can be limited: the
+        move then stops when it reaches the limit and carries on from there next time it's
+        called.  A single click that opens a large area can't be cut short.
+
+        Parameters:
+            deadline: A time.perf_counter() value to stop by, None for no limit
+            max_actions: The most cells to flag or click in this call, None for no limit
+
+        Returns:
+            True if the move is complete, False if it stopped at a limit and should be called
+            again to finish it
+        """
+
+        stats = self.stats
+        if self.journal is not None and not self.sets_saved:
+            self.journal.append((_SETS, set(self.frontier), set(self.worklist),
+                                 set(self.pending_flags), set(self.pending_clicks)))
+            self.sets_saved = True
+        if not self.in_progress:
+            stats.count("moves")
+            self.acted = False
+        self.in_progress  = True
+        self.deadline     = deadline
+        self.actions_left = max_actions
 
         # Attempt deterministic actions
-        action = self._move_determinstic()
+        with stats.timer("deterministic"):
+            self.acted = self._move_determinstic() or self.acted
+        if self._unfinished(self.worklist):
+            return False
+        action = self.acted
+
+        if not action and self.linear_deduction:
+            with stats.timer("linear"):
+                action = self._move_linear()
+            if self._unfinished():
+                return False
 
         if not action:
-            #print("No action from deterministic solver, using heuristics.")
-            action = self._move_heuristic() or action
-        else:
-            pass
-            #print("Determinstic solution used.")
+            # Guessing is a move of its own, so needs at least one action left
+            if self._exhausted():
+                stats.count("moves_cut_short")
+                return False
+
+            if self.heuristic == "exact":
+                stats.count("exact_calls")
+                with stats.timer("exact"):
+                    action = self._move_exact()
+                if self._unfinished():
+                    return False
+            elif self.heuristic == "sampled":
+                stats.count("sampled_calls")
+                with stats.timer("sampled"):
+                    action = self._move_sampled()
+            if not action:
+                stats.count("heuristic_calls")
+                with stats.timer("heuristic"):
+                    action = self._move_heuristic() or action
+
+        self.in_progress = False
+        return True
 
-        # DEBUG
-        # for row in knowledge:
-        #     print(" ".join([str(x)[0] for x in row]))
+    def _unfinished(self, worklist=()):
+        """Did the current move stop at its limits with certain moves still to make, or with
+        any of the worklist given still to look at?"""
+
+        if self.game.finished or not (self.pending_flags or self.pending_clicks or worklist):
+            return False
+
+        self.stats.count("moves_cut_short")
+        return True
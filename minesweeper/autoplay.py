@@ -0,0 +1,165 @@
+"""Plays a game with the AI in a background thread, so that whatever shows the game never waits
+on it.
+
+AutoPlayer owns the game while it runs: every change to it, including moves the user asks for,
+is made on the player's thread.  Anything watching the game (such as the renderer) is told of
+the changes as they happen by subscribing to the game, and otherwise only reads it, so it can
+sample the game at its own pace however long the AI takes over a move.  The player holds its
+lock while it changes the game, so anything reading more of the game than one cell at a time
+(such as the flags and revealed cells of a ChunkedGame, which are sets and dicts that change
+size as they are played) holds it too, to see the game between moves rather than during one.
+
+The AI works in short slices (see MineSweeperAI#move), so moves the user asks for are made
+between them, and the player can be paused or stopped at any point.  Autoplay can be limited to
+a number of moves (cells flagged or clicked) per second, to watch the AI at work."""
+
+import threading
+import time
+
+
+class AutoPlayer:
+    """Runs a MineSweeperAI against its game in a thread of its own."""
+
+    def __init__(self, game, ai, moves_per_second=None, time_slice=0.01):
+        """Create a player, paused; see #start.
+
+        Parameters:
+            game: The game to play
+            ai: The MineSweeperAI playing it
+            moves_per_second: The most moves to make per second when playing, None for as many
+                              as the AI can manage
+            time_slice: The most time the AI works for between checks for anything else to do,
+                        in seconds
+        """
+
+        self.game             = game
+        self.ai               = ai
+        self.moves_per_second = moves_per_second
+        self.time_slice       = time_slice
+
+        # Everything below is shared with the thread, and only changed holding the condition
+        self.wakeup   = threading.Condition()
+        self.playing  = False
+        self.stepping = False
+        self.stopping = False
+        self.requests = []
+
+        # Moves that may be made now, when limited to moves_per_second, and when that was
+        # last worked out
+        self.credit       = 0.0
+        self.credit_since = None
+
+        # Held whenever the game is being changed; see the module docs
+        self.lock = threading.Lock()
+
+        self.thread = None
+
+    def start(self):
+        """Start the player's thread.  It does nothing until asked to."""
+
+        self.thread = threading.Thread(target=self._run, name="minesweeper-autoplay", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """Stop the player's thread, waiting for it to finish what it's doing."""
+
+        with self.wakeup:
+            self.stopping = True
+            self.wakeup.notify()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def play(self):
+        """Have the AI play on until the game is over or #pause is called."""
+
+        with self.wakeup:
+            self.playing      = True
+            self.credit       = 0.0
+            self.credit_since = time.perf_counter()
+            self.wakeup.notify()
+
+    def pause(self):
+        """Stop the AI moving once it has finished the slice it's working on."""
+
+        with self.wakeup:
+            self.playing  = False
+            self.stepping = False
+
+    def toggle(self):
+        """Play if paused, or pause if playing."""
+
+        if self.playing:
+            self.pause()
+        else:
+            self.play()
+
+    def step(self):
+        """Have the AI make one move (see MineSweeperAI#move), as fast as it can."""
+
+        with self.wakeup:
+            self.stepping = True
+            self.wakeup.notify()
+
+    def click(self, x, y):
+        """Click on a cell, on the player's thread."""
+
+        self._request(self.game.click, x, y)
+
+    def toggle_flag(self, x, y):
+        """Flag or unflag a cell, on the player's thread."""
+
+        self._request(self.game.toggle_flag, x, y)
+
+    def _request(self, action, *args):
+        with self.wakeup:
+            self.requests.append((action, args))
+            self.wakeup.notify()
+
+    def _budget(self):
+        """The most moves the AI may make now, None for no limit, or 0 with the time to wait
+        until it may make one."""
+
+        if self.stepping or self.moves_per_second is None:
+            return None, 0
+
+        now  = time.perf_counter()
+        rate = self.moves_per_second
+        self.credit       = min(self.credit + (now - self.credit_since) * rate,
+                                max(1.0, rate * self.time_slice))
+        self.credit_since = now
+
+        if self.credit < 1:
+            return 0, (1 - self.credit) / rate
+        return int(self.credit), 0
+
+    def _run(self):
+        game, ai = self.game, self.ai
+        while True:
+            with self.wakeup:
+                while not (self.stopping or self.requests
+                           or ((self.playing or self.stepping) and not game.finished)):
+                    self.wakeup.wait()
+                if self.stopping:
+                    return
+                requests, self.requests = self.requests, []
+                moving = (self.playing or self.stepping) and not game.finished
+                budget, wait = self._budget() if moving else (0, None)
+                if budget == 0 and not requests:
+                    self.wakeup.wait(wait)
+                    continue
+
+            with self.lock:
+                for action, args in requests:
+                    action(*args)
+            if budget == 0 or game.finished:
+                continue
+
+            before = game.moves
+            with self.lock:
+                done = ai.move(deadline=time.perf_counter() + self.time_slice, max_actions=budget)
+            with self.wakeup:
+                if budget is not None:
+                    self.credit -= game.moves - before
+                if done:
+                    self.stepping = False
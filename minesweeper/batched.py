@@ -0,0 +1,323 @@
+"""Plays many games at once, on boards of the same size held as one stacked array.
+
+BatchedGames holds N games as (N, height, width) arrays of bombs, numbers, revealed cells and
+flags.  Clicks and flags are given as masks over the whole stack, and the flood fill behind a
+click on a 0 grows every game's regions together, one ring of cells per step, so the cost of a
+move is a handful of array operations however many games are in play.
+
+BatchedAI steps every unfinished game in lockstep with the same rules MineSweeperAI uses when
+linear deduction is off (see ai.py):
+
+ 1. A number with exactly as many unknown neighbours as mines left around it: flag them all.
+ 2. A number with all of its mines flagged: click all of its unknown neighbours.
+ 3. A game where neither applies anywhere guesses as the "local" heuristic does: the first
+    unknown cell (in reading order) not next to any number, or else the unknown cell with the
+    lowest average share of the mines left around the numbers next to it.
+
+Given the same boards it wins exactly the same games as MineSweeperAI(linear_deduction=False)
+does.  Move counts can differ slightly, since a batch of safe clicks counts every cell in it,
+where MineSweeperGame#click_many skips cells already opened by an earlier click of the batch."""
+
+import numpy as np
+
+
+def _neighbour_sum(cells):
+    """Count, for every cell of a stack of (height, width) arrays, its neighbours that are set
+    (or add up their values, for a numeric array).
+
+    The 3x3 box sum is done as a sum along rows and then along columns, which is 4 additions over
+    the stack rather than 8."""
+
+    cells = cells.astype(np.float64 if cells.dtype.kind == "f" else np.uint8)
+
+    rows = cells.copy()
+    rows[:, :, 1:]  += cells[:, :, :-1]
+    rows[:, :, :-1] += cells[:, :, 1:]
+
+    total = rows.copy()
+    total[:, 1:]  += rows[:, :-1]
+    total[:, :-1] += rows[:, 1:]
+
+    return total - cells
+
+
+def _dilate(cells):
+    """Every cell in or next to a set cell, for a stack of (height, width) boolean arrays."""
+
+    rows = cells.copy()
+    rows[:, :, 1:]  |= cells[:, :, :-1]
+    rows[:, :, :-1] |= cells[:, :, 1:]
+
+    grown = rows.copy()
+    grown[:, 1:]  |= rows[:, :-1]
+    grown[:, :-1] |= rows[:, 1:]
+
+    return grown
+
+
+class BatchedGames:
+    """N games of minesweeper on boards of the same size, played by masks over all of them."""
+
+    def __init__(self, bombs):
+        """Start a game on each of a stack of boards.
+
+        Parameters:
+            bombs: An (N, height, width) boolean array, True where there is a bomb
+        """
+
+        self.bombs  = np.asarray(bombs, dtype=bool)
+        self.counts = _neighbour_sum(self.bombs)
+        self.zeros  = (self.counts == 0) & ~self.bombs
+
+        self.revealed = np.zeros_like(self.bombs)
+        self.flagged  = np.zeros_like(self.bombs)
+
+        n = self.bombs.shape[0]
+        self.finished = np.zeros(n, dtype=bool)
+        self.won      = np.zeros(n, dtype=bool)
+        self.moves    = np.zeros(n, dtype=np.int64)
+
+    @classmethod
+    def generate(cls, num_games, width, height, density=0.2, seed=None):
+        """Start games on newly generated boards.
+
+        Board i is generated with the seed [seed, i], so is the same board as game i of a batch
+        played by run_batch with the same seed.
+
+        Parameters:
+            num_games: How many games to play
+            width: The width of each board, in cells
+            height: The height of each board, in cells
+            density: The density of bombs on each board, 0-1
+            seed: The base seed, an int.  None picks one at random.
+        """
+
+        if seed is None:
+            seed = int(np.random.SeedSequence().entropy % 2**63)
+
+        bombs = np.empty((num_games, height, width), dtype=bool)
+        for i in range(num_games):
+            bombs[i] = np.random.default_rng([seed, i]).random((height, width)) < density
+
+        return cls(bombs)
+
+    @classmethod
+    def from_boards(cls, boards):
+        """Start games on a list of Boards (or a BoardCorpus), all the same size."""
+
+        return cls(np.stack([board.bombs for board in boards]))
+
+    def __len__(self):
+        return self.bombs.shape[0]
+
+    def width(self):
+        return self.bombs.shape[2]
+
+    def height(self):
+        return self.bombs.shape[1]
+
+    def unknown(self):
+        """Cells neither revealed nor flagged, as an (N, height, width) array."""
+
+        return ~(self.revealed | self.flagged)
+
+    def click(self, cells, games=None):
+        """Reveal cells, flood filling out from any 0s, in many games at once.
+
+        Revealed and flagged cells are left alone, as are games already finished.  Any game
+        with a bomb among its cells is lost; unlike MineSweeperGame#click_many, the rest of its
+        cells are still revealed.
+
+        Parameters:
+            cells: A boolean mask of the cells to click, (N, height, width) or, with games,
+                   (len(games), height, width)
+            games: The indices of the games cells applies to, None for all of them
+        """
+
+        if games is None:
+            games = np.arange(len(self))
+        games = np.asarray(games)
+        cells = cells & ~self.finished[games, None, None]
+
+        revealed = self.revealed[games]
+        clicked  = cells & ~revealed & ~self.flagged[games]
+        bombs    = self.bombs[games]
+        zeros    = self.zeros[games]
+
+        self.moves[games] += clicked.sum(axis=(1, 2))
+        lost = (clicked & bombs).any(axis=(1, 2))
+
+        # Spread out from the 0s, a ring at a time, only in games still spreading
+        revealed |= clicked
+        growing   = clicked & zeros
+        active    = np.flatnonzero(growing.any(axis=(1, 2)))
+        growing   = growing[active]
+        while len(active):
+            grown = _dilate(growing) & ~revealed[active]
+            revealed[active] |= grown
+            growing = grown & zeros[active]
+            keep    = growing.any(axis=(1, 2))
+            active, growing = active[keep], growing[keep]
+
+        self.revealed[games] = revealed
+        self.finished[games[lost]] = True
+        self._check_win(games)
+
+    def flag(self, cells, games=None):
+        """Flag cells that are not already flagged or revealed, in many games at once.  Each
+        flag counts as a move, as for MineSweeperGame.
+
+        Parameters:
+            cells: A boolean mask of the cells to flag, as for #click
+            games: The indices of the games cells applies to, None for all of them
+        """
+
+        if games is None:
+            games = np.arange(len(self))
+        games = np.asarray(games)
+        cells = cells & ~self.finished[games, None, None]
+
+        flagged = cells & ~self.revealed[games] & ~self.flagged[games]
+        self.moves[games]   += flagged.sum(axis=(1, 2))
+        self.flagged[games] |= flagged
+        self._check_win(games)
+
+    def _check_win(self, games):
+        """Finish, as won, any of the games given with every bomb flagged, nothing else flagged
+        and every other cell revealed."""
+
+        games = games[~self.finished[games]]
+        if not len(games):
+            return
+
+        bombs = self.bombs[games]
+        won   = ((self.flagged[games] == bombs).all(axis=(1, 2))
+                 & (self.revealed[games] | bombs).all(axis=(1, 2)))
+        self.finished[games[won]] = True
+        self.won[games[won]]      = True
+
+
+class BatchedAI:
+    """Plays every game of a BatchedGames in lockstep, with the deterministic rules and the local
+    heuristic of MineSweeperAI."""
+
+    def __init__(self, games):
+        """Create an AI for a stack of games.
+
+        Parameters:
+            games: The BatchedGames to play
+        """
+
+        self.games = games
+        self.steps = 0
+
+    def move(self):
+        """Make one move in every unfinished game: flag and click everything the deterministic
+        rules find, or guess where they find nothing.
+
+        Returns:
+            The number of games still unfinished
+        """
+
+        games  = self.games
+        active = np.flatnonzero(~games.finished)
+        if not len(active):
+            return 0
+        self.steps += 1
+
+        revealed = games.revealed[active]
+        flagged  = games.flagged[active]
+        unknown  = ~(revealed | flagged)
+
+        # What's left to find around each revealed number
+        numbers       = revealed & ~games.bombs[active]
+        mines_left    = games.counts[active].astype(np.int16) - _neighbour_sum(flagged)
+        unknown_count = _neighbour_sum(unknown)
+        useful        = numbers & (unknown_count > 0)
+
+        # Rules 1 and 2, the unknown cells around a number are all mines or all safe
+        to_flag  = _dilate(useful & (mines_left == unknown_count)) & unknown
+        to_click = _dilate(useful & (mines_left == 0)) & unknown
+
+        certain = (to_flag | to_click).any(axis=(1, 2))
+        if certain.any():
+            games.flag(to_flag[certain], active[certain])
+            games.click(to_click[certain], active[certain])
+
+        stuck = ~certain
+        if stuck.any():
+            games.click(self._guess(numbers[stuck], unknown[stuck], mines_left[stuck],
+                                    unknown_count[stuck]),
+                        active[stuck])
+
+        return int((~games.finished).sum())
+
+    @staticmethod
+    def _guess(numbers, unknown, mines_left, unknown_count):
+        """Pick one unknown cell per game, as MineSweeperAI#_move_heuristic would, returning a
+        mask with that cell set."""
+
+        # Each number's share of the mines left around it, for each of its unknown neighbours
+        sharing = numbers & (mines_left != 0) & (unknown_count > 0)
+        share   = np.where(sharing, mines_left / np.maximum(unknown_count, 1), 0.0)
+        sharers = _neighbour_sum(sharing)
+        score   = _neighbour_sum(share) / np.maximum(sharers, 1)
+
+        # Cells next to no number score 0, so the first of them wins; cells that can't be
+        # clicked never do
+        constrained = _dilate(numbers)
+        score       = np.where(constrained, score, 0.0)
+        score       = np.where(unknown & (~constrained | (sharers > 0)), score, np.inf)
+
+        n     = score.shape[0]
+        flat  = score.reshape(n, -1)
+        guess = np.zeros(flat.shape, dtype=bool)
+        best  = flat.argmin(axis=1)
+        playable = np.isfinite(flat[np.arange(n), best])
+        guess[np.arange(n)[playable], best[playable]] = True
+
+        return guess.reshape(score.shape)
+
+    def play(self, max_steps=None):
+        """Move until every game is finished, or max_steps moves have been made.
+
+        Returns:
+            The number of games still unfinished
+        """
+
+        games = self.games
+        left  = int((~games.finished).sum())
+        while left and (max_steps is None or self.steps < max_steps):
+            before = (games.moves.sum(), games.flagged.sum())
+            left   = self.move()
+
+            # Nothing more can be done in the games left
+            if (games.moves.sum(), games.flagged.sum()) == before:
+                break
+
+        return left
+
+
+def simulate(num_games, width, height, density=0.2, seed=None):
+    """Play many games at once with BatchedAI and summarise how it did.
+
+    Parameters:
+        num_games: How many games to play
+        width: The width of each board, in cells
+        height: The height of each board, in cells
+        density: The density of bombs on each board, 0-1
+        seed: The base seed, as for BatchedGames#generate
+
+    Returns:
+        A dict with keys games, wins, win_rate, mean_moves and steps
+    """
+
+    games = BatchedGames.generate(num_games, width, height, density, seed)
+    ai    = BatchedAI(games)
+    ai.play()
+
+    return {"games": num_games,
+            "wins": int(games.won.sum()),
+            "win_rate": float(games.won.mean()) if num_games else 0.0,
+            "mean_moves": float(games.moves.mean()) if num_games else 0.0,
+            "steps": ai.steps}
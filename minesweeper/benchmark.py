@@ -0,0 +1,312 @@
+"""Times the main parts of minesweeper over a matrix of board sizes and densities.
+
+Four things are measured:
+
+ * board: constructing a Board
+ * fill: the flood fill behind a click on a 0 (MineSweeperGame._fill_click)
+ * move: a single MineSweeperAI.move() part way into a game
+ * game: a complete game played by the AI
+
+Every case uses fixed seeds, so two runs play exactly the same boards and their results can be
+compared.  Results are written as JSON, and a run can be checked against an earlier one (the
+baseline) to catch anything that got slower or hungrier:
+
+    minesweeper-benchmark --output new.json --baseline old.json
+
+Whole games can also be timed on every board of a corpus file (see corpus.py) with --corpus.
+
+Peak memory is measured with tracemalloc in a separate, untimed run of each case, so that the
+cost of tracing does not end up in the timings."""
+
+import argparse
+import datetime
+import json
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+from .board import Board
+from .game import MineSweeperGame
+from .ai import MineSweeperAI
+from .corpus import open_corpus
+
+
+SIZES     = ((20, 20), (100, 100), (300, 300), (1000, 1000))
+DENSITIES = (0.1, 0.2)
+
+# Results within this fraction of the baseline are put down to noise
+TOLERANCE = 0.1
+
+
+def _setup_board(width, height, density, seed):
+    return (width, height, density, seed)
+
+def _run_board(args):
+    Board(*args)
+
+
+def _setup_fill(width, height, density, seed):
+    board  = Board(width, height, density, seed=seed)
+    zeros  = np.argwhere((board.counts == 0) & ~board.bombs)
+    if len(zeros) == 0:
+        return None
+
+    # Start in the middle of the board's zeros, as a player would, rather than in a corner
+    y, x = zeros[len(zeros) // 2].tolist()
+    return MineSweeperGame(board), x, y
+
+def _run_fill(args):
+    game, x, y = args
+    game._fill_click(x, y)
+
+
+def _setup_move(width, height, density, seed):
+    # Make one move to open the board, so the move timed has something to work with.  Boards
+    # where the first move loses are skipped, moving on to the next seed.
+    for attempt in range(100):
+        game = MineSweeperGame(Board(width, height, density, seed=[seed, attempt]))
+        ai   = MineSweeperAI(game)
+        ai.move()
+        if not game.finished:
+            return ai
+
+    return None
+
+def _run_move(ai):
+    ai.move()
+
+
+def _setup_game(width, height, density, seed):
+    game = MineSweeperGame(Board(width, height, density, seed=seed))
+    return game, MineSweeperAI(game)
+
+def _setup_corpus_game(boards, index):
+    game = MineSweeperGame(boards[index])
+    return game, MineSweeperAI(game)
+
+def _run_game(args):
+    game, ai = args
+    while not game.finished:
+        ai.move()
+
+
+# name -> (setup, run).  setup(width, height, density, seed) prepares an untimed argument for
+# run, or returns None if the case can't be run; run(argument) is the thing that is timed.
+BENCHMARKS = {
+    "board": (_setup_board, _run_board),
+    "fill":  (_setup_fill,  _run_fill),
+    "move":  (_setup_move,  _run_move),
+    "game":  (_setup_game,  _run_game),
+}
+
+
+def run_case(name, width, height, density, seed=0, repeat=3):
+    """Time one benchmark on one size and density of board.
+
+    Parameters:
+        name: The benchmark to run, a key of BENCHMARKS
+        width: The width of the board, in cells
+        height: The height of the board, in cells
+        density: The density of bombs on the board, 0-1
+        seed: The seed for the board(s)
+        repeat: How many times to time the benchmark; each gets a fresh setup
+
+    Returns:
+        A dict describing the case and its results, or None if the case could not be run (e.g.
+        the fill benchmark on a board with no 0s).  Times are in seconds, and peak_bytes is the
+        most memory allocated at once during a run, over what the setup allocated.
+    """
+
+    setup, run = BENCHMARKS[name]
+
+    times = []
+    for _ in range(repeat):
+        argument = setup(width, height, density, seed)
+        if argument is None:
+            return None
+
+        start = time.perf_counter()
+        run(argument)
+        times.append(time.perf_counter() - start)
+
+    # Only allocations made after tracing starts are counted, so the setup is left out
+    argument = setup(width, height, density, seed)
+    tracemalloc.start()
+    try:
+        run(argument)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    return {"name": name, "width": width, "height": height, "density": density, "seed": seed,
+            "times": times, "min": min(times), "median": statistics.median(times),
+            "peak_bytes": peak}
+
+
+def run_corpus(path, limit=None):
+    """Time a complete game by the AI on each board of a corpus file (see corpus.py).
+
+    Parameters:
+        path: The corpus file
+        limit: The most boards to play, None for all of them
+
+    Returns:
+        A dict as returned by #run_case, named "corpus", with one time per board.  peak_bytes
+        is measured on the first board.
+    """
+
+    boards = open_corpus(path)
+    count  = len(boards) if limit is None else min(limit, len(boards))
+
+    times = []
+    for index in range(count):
+        argument = _setup_corpus_game(boards, index)
+
+        start = time.perf_counter()
+        _run_game(argument)
+        times.append(time.perf_counter() - start)
+
+    argument = _setup_corpus_game(boards, 0)
+    tracemalloc.start()
+    try:
+        _run_game(argument)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    return {"name": "corpus", "width": boards.width, "height": boards.height,
+            "density": boards.density, "seed": boards.seed, "times": times, "min": min(times),
+            "median": statistics.median(times), "peak_bytes": peak}
+
+
+def run_suite(names=None, sizes=SIZES, densities=DENSITIES, seed=0, repeat=3, log=None,
+              corpus=None):
+    """Run every benchmark over every size and density given.
+
+    Parameters:
+        names: The benchmarks to run, None for all of them
+        sizes: A list of (width, height) tuples
+        densities: A list of bomb densities, 0-1
+        seed: The seed for the boards
+        repeat: How many times to time each case
+        log: A callable to pass a line of progress to for each case, or None
+        corpus: The path of a corpus file to also time whole games on, see #run_corpus
+
+    Returns:
+        A dict with keys meta (describing the machine and run) and results (a list of dicts
+        from #run_case), ready to be written out as JSON.
+    """
+
+    results = []
+    for name in names or BENCHMARKS:
+        for width, height in sizes:
+            for density in densities:
+                result = run_case(name, width, height, density, seed=seed, repeat=repeat)
+                if result is None:
+                    continue
+                results.append(result)
+                if log is not None:
+                    _log_result(log, result)
+
+    if corpus:
+        results.append(run_corpus(corpus))
+        if log is not None:
+            _log_result(log, results[-1])
+
+    meta = {"python": platform.python_version(), "numpy": np.__version__,
+            "platform": platform.platform(), "date": datetime.datetime.now().isoformat(),
+            "seed": seed, "repeat": repeat}
+
+    return {"meta": meta, "results": results}
+
+
+def _log_result(log, result):
+    log(f"{result['name']:<6} {result['width']}x{result['height']} density={result['density']}: "
+        f"median {result['median'] * 1000:.2f}ms, peak {result['peak_bytes'] / 1024:.0f}KiB")
+
+
+def _key(result):
+    return (result["name"], result["width"], result["height"], result["density"], result["seed"])
+
+
+def compare(results, baseline, tolerance=TOLERANCE):
+    """Find cases that have got slower or use more memory than in a baseline run.
+
+    Cases are matched on benchmark, size, density and seed; those in only one of the runs are
+    ignored.  Times are compared on their median, the least noisy of the measures.
+
+    Parameters:
+        results: The output of #run_suite
+        baseline: The output of an earlier #run_suite, e.g. loaded from its JSON
+        tolerance: The fraction by which a measure may grow before it is a regression
+
+    Returns:
+        A list of (result, measure, baseline value, new value) tuples, one for each regression
+    """
+
+    before = {_key(result): result for result in baseline["results"]}
+
+    regressions = []
+    for result in results["results"]:
+        old = before.get(_key(result))
+        if old is None:
+            continue
+        for measure in ("median", "peak_bytes"):
+            if result[measure] > old[measure] * (1 + tolerance):
+                regressions.append((result, measure, old[measure], result[measure]))
+
+    return regressions
+
+
+def _size(text):
+    width, _, height = text.partition("x")
+    return int(width), int(height or width)
+
+
+def main(argv=None):
+    """Command line entry point.  Returns 1 if anything regressed against the baseline."""
+
+    parser = argparse.ArgumentParser(description="Benchmark minesweeper")
+    parser.add_argument("--benchmarks", nargs="+", choices=list(BENCHMARKS), default=list(BENCHMARKS),
+                        help="the benchmarks to run (default: all)")
+    parser.add_argument("--sizes", nargs="+", type=_size, default=list(SIZES),
+                        help="board sizes, as WIDTHxHEIGHT (default: 20x20 up to 1000x1000)")
+    parser.add_argument("--densities", nargs="+", type=float, default=list(DENSITIES),
+                        help="bomb densities, 0-1")
+    parser.add_argument("--seed", type=int, default=0, help="the seed for every board")
+    parser.add_argument("--repeat", type=int, default=3, help="how many times to time each case")
+    parser.add_argument("--corpus", help="also time whole games on every board of this corpus file")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="compare against the results in this JSON file")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE,
+                        help="how much slower a case may be than the baseline, as a fraction")
+    args = parser.parse_args(argv)
+
+    results = run_suite(args.benchmarks, args.sizes, args.densities, seed=args.seed,
+                        repeat=args.repeat, log=print, corpus=args.corpus)
+
+    if args.output:
+        with open(args.output, "w") as handle:
+            json.dump(results, handle, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as handle:
+            baseline = json.load(handle)
+
+        regressions = compare(results, baseline, args.tolerance)
+        for result, measure, old, new in regressions:
+            print(f"REGRESSION {result['name']} {result['width']}x{result['height']} "
+                  f"density={result['density']}: {measure} {old:.6g} -> {new:.6g}")
+        if regressions:
+            return 1
+        print("No regressions")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,373 @@
+"""A compact representation of a game, with each per-cell property packed into one Python int.
+
+Cell x, y is bit y * stride + x, where the stride is one more than the width of the board.  The
+extra 'guard' column is always zero, so shifting a whole mask by one cell left or right can never
+carry a bit from the end of one row onto the start of the next, and a neighbour query or a step
+of a flood fill becomes a handful of shifts, ANDs and ORs over the whole board at once."""
+
+from array import array
+
+import numpy as np
+
+from .board import BOMB
+from .game import MineSweeperGame, FLAGGED, OBSERVED_UNKNOWN
+from .stats import make_stats
+
+
+def _popcount(bits):
+    """The number of bits set in a mask; int#bit_count does the same, but only from Python 3.10."""
+
+    return bin(bits).count("1")
+
+
+class BitGrid:
+    """The geometry of a board as seen by bitmasks: packing, unpacking and neighbourhoods."""
+
+    def __init__(self, width, height):
+        """Create a grid for a board of the size given.
+
+        Parameters:
+            width: The width of the board, in cells
+            height: The height of the board, in cells
+        """
+
+        self.width  = width
+        self.height = height
+        self.stride = width + 1
+
+        # Every real cell, i.e. everything except the guard column
+        self.full = self.pack(np.ones((height, width), dtype=bool))
+
+        # The ring of 8 cells around 1, 1; shifted into place by #ring
+        self.ring_template = 0
+        for dx, dy in ((0, 0), (1, 0), (2, 0), (0, 1), (2, 1), (0, 2), (1, 2), (2, 2)):
+            self.ring_template |= 1 << (dy * self.stride + dx)
+
+    def pack(self, mask):
+        """Pack a (height, width) boolean array into a bitmask."""
+
+        padded = np.pad(np.asarray(mask, dtype=bool), ((0, 0), (0, 1)))
+        return int.from_bytes(np.packbits(padded, bitorder="little").tobytes(), "little")
+
+    def unpack(self, bits):
+        """Unpack a bitmask into a (height, width) boolean array."""
+
+        size  = self.height * self.stride
+        array = np.unpackbits(np.frombuffer(bits.to_bytes((size + 7) // 8, "little"), dtype=np.uint8),
+                              count=size, bitorder="little")
+        return array.reshape(self.height, self.stride)[:, :self.width].astype(bool)
+
+    def coords(self, bits):
+        """List the (x, y) cells set in a bitmask."""
+
+        if bits == 0:
+            return []
+
+        ys, xs = np.nonzero(self.unpack(bits))
+        return list(zip(xs.tolist(), ys.tolist()))
+
+    def bit(self, x, y):
+        """The mask with only cell x, y set, or 0 if x, y is off the board."""
+
+        if x < 0 or x >= self.width or y < 0 or y >= self.height:
+            return 0
+        return 1 << (y * self.stride + x)
+
+    def dilate(self, bits):
+        """Every cell next to (but not necessarily in) a cell set in bits."""
+
+        s = self.stride
+        return (bits << 1 | bits >> 1
+                | bits << s | bits >> s
+                | bits << (s - 1) | bits >> (s - 1)
+                | bits << (s + 1) | bits >> (s + 1)) & self.full
+
+    def fill(self, bits, through):
+        """Extend bits in straight lines left, right, up and down through the cells of through.
+
+        Each direction is a Kogge-Stone style fill, doubling the distance covered on every step,
+        so crossing a run of n cells takes log2(n) shifts rather than n.
+
+        Parameters:
+            bits: The cells to start from; those not in through are left as they are
+            through: The cells that can be filled
+
+        Returns:
+            bits, plus every cell of through reachable from a cell of bits in a straight
+            horizontal or vertical line without leaving through
+        """
+
+        for step, limit in ((1, self.width), (self.stride, self.height)):
+            for forward in (True, False):
+                grown   = bits & through
+                open_   = through
+                shift   = step
+                while shift < limit * step:
+                    if forward:
+                        grown |= open_ & (grown << shift)
+                        open_ &= open_ << shift
+                    else:
+                        grown |= open_ & (grown >> shift)
+                        open_ &= open_ >> shift
+                    shift *= 2
+                bits |= grown
+
+        return bits
+
+    def ring(self, x, y):
+        """The mask of the in-bounds cells in the ring of 8 around x, y."""
+
+        return (self.ring_template << (y * self.stride + x)) >> (self.stride + 1) & self.full
+
+
+class BitboardGame(MineSweeperGame):
+    """A MineSweeperGame that keeps its bombs, revealed cells and flags as bitmasks.
+
+    It behaves exactly like MineSweeperGame, and uses one bit per cell for each of its masks
+    rather than a list of lists and sets of tuples.  Bulk queries such as #unknown_neighbours and
+    the flood fill behind a click on a 0 work on every cell at once."""
+
+    def __init__(self, board, stats=False, trace=None):
+        """Create a new game for the board given.
+
+        Parameters:
+            board: The Board object to play upon.
+            stats: True to record timers and counters in self.stats, as for MineSweeperGame
+            trace: A TraceWriter to record moves to, as for MineSweeperGame
+        """
+
+        self.board = board
+        self.grid  = BitGrid(board.width(), board.height())
+
+        self.bomb_bits     = self.grid.pack(board.bombs)
+        self.zero_bits     = self.grid.pack((board.counts == 0) & ~board.bombs)
+        self.revealed_bits = 0
+        self.flag_bits     = 0
+
+        self.bomb_count     = _popcount(self.bomb_bits)
+        self.revealed_count = 0
+        self.moves          = 0
+
+        self.correct_flags = 0
+        self.wrong_flags   = 0
+        self.safe_revealed = 0
+
+        self.finished = False
+        self.won      = False
+
+        self.observers    = []
+        self.snapshotters = {}
+
+        self.visible = array("b", [OBSERVED_UNKNOWN]) * board.num_cells()
+
+        self.stats = make_stats(stats)
+        self.trace = trace
+
+        # Whether there are live snapshots, for #trial; they need no journal
+        self.snapshotting = False
+
+    @property
+    def flags(self):
+        """The set of (x, y) flagged cells."""
+
+        return set(self.grid.coords(self.flag_bits))
+
+    @property
+    def bomb_index(self):
+        """The set of (x, y) cells holding bombs."""
+
+        return set(self.grid.coords(self.bomb_bits))
+
+    def num_bombs(self):
+        """Returns the number of bombs hidden on the board, as shown on a minesweeper counter."""
+
+        return self.bomb_count
+
+    def cell_flagged(self, x, y):
+        """Has the cell at x, y been flagged?"""
+
+        return bool(self.flag_bits & self.grid.bit(x, y))
+
+    def cell_revealed(self, x, y):
+        """Has the cell at x, y been revealed?"""
+
+        if x < 0 or x >= self.grid.width or y < 0 or y >= self.grid.height:
+            return None
+
+        return bool(self.revealed_bits & self.grid.bit(x, y))
+
+    def unknown_neighbours(self, x, y):
+        """The mask of cells around x, y that are neither revealed nor flagged."""
+
+        return self.grid.ring(x, y) & ~(self.revealed_bits | self.flag_bits)
+
+    def _toggle_flag(self, x, y):
+        """Flag or unflag cell x, y, keeping the flag counters up to date."""
+
+        bit = self.grid.bit(x, y)
+        if not bit:
+            return
+
+        self.moves += 1
+        self.flag_bits ^= bit
+
+        change = 1 if self.flag_bits & bit else -1
+        if self.bomb_bits & bit:
+            self.correct_flags += change
+        else:
+            self.wrong_flags   += change
+
+    def _click(self, x, y):
+        """Reveal cell at x, y, without checking for a win or notifying anyone.
+
+        Returns:
+            A list of (x, y) tuples for the cells whose visible state changed.
+        """
+
+        bit = self.grid.bit(x, y)
+        if not bit or (self.revealed_bits | self.flag_bits) & bit:
+            return []
+
+        self.moves += 1
+        self.stats.count("clicks")
+
+        # Lose if clicking on a bomb
+        if self.bomb_bits & bit:
+            self.revealed_bits  |= bit
+            self.revealed_count += 1
+            self.finished = True
+            self.won      = False
+            return [(x, y)]
+
+        revealed_before = self.revealed_count
+        if self.zero_bits & bit:
+            with self.stats.timer("fill_click"):
+                revealed = self._fill_click(x, y)
+        else:
+            self.revealed_bits  |= bit
+            self.revealed_count += 1
+            revealed = [(x, y)]
+
+        self.safe_revealed += self.revealed_count - revealed_before
+        self.stats.observe("revealed_per_click", self.revealed_count - revealed_before)
+
+        return revealed
+
+    def _fill_click(self, init_x, init_y):
+        """Reveal the region opened by clicking on the 0 at init_x, init_y.
+
+        Each step runs the 0 cells of the region as far as they go in straight lines through
+        other 0s, then adds the ring around them.  Every step works on the whole board at once,
+        and the number of steps depends on how twisty the region is, not how big it is.
+
+        Returns:
+            A list of (x, y) tuples for the cells revealed whose visible state changed.
+        """
+
+        region = self.grid.bit(init_x, init_y)
+        while True:
+            zeros = self.grid.fill(region & self.zero_bits, self.zero_bits)
+
+            # The cells around a 0 are never bombs, so no need to mask them out
+            grown = region | zeros | self.grid.dilate(zeros)
+            if grown == region:
+                break
+            region = grown
+
+        new = region & ~self.revealed_bits
+        self.revealed_bits  |= region
+        self.revealed_count += _popcount(new)
+
+        # Flagged cells are revealed underneath their flag, so do not change visibly
+        return self.grid.coords(new & ~self.flag_bits)
+
+    def _states(self, coords):
+        """Look up #cell for a list of (x, y) coordinates, returning (x, y, state) tuples.
+
+        Large lists (i.e. flood fills) are looked up in bulk rather than cell by cell."""
+
+        if len(coords) < 64:
+            return [(x, y, self.cell(x, y)) for x, y in coords]
+
+        xs, ys   = np.array(coords).T
+        flagged  = self.grid.unpack(self.flag_bits)[ys, xs].tolist()
+        revealed = self.grid.unpack(self.revealed_bits)[ys, xs].tolist()
+        bombs    = self.board.bombs[ys, xs].tolist()
+        counts   = self.board.counts[ys, xs].tolist()
+
+        return [(x, y, FLAGGED if f else (BOMB if b else c) if r else None)
+                for (x, y), f, r, b, c in zip(coords, flagged, revealed, bombs, counts)]
+
+    def _notify(self, coords):
+        """Turn a list of (x, y) coordinates whose visible state has changed into a list of
+        (x, y, state) changes, pass them to any observers, and return them."""
+
+        changes = self._states(coords)
+        self._observe(changes)
+        for observer in self.observers:
+            observer(changes)
+
+        return changes
+
+    def _notify_revealed(self, coords):
+        """#_click lists the (x, y) coordinates of the cells it reveals, so notify of those as
+        for any other change."""
+
+        return self._notify(coords)
+
+    def snapshot(self):
+        """Take a snapshot of the game that #restore can later return it to.
+
+        The masks are immutable ints, so a snapshot just keeps hold of them, and costs nothing
+        however much changes afterwards.
+
+        Returns:
+            An opaque token to pass to #restore
+        """
+
+        snapshot = (self.revealed_bits, self.flag_bits, self.revealed_count, self.moves,
+                    self.correct_flags, self.wrong_flags, self.safe_revealed, self.finished, self.won,
+                    self._snapshot_observers())
+        if self.trace is not None:
+            self.trace.snapshot(snapshot)
+        self.snapshotting = True
+
+        return snapshot
+
+    def restore(self, snapshot):
+        """Return the game to the state it was in when a snapshot was taken.
+
+        Parameters:
+            snapshot: A token returned by #snapshot
+
+        Returns:
+            A list of (x, y, state) tuples for the cells whose visible state changed.
+        """
+
+        if self.trace is not None:
+            self.trace.restore(snapshot)
+        changed = (self.revealed_bits ^ snapshot[0]) | (self.flag_bits ^ snapshot[1])
+
+        (self.revealed_bits, self.flag_bits, self.revealed_count, self.moves, self.correct_flags,
+         self.wrong_flags, self.safe_revealed, self.finished, self.won, observers) = snapshot
+        self._restore_observers(observers)
+
+        self.stats.count("restores")
+
+        return self._notify(self.grid.coords(changed)) if changed else []
+
+    def forget_snapshots(self):
+        """Snapshots of a BitboardGame need no journal, so there is nothing to forget but the
+        observers'."""
+
+        if self.trace is not None:
+            self.trace.forget_snapshots()
+        for snapshotter in self.snapshotters.values():
+            snapshotter.forget_snapshots()
+        self.snapshotting = False
+
+    def _snapshotting(self):
+        return self.snapshotting
+
+    def revealed_cell_tuples(self):
+        return self._states(self.grid.coords(self.revealed_bits))
@@ -2,40 +2,92 @@
 
 The squares, the mines, the relation of squares and mines --- everything."""
 
-from random import random
+import numpy as np
+
+from .neighbours import neighbour_lookup
 
 # How we will recognise a bomb on the board.
 # Used by other components.
 BOMB = "b"
 
 class Board:
-    """A single minesweeper board"""
+    """A single minesweeper board.
+
+    The bombs are held as a boolean mask and the adjacency numbers as a small integer array, both
+    of shape (height, width) and addressed [y, x].  Flat, row-major byte copies of each are kept
+    too, for fast lookups of a single cell by its index y * width + x."""
 
-    def __init__(self, w, h, density=0.2):
+    def __init__(self, w, h, density=0.2, seed=None):
         """Create a board with the dimensions and bomb density given.
 
         Parameters:
             w: The width, in cells
             h: The height, in cells
             density: The density of bombs on this board, 0-1.
+            seed: Anything accepted by numpy.random.default_rng --- an int, a SeedSequence or an
+                  existing Generator.  The same seed always produces the same board.  None draws
+                  fresh entropy from the OS.
         """
 
-        self.cells = [[BOMB if random() < density else None
-                        for _ in range(w)]
-                        for _ in range(h)]
+        rng = np.random.default_rng(seed)
 
-        for x in range(self.width()):
-            for y in range(self.height()):
+        self._set_bombs(rng.random((h, w)) < density)
 
-                # Skip bombs
-                if self.is_bomb(x, y):
-                    continue
+    @classmethod
+    def from_bombs(cls, bombs):
+        """Create a board with bombs exactly where given, e.g. one loaded from a BoardCorpus.
+
+        Parameters:
+            bombs: A 2D boolean array of shape (height, width), True where there is a bomb.  It
+                   is used as it is, not copied.
+        """
+
+        board = cls.__new__(cls)
+        board._set_bombs(bombs)
+        return board
+
+    def _set_bombs(self, bombs):
+        """Set up the board around a mask of bombs."""
+
+        self.bombs  = bombs
+        self.counts = Board._count_adjacent_bombs(self.bombs)
+
+        self.flat_bombs  = self.bombs.tobytes()
+        self.flat_counts = self.counts.tobytes()
+        # 1 for every cell holding a 0, i.e. neither a bomb nor next to one
+        self.flat_zeros  = ((self.counts == 0) & ~self.bombs).tobytes()
+
+    @property
+    def neighbours(self):
+        """The neighbours of this board's cells: the NeighbourTable for its size, shared with every
+        other board of that size, or a ComputedNeighbours for boards too big to tabulate."""
+
+        return neighbour_lookup(self.width(), self.height())
 
-                adjacent = [self.is_bomb(x-1, y-1), self.is_bomb(x  , y-1), self.is_bomb(x+1, y-1),
-                            self.is_bomb(x-1, y  ),                         self.is_bomb(x+1, y  ),
-                            self.is_bomb(x-1, y+1), self.is_bomb(x  , y+1), self.is_bomb(x+1, y+1)]
+    @staticmethod
+    def _count_adjacent_bombs(bombs):
+        """Count the bombs in the ring of 8 cells around every cell of a bomb mask.
 
-                self.cells[y][x] = sum(adjacent)
+        Pads the mask by one cell on each side and sums the eight shifted views of it, so the whole
+        board is counted in a handful of array operations rather than a lookup per neighbour.
+
+        Parameters:
+            bombs: A 2D boolean array, True where there is a bomb
+
+        Returns:
+            A uint8 array the same shape as bombs, holding 0-8 for every cell
+        """
+
+        h, w   = bombs.shape
+        padded = np.pad(bombs, 1).astype(np.uint8)
+        counts = np.zeros((h, w), dtype=np.uint8)
+        for dy in (0, 1, 2):
+            for dx in (0, 1, 2):
+                if dx == 1 and dy == 1:
+                    continue
+                counts += padded[dy:dy+h, dx:dx+w]
+
+        return counts
 
     def is_bomb(self, x, y):
         """Is the cell at x, y a bomb?
@@ -49,7 +101,12 @@ class Board:
         Returns: True if the cell at x,y contains a bomb, else False
         """
 
-        return self.cell(x, y) == BOMB
+        if x < 0 or x >= self.bombs.shape[1]:
+            return False
+        if y < 0 or y >= self.bombs.shape[0]:
+            return False
+
+        return bool(self.flat_bombs[y * self.bombs.shape[1] + x])
 
     def cell(self, x, y):
         """Returns the contents of cell x, y
@@ -61,34 +118,47 @@ class Board:
         Returns: An integer 0-8 indicating the number of adjacent bombs, or BOMB if this cell
                  contains a bomb."""
 
-        if x < 0 or x >= len(self.cells[0]):
+        if x < 0 or x >= self.bombs.shape[1]:
             return None
-        if y < 0 or y >= len(self.cells):
+        if y < 0 or y >= self.bombs.shape[0]:
             return None
 
-        return self.cells[y][x]
+        i = y * self.bombs.shape[1] + x
+        if self.flat_bombs[i]:
+            return BOMB
+        return self.flat_counts[i]
 
     def width(self):
         """Returns the width of the board in cells."""
 
-        return len(self.cells[0])
+        return self.bombs.shape[1]
 
     def height(self):
         """Returns the height of the board in cells."""
 
-        return len(self.cells)
+        return self.bombs.shape[0]
 
     def num_cells(self):
         """Returns the number of cells in the board"""
 
-        return self.width() * self.height()
+        return self.bombs.size
+
+    def num_bombs(self):
+        """Returns the number of bombs on the board"""
+
+        return int(np.count_nonzero(self.bombs))
+
+    def bomb_tuples(self):
+        """Returns a list of (x, y) tuples, one for each bomb on the board."""
+
+        return [(x, y) for y, x in np.argwhere(self.bombs).tolist()]
 
     def cell_tuples(self):
         """Returns a list of 3-tuples describing the board.
 
         Each tuple consists of (x, y, state) where state is the response from #cell(x, y)."""
 
-        tuples = [[(x, y, self.cell(x, y)) for x in range(self.width())]
-                   for y in range(self.height())]
-        tuples = [item for sublist in tuples for item in sublist]
-        return tuples
+        bombs  = self.bombs.tolist()
+        counts = self.counts.tolist()
+        return [(x, y, BOMB if bombs[y][x] else counts[y][x])
+                for y in range(self.height()) for x in range(self.width())]
@@ -0,0 +1,369 @@
+"""Boards generated a chunk at a time, as they are explored, for grids too big to hold in memory.
+
+The board is split into square chunks.  Each chunk's bombs are generated the first time anything
+inside it (or next to it) is looked at, from a generator seeded with the board's seed and the
+chunk's coordinates, so the same chunk always comes out the same whatever order the board is
+explored in.  The number of bombs in each chunk is drawn separately, a row of chunks at a time,
+so that the total number of bombs on the board can be known without generating every chunk.
+
+Adjacency numbers for a chunk need the bombs along the edges of the chunks around it, so looking
+at a chunk generates the bombs (but not the numbers) of its neighbours too.  Chunks nowhere near
+anything looked at cost nothing."""
+
+import numpy as np
+
+from .board import BOMB
+from .game import MineSweeperGame
+from .neighbours import ComputedNeighbours
+from .stats import make_stats
+
+# How bombs are marked in a chunk's cells; numbers are 0-8
+_CHUNK_BOMB = 9
+
+
+class ChunkedBoard:
+    """A minesweeper board whose cells are generated lazily, a chunk at a time.
+
+    Offers the same methods as Board, though not its bombs and counts arrays, so can be played by
+    a ChunkedGame.  Methods that list every cell on the board (#bomb_tuples and #cell_tuples)
+    generate every chunk to do so."""
+
+    def __init__(self, w, h, density=0.2, seed=None, chunk_size=64):
+        """Create a board with the dimensions and bomb density given.
+
+        Nothing is generated until it is looked at, so this is cheap however big the board.
+
+        Parameters:
+            w: The width, in cells
+            h: The height, in cells
+            density: The density of bombs on this board, 0-1.
+            seed: An int or a list of ints.  The same seed always produces the same board.  None
+                  picks one at random.
+            chunk_size: The width and height of each chunk, in cells
+        """
+
+        if seed is None:
+            seed = int(np.random.SeedSequence().entropy % 2**63)
+
+        self.w          = w
+        self.h          = h
+        self.density    = density
+        self.seed       = list(seed) if isinstance(seed, (list, tuple)) else [seed]
+        self.chunk_size = chunk_size
+
+        self.chunks_x = -(-w // chunk_size)
+        self.chunks_y = -(-h // chunk_size)
+
+        # cy -> the number of bombs in each chunk of that row
+        self.row_bomb_counts = {}
+        # (cx, cy) -> boolean bomb mask of the chunk
+        self.bomb_chunks     = {}
+        # (cx, cy) -> bytes, one per cell of the chunk, holding its number or _CHUNK_BOMB
+        self.cell_chunks     = {}
+
+        self.total_bombs = None
+
+    @property
+    def neighbours(self):
+        """Neighbour lookups for this board, worked out as needed rather than tabulated."""
+
+        return ComputedNeighbours(self.w, self.h)
+
+    def _chunk_shape(self, cx, cy):
+        """The (height, width) of the chunk at cx, cy; chunks on the far edges may be smaller."""
+
+        size = self.chunk_size
+        return min(size, self.h - cy * size), min(size, self.w - cx * size)
+
+    def _row_counts(self, cy):
+        """Draw the number of bombs in each chunk along row cy of chunks."""
+
+        size  = self.chunk_size
+        cells = np.full(self.chunks_x, size, dtype=np.int64)
+        cells[-1] = self.w - (self.chunks_x - 1) * size
+        cells *= self._chunk_shape(0, cy)[0]
+
+        return np.random.default_rng(self.seed + [0, cy]).binomial(cells, self.density)
+
+    def _chunk_bombs(self, cx, cy):
+        """Return the bomb mask of the chunk at cx, cy, generating it if need be."""
+
+        bombs = self.bomb_chunks.get((cx, cy))
+        if bombs is not None:
+            return bombs
+
+        counts = self.row_bomb_counts.get(cy)
+        if counts is None:
+            counts = self.row_bomb_counts[cy] = self._row_counts(cy)
+
+        # Scatter the chunk's bombs uniformly, which is the same as deciding each cell
+        # independently with probability density, given how many there are
+        height, width = self._chunk_shape(cx, cy)
+        rng   = np.random.default_rng(self.seed + [1, cx, cy])
+        bombs = np.zeros(height * width, dtype=bool)
+        bombs[rng.choice(height * width, int(counts[cx]), replace=False)] = True
+
+        bombs = self.bomb_chunks[(cx, cy)] = bombs.reshape(height, width)
+        return bombs
+
+    def _chunk_cells(self, cx, cy):
+        """Return the cells of the chunk at cx, cy as bytes, generating them if need be."""
+
+        cells = self.cell_chunks.get((cx, cy))
+        if cells is not None:
+            return cells
+
+        # Gather the chunk's bombs, plus a border of one cell taken from the chunks around it
+        height, width = self._chunk_shape(cx, cy)
+        padded = np.zeros((height + 2, width + 2), dtype=np.uint8)
+        for dy, rows, into_rows in ((-1, slice(-1, None), slice(0, 1)),
+                                    (0, slice(None), slice(1, height + 1)),
+                                    (1, slice(0, 1), slice(height + 1, height + 2))):
+            for dx, cols, into_cols in ((-1, slice(-1, None), slice(0, 1)),
+                                        (0, slice(None), slice(1, width + 1)),
+                                        (1, slice(0, 1), slice(width + 1, width + 2))):
+                if 0 <= cx + dx < self.chunks_x and 0 <= cy + dy < self.chunks_y:
+                    padded[into_rows, into_cols] = self._chunk_bombs(cx + dx, cy + dy)[rows, cols]
+
+        counts = np.zeros((height, width), dtype=np.uint8)
+        for dy in (0, 1, 2):
+            for dx in (0, 1, 2):
+                if dx == 1 and dy == 1:
+                    continue
+                counts += padded[dy:dy+height, dx:dx+width]
+        counts[padded[1:-1, 1:-1] == 1] = _CHUNK_BOMB
+
+        cells = self.cell_chunks[(cx, cy)] = counts.tobytes()
+        return cells
+
+    def num_chunks_generated(self):
+        """Returns the number of chunks whose cells have been generated so far."""
+
+        return len(self.cell_chunks)
+
+    def is_bomb(self, x, y):
+        """Is the cell at x, y a bomb?
+
+        Parameters:
+            x: The row
+            y: The column
+
+        Returns: True if the cell at x,y contains a bomb, else False
+        """
+
+        if x < 0 or x >= self.w or y < 0 or y >= self.h:
+            return False
+
+        size = self.chunk_size
+        return bool(self._chunk_bombs(x // size, y // size)[y % size, x % size])
+
+    def cell(self, x, y):
+        """Returns the contents of cell x, y
+
+        Parameters:
+            x: The row
+            y: The column
+
+        Returns: An integer 0-8 indicating the number of adjacent bombs, or BOMB if this cell
+                 contains a bomb."""
+
+        if x < 0 or x >= self.w or y < 0 or y >= self.h:
+            return None
+
+        size  = self.chunk_size
+        cx    = x // size
+        value = self._chunk_cells(cx, y // size)[(y % size) * min(size, self.w - cx * size) + x % size]
+        return BOMB if value == _CHUNK_BOMB else value
+
+    def width(self):
+        """Returns the width of the board in cells."""
+
+        return self.w
+
+    def height(self):
+        """Returns the height of the board in cells."""
+
+        return self.h
+
+    def num_cells(self):
+        """Returns the number of cells in the board"""
+
+        return self.w * self.h
+
+    def num_bombs(self):
+        """Returns the number of bombs on the board.
+
+        Draws the bomb count of every row of chunks the first time, but generates no chunks."""
+
+        if self.total_bombs is None:
+            self.total_bombs = sum(int(self.row_bomb_counts[cy].sum()) if cy in self.row_bomb_counts
+                                   else int(self._row_counts(cy).sum())
+                                   for cy in range(self.chunks_y))
+
+        return self.total_bombs
+
+    def bomb_tuples(self):
+        """Returns a list of (x, y) tuples, one for each bomb on the board.
+
+        Generates every chunk."""
+
+        size  = self.chunk_size
+        bombs = []
+        for cy in range(self.chunks_y):
+            for cx in range(self.chunks_x):
+                ys, xs = np.nonzero(self._chunk_bombs(cx, cy))
+                bombs += zip((xs + cx * size).tolist(), (ys + cy * size).tolist())
+
+        return sorted(bombs, key=lambda cell: (cell[1], cell[0]))
+
+    def cell_tuples(self):
+        """Returns a list of 3-tuples describing the board.
+
+        Each tuple consists of (x, y, state) where state is the response from #cell(x, y).
+        Generates every chunk."""
+
+        return [(x, y, self.cell(x, y)) for y in range(self.h) for x in range(self.w)]
+
+
+class ChunkedGame(MineSweeperGame):
+    """A MineSweeperGame on a ChunkedBoard, keeping state only for the chunks played in.
+
+    Revealed cells are recorded in a bytearray per chunk, made when something in the chunk is
+    first revealed, so a game on an enormous board costs memory in proportion to how much of
+    it has been explored."""
+
+    def __init__(self, board, stats=False, trace=None):
+        """Create a new game for the board given.
+
+        Parameters:
+            board: The ChunkedBoard object to play upon.
+            stats: True to record timers and counters in self.stats, as for MineSweeperGame
+            trace: A TraceWriter to record moves to, as for MineSweeperGame
+        """
+
+        self.board      = board
+        self.chunk_size = board.chunk_size
+
+        # (cx, cy) -> 1 for each revealed cell of the chunk, indexed by y * chunk_size + x
+        self.revealed = {}
+
+        self.flags          = set()
+        self.revealed_count = 0
+        self.moves          = 0
+
+        self.correct_flags = 0
+        self.wrong_flags   = 0
+        self.safe_revealed = 0
+
+        self.finished = False
+        self.won      = False
+
+        self.observers    = []
+        self.snapshotters = {}
+
+        # Far too big to keep a code for every cell of; see #observation
+        self.visible = None
+
+        self.stats = make_stats(stats)
+        self.trace = trace
+
+        self.journal = None
+
+    def num_bombs(self):
+        """Returns the number of bombs hidden on the board, as shown on a minesweeper counter."""
+
+        return self.board.num_bombs()
+
+    @property
+    def observation(self):
+        """Not offered for a chunked board, which may be too big to hold in memory: None."""
+
+        return None
+
+    def _observe(self, changes):
+        pass
+
+    def _notify_revealed(self, spans):
+        """Notify observers of the cells revealed by #_click, cell by cell, as there's no
+        observation to update."""
+
+        coords = self._unflagged_coords(spans)
+        return self._notify(coords) if coords else []
+
+    def cell_revealed(self, x, y):
+        """Has the cell at x, y been revealed?"""
+
+        if x < 0 or x >= self.board.w or y < 0 or y >= self.board.h:
+            return None
+
+        size  = self.chunk_size
+        chunk = self.revealed.get((x // size, y // size))
+        return chunk is not None and chunk[(y % size) * size + x % size] == 1
+
+    def _set_revealed(self, x, y):
+        """Mark the cell at x, y as revealed, without counting it or checking anything."""
+
+        size  = self.chunk_size
+        chunk = self.revealed.get((x // size, y // size))
+        if chunk is None:
+            chunk = self.revealed[(x // size, y // size)] = bytearray(size * size)
+        chunk[(y % size) * size + x % size] = 1
+
+        i = y * self.board.w + x
+        self._journal_reveal(i, i + 1)
+
+    def _unreveal(self, start, end):
+        """Hide the cells with flat indices start to end again, for #restore."""
+
+        size = self.chunk_size
+        for i in range(start, end):
+            x, y = i % self.board.w, i // self.board.w
+            self.revealed[(x // size, y // size)][(y % size) * size + x % size] = 0
+
+    def _fill_click(self, init_x, init_y):
+        """Fill an area around the clicked area, revealing all cells that have 0 adjacent bombs.
+
+        Parameters:
+            init_x: The initial x-location (row) to start filling from
+            init_y: The initial y-location (column) to start filling from
+
+        Returns:
+            A list of (start, end) ranges of the flat indices of the cells revealed, one per cell.
+            Flagged cells are revealed underneath their flag.
+        """
+
+        width  = self.board.w
+        height = self.board.h
+
+        cell_stack = [(init_x, init_y)]
+        revealed   = []
+
+        while cell_stack:
+            x, y = cell_stack.pop()
+
+            # Skip over already revealed cells
+            if self.cell_revealed(x, y):
+                continue
+
+            self._set_revealed(x, y)
+            self.revealed_count += 1
+            revealed.append((y * width + x, y * width + x + 1))
+
+            # The cells around a 0 can't be bombs, so no need to check for that
+            if self.board.cell(x, y) == 0:
+                for ny in range(max(y - 1, 0), min(y + 2, height)):
+                    for nx in range(max(x - 1, 0), min(x + 2, width)):
+                        if not self.cell_revealed(nx, ny):
+                            cell_stack.append((nx, ny))
+
+        return revealed
+
+    def revealed_cell_tuples(self):
+        size   = self.chunk_size
+        tuples = []
+        for (cx, cy), chunk in self.revealed.items():
+            for i in np.flatnonzero(np.frombuffer(chunk, dtype=np.uint8)).tolist():
+                x, y = cx * size + i % size, cy * size + i // size
+                tuples.append((x, y, self.cell(x, y)))
+
+        return tuples
@@ -0,0 +1,335 @@
+"""Plays games hosted by a GameServer (see server.py), and measures how fast it answers.
+
+GameClient speaks the protocol over one connection, and lets any number of tasks share it: each
+request carries an id, so responses are matched up however they interleave.
+
+RemoteGame stands in for a MineSweeperGame so that MineSweeperAI can play a game on a server.
+The AI expects its moves to take effect at once, which they can't over a socket, so RemoteGame
+instead collects them in an outbox.  #play_remote sends the outbox after every AI move, and
+passes the changes that come back to the AI as if the game had made them, before asking it to
+move again."""
+
+import asyncio
+import json
+import time
+
+from .ai import MineSweeperAI
+from .game import FLAGGED
+from .neighbours import neighbour_lookup
+from .server import DEFAULT_PORT, LINE_LIMIT, GameServer
+
+
+class ServerError(Exception):
+    """Raised when the server answers a request with an error."""
+
+
+class GameClient:
+    """A connection to a GameServer."""
+
+    def __init__(self, reader, writer):
+        """Wrap an open connection; see #connect to make one."""
+
+        self.reader  = reader
+        self.writer  = writer
+        self.next_id = 0
+
+        # request id -> future for its response
+        self.waiting = {}
+        self.task    = asyncio.ensure_future(self._read_responses())
+
+    @classmethod
+    async def connect(cls, host="127.0.0.1", port=DEFAULT_PORT, path=None):
+        """Connect to a server, over TCP or, if path is given, a Unix socket."""
+
+        if path:
+            reader, writer = await asyncio.open_unix_connection(path, limit=LINE_LIMIT)
+        else:
+            reader, writer = await asyncio.open_connection(host, port, limit=LINE_LIMIT)
+        return cls(reader, writer)
+
+    async def _read_responses(self):
+        try:
+            while True:
+                line = await self.reader.readline()
+                if not line:
+                    break
+                response = json.loads(line)
+                future   = self.waiting.pop(response.pop("id"), None)
+                if future is not None and not future.done():
+                    future.set_result(response)
+        finally:
+            for future in self.waiting.values():
+                if not future.done():
+                    future.set_exception(ConnectionError("Connection to server closed"))
+            self.waiting.clear()
+
+    def send(self, op, **fields):
+        """Send a request without waiting for the response.
+
+        Returns:
+            A future for the response, as a dict, which raises ServerError if the server
+            reports an error
+        """
+
+        request_id   = self.next_id
+        self.next_id += 1
+
+        future = asyncio.get_running_loop().create_future()
+        self.waiting[request_id] = future
+        self.writer.write(json.dumps(dict(fields, op=op, id=request_id), separators=(",", ":")).encode()
+                          + b"\n")
+
+        return asyncio.ensure_future(self._checked(future))
+
+    @staticmethod
+    async def _checked(future):
+        response = await future
+        if "error" in response:
+            raise ServerError(response["error"])
+        return response
+
+    async def request(self, op, **fields):
+        """Send a request and wait for its response."""
+
+        return await self.send(op, **fields)
+
+    async def new_game(self, width, height, density=0.2, seed=None):
+        fields = {"width": width, "height": height, "density": density}
+        if seed is not None:
+            fields["seed"] = seed
+        return await self.request("new", **fields)
+
+    async def click(self, game, x, y):
+        return await self.request("click", game=game, x=x, y=y)
+
+    async def click_many(self, game, cells):
+        return await self.request("click", game=game, cells=cells)
+
+    async def toggle_flag(self, game, x, y):
+        return await self.request("flag", game=game, x=x, y=y)
+
+    async def flag_many(self, game, cells):
+        return await self.request("flag", game=game, cells=cells)
+
+    async def observe(self, game, full=False):
+        return await self.request("observe", game=game, full=full)
+
+    async def close_game(self, game):
+        return await self.request("close", game=game)
+
+    async def close(self):
+        """Close the connection."""
+
+        self.writer.close()
+        await self.task
+
+
+class _RemoteBoard:
+    """The little of a Board that MineSweeperAI looks at."""
+
+    def __init__(self, w, h):
+        self.w = w
+        self.h = h
+
+    @property
+    def neighbours(self):
+        return neighbour_lookup(self.w, self.h)
+
+
+class RemoteGame:
+    """A local copy of what can be seen of a game on a server, which MineSweeperAI can play."""
+
+    def __init__(self, info):
+        """Create a copy of a new game.
+
+        Parameters:
+            info: The server's response to the "new" request that started the game
+        """
+
+        self.game_id = info["game"]
+        self.board   = _RemoteBoard(info["width"], info["height"])
+        self.bombs   = info["bombs"]
+
+        # (x, y) -> state of every revealed cell, as for MineSweeperGame#cell
+        self.revealed = {}
+        self.flags    = set()
+
+        self.finished = False
+        self.won      = False
+        self.moves    = 0
+
+        self.observers = []
+
+        # (op, fields) for every request the AI has asked for and not been sent yet
+        self.outbox = []
+
+    def board_width(self):
+        return self.board.w
+
+    def board_height(self):
+        return self.board.h
+
+    def num_bombs(self):
+        return self.bombs
+
+    def subscribe(self, observer, snapshots=None):
+        # Games on a server can't be rolled back, so there will never be a snapshot to take
+        self.observers.append(observer)
+
+    def unsubscribe(self, observer):
+        self.observers.remove(observer)
+
+    def revealed_cell_tuples(self):
+        return [(x, y, state) for (x, y), state in self.revealed.items()]
+
+    def click(self, x, y):
+        self.outbox.append(("click", {"x": x, "y": y}))
+        return []
+
+    def click_many(self, cells):
+        self.outbox.append(("click", {"cells": list(cells)}))
+        return []
+
+    def toggle_flag(self, x, y):
+        self.outbox.append(("flag", {"x": x, "y": y}))
+        return []
+
+    def flag_many(self, cells):
+        self.outbox.append(("flag", {"cells": list(cells)}))
+        return []
+
+    def apply(self, response):
+        """Bring the copy up to date with a response from the server, telling observers."""
+
+        changes = [tuple(change) for change in response["changes"]]
+        for x, y, state in changes:
+            self.flags.discard((x, y))
+            self.revealed.pop((x, y), None)
+            if state == FLAGGED:
+                self.flags.add((x, y))
+            elif state is not None:
+                self.revealed[(x, y)] = state
+
+        self.finished = response["finished"]
+        self.won      = response["won"]
+        self.moves    = response["moves"]
+
+        if changes:
+            for observer in self.observers:
+                observer(changes)
+
+
+async def play_remote(client, width, height, density=0.2, seed=None, heuristic="local",
+                      latencies=None):
+    """Play a game on a server to completion with MineSweeperAI.
+
+    Parameters:
+        client: The GameClient to play through
+        width: The width of the board, in cells
+        height: The height of the board, in cells
+        density: The density of bombs on the board, 0-1
+        seed: The seed for the board, None for a random one
+        heuristic: The heuristic stage for the AI to use, see MineSweeperAI
+        latencies: A list to add the time taken by each request to, in seconds, or None
+
+    Returns:
+        A dict with keys seed, won, moves and requests
+    """
+
+    game = RemoteGame(await client.new_game(width, height, density, seed))
+    ai   = MineSweeperAI(game, heuristic=heuristic)
+
+    requests = 0
+    try:
+        while not game.finished:
+            ai.move()
+            outbox, game.outbox = game.outbox, []
+            if not outbox:
+                raise RuntimeError("The AI has no move to make in an unfinished game")
+
+            # Send the whole move at once, then apply the answers in order
+            sent    = time.perf_counter()
+            pending = [client.send(op, game=game.game_id, **fields) for op, fields in outbox]
+            for future in pending:
+                game.apply(await future)
+                if latencies is not None:
+                    latencies.append(time.perf_counter() - sent)
+            requests += len(pending)
+    finally:
+        await client.close_game(game.game_id)
+
+    return {"seed": seed, "won": game.won, "moves": game.moves, "requests": requests}
+
+
+def _percentile(ordered, fraction):
+    return ordered[min(int(fraction * len(ordered)), len(ordered) - 1)] if ordered else 0.0
+
+
+async def run_load(num_games, width, height, density=0.2, seed=0, concurrency=100, connections=8,
+                   heuristic="local", host="127.0.0.1", port=DEFAULT_PORT, path=None, local=False):
+    """Play many games with the AI against a server at once, and report how it coped.
+
+    Game i is played on a board seeded with [seed, i], as for run_batch.
+
+    Parameters:
+        num_games: The number of games to play
+        width: The width of each board, in cells
+        height: The height of each board, in cells
+        density: The density of bombs on each board, 0-1
+        seed: The base seed, an int
+        concurrency: The most games in play at once
+        connections: The number of connections to spread the games over
+        heuristic: The heuristic stage for the AI to use, see MineSweeperAI
+        host: The server's TCP address
+        port: The server's TCP port
+        path: The server's Unix socket, instead of TCP
+        local: True to start a server in this process to play against, on a free TCP port,
+               rather than connecting to one.  The AI and server then share the process, so
+               this measures the two together.
+
+    Returns:
+        A dict summarising the run: games, wins, moves, requests, seconds, moves_per_second,
+        requests_per_second, and the median, 99th percentile and worst request latency
+        in milliseconds.
+    """
+
+    server = None
+    if local:
+        server = await GameServer().start("127.0.0.1", 0)
+        host, port, path = "127.0.0.1", server.sockets[0].getsockname()[1], None
+
+    clients   = [await GameClient.connect(host, port, path) for _ in range(max(1, connections))]
+    latencies = []
+    results   = []
+    next_game = iter(range(num_games))
+
+    async def worker(client):
+        for i in next_game:
+            results.append(await play_remote(client, width, height, density, [seed, i], heuristic,
+                                             latencies))
+
+    start = time.perf_counter()
+    try:
+        await asyncio.gather(*(worker(clients[i % len(clients)])
+                               for i in range(max(1, min(concurrency, num_games)))))
+    finally:
+        for client in clients:
+            await client.close()
+        if server is not None:
+            server.close()
+            await server.wait_closed()
+    seconds = time.perf_counter() - start
+
+    latencies.sort()
+    moves    = sum(result["moves"] for result in results)
+    requests = sum(result["requests"] for result in results)
+    return {"games": len(results),
+            "wins": sum(result["won"] for result in results),
+            "moves": moves,
+            "requests": requests,
+            "seconds": seconds,
+            "moves_per_second": moves / seconds if seconds else 0.0,
+            "requests_per_second": requests / seconds if seconds else 0.0,
+            "latency_p50_ms": _percentile(latencies, 0.5) * 1000,
+            "latency_p99_ms": _percentile(latencies, 0.99) * 1000,
+            "latency_max_ms": _percentile(latencies, 1.0) * 1000}
@@ -0,0 +1,196 @@
+"""A file of pre-generated boards, so that different runs (and versions of the AI) can be compared
+on exactly the same boards without generating them again.
+
+The file is a fixed-size header followed by one packed bitmap of bombs per board, all boards
+being the same size:
+
+    magic      8 bytes   b"MSCORPUS"
+    version    uint32    currently 1
+    width      uint32    the width of every board, in cells
+    height     uint32    the height of every board, in cells
+    count      uint32    the number of boards
+    density    float64   the bomb density the boards were generated with
+    seed       int64     the base seed they were generated from, or -1 if not known
+
+all little-endian, then for each board ceil(width * height / 8) bytes holding one bit per cell,
+row by row, least significant bit first.
+
+A BoardCorpus maps the file into memory rather than reading it, so opening one is instant
+however big it is, and processes working from the same corpus share its pages rather than each
+holding a copy.  Only the boards actually played are unpacked."""
+
+import argparse
+import mmap
+import struct
+import sys
+from functools import lru_cache
+
+import numpy as np
+
+from .board import Board
+
+
+MAGIC   = b"MSCORPUS"
+VERSION = 1
+HEADER  = struct.Struct("<8sIIIIdq")
+
+
+def write_corpus(path, boards, density=0.0, seed=-1):
+    """Write boards to a corpus file.
+
+    Boards are written as they come, so an iterable of them is never held in memory at once.
+
+    Parameters:
+        path: The file to write
+        boards: An iterable of Board objects, all the same size
+        density: The bomb density the boards were generated with, recorded in the header
+        seed: The seed the boards were generated from, recorded in the header, -1 if not known
+    """
+
+    width = height = None
+    count = 0
+    with open(path, "wb") as handle:
+        # The header is written again at the end, once the size and count are known
+        handle.write(bytes(HEADER.size))
+        for board in boards:
+            if width is None:
+                width, height = board.width(), board.height()
+            elif board.width() != width or board.height() != height:
+                raise ValueError("Every board in a corpus must be the same size")
+
+            handle.write(np.packbits(board.bombs.ravel(), bitorder="little").tobytes())
+            count += 1
+
+        if count == 0:
+            raise ValueError("A corpus needs at least one board")
+
+        handle.seek(0)
+        handle.write(HEADER.pack(MAGIC, VERSION, width, height, count, density, seed))
+
+
+def generate_corpus(path, num_boards, width, height, density, seed=None):
+    """Generate boards and write them to a corpus file.
+
+    Board i is generated with the seed [seed, i], so is the same board as game i of a batch
+    played by run_batch with the same seed.
+
+    Parameters:
+        path: The file to write
+        num_boards: How many boards to generate
+        width: The width of each board, in cells
+        height: The height of each board, in cells
+        density: The density of bombs on each board, 0-1
+        seed: The base seed, an int.  None picks one at random.
+    """
+
+    if seed is None:
+        seed = int(np.random.SeedSequence().entropy % 2**63)
+
+    boards = (Board(width, height, density, seed=[seed, i]) for i in range(num_boards))
+    write_corpus(path, boards, density, seed)
+
+
+class BoardCorpus:
+    """A read-only corpus file, mapped into memory, offering its boards by index."""
+
+    def __init__(self, path):
+        """Open a corpus file.
+
+        Parameters:
+            path: The file to open, as written by #write_corpus
+        """
+
+        self.path = path
+        self.file = open(path, "rb")
+        try:
+            self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # An empty file can't be mapped
+            self.file.close()
+            raise ValueError(f"{path} is not a version {VERSION} board corpus")
+
+        if len(self.map) < HEADER.size:
+            self.close()
+            raise ValueError(f"{path} is not a version {VERSION} board corpus")
+        magic, version, self.width, self.height, self.count, self.density, self.seed = \
+            HEADER.unpack_from(self.map, 0)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError(f"{path} is not a version {VERSION} board corpus")
+
+        self.entry_size = (self.width * self.height + 7) // 8
+        if len(self.map) < HEADER.size + self.count * self.entry_size:
+            self.close()
+            raise ValueError(f"{path} is too short for the {self.count} boards its header claims")
+
+        # A view onto the file, one row per board; nothing is read until it's used
+        self.bitmaps = np.frombuffer(self.map, dtype=np.uint8, count=self.count * self.entry_size,
+                                     offset=HEADER.size).reshape(self.count, self.entry_size)
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, index):
+        return self.board(index)
+
+    def __iter__(self):
+        return (self.board(i) for i in range(self.count))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def bombs(self, index):
+        """Unpack the bombs of board index, as a (height, width) boolean array."""
+
+        cells = self.width * self.height
+        return np.unpackbits(self.bitmaps[index], count=cells, bitorder="little") \
+                 .view(bool).reshape(self.height, self.width)
+
+    def board(self, index):
+        """Return board index of the corpus as a Board."""
+
+        return Board.from_bombs(self.bombs(index))
+
+    def close(self):
+        """Unmap and close the file.  Boards already returned are unaffected."""
+
+        self.bitmaps = None
+        self.map.close()
+        self.file.close()
+
+
+@lru_cache(maxsize=4)
+def open_corpus(path):
+    """Return a BoardCorpus for path, opened once per process and shared by every caller."""
+
+    return BoardCorpus(path)
+
+
+def _size(text):
+    width, _, height = text.partition("x")
+    return int(width), int(height or width)
+
+
+def main(argv=None):
+    """Command line entry point: generate a corpus file."""
+
+    parser = argparse.ArgumentParser(description="Generate a corpus of minesweeper boards")
+    parser.add_argument("path", help="the corpus file to write")
+    parser.add_argument("--boards", type=int, default=1000, help="how many boards to generate")
+    parser.add_argument("--size", type=_size, default=(100, 100), help="board size, as WIDTHxHEIGHT")
+    parser.add_argument("--density", type=float, default=0.2, help="bomb density, 0-1")
+    parser.add_argument("--seed", type=int, default=None, help="the base seed (default: random)")
+    args = parser.parse_args(argv)
+
+    width, height = args.size
+    generate_corpus(args.path, args.boards, width, height, args.density, args.seed)
+    print(f"Wrote {args.boards} {width}x{height} boards to {args.path}")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
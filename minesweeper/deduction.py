@@ -0,0 +1,385 @@
+"""Deduces safe cells and mines from overlapping number constraints.
+
+Every revealed number gives a linear equation over the unknown cells around it: the sum of the
+cells' mine indicators (each 0 or 1) equals the number less the flags around it.  Two kinds of
+reasoning are applied to the whole set of equations:
+
+ 1. Pairwise set differences.  If two constraints overlap and one needs as many more mines as
+    it has cells outside the overlap, those outside cells must all be mines and the other
+    constraint's outside cells all safe.  This covers subset patterns and the classic 1-2-1.
+ 2. Gaussian elimination.  The equations are kept as a sparse matrix in reduced row echelon
+    form.  Any reduced row whose right hand side equals the smallest (or largest) value its
+    left hand side can take with 0/1 cells pins every cell in that row.
+
+The system is incremental: constraints are added as numbers are revealed and cells are
+substituted out as they become known, so the elimination work done on one move is kept for the
+next rather than thrown away.  Work on the matrix is deferred until #deduce is called, so the
+many constraints that are added and then fully resolved by simpler means in between never
+reach it.  Rows are kept as integers, scaled down by their common divisor, rather than
+fractions.
+
+Like a game, the system can take snapshots and be restored to them, for lookahead."""
+
+from math import gcd
+
+# Kinds of entry in a system's journal, see #ConstraintSystem.snapshot
+_ADDED  = 0
+_VALUE  = 1
+_MATRIX = 2
+
+
+class ConstraintSystem:
+    """A set of linear constraints over unknown cells, kept reduced as it changes."""
+
+    def __init__(self):
+        """Create an empty constraint system."""
+
+        # The constraints as given: key -> [set of unknown cells, number of mines among them]
+        self.constraints         = {}
+        self.constraints_by_cell = {}
+
+        # The reduced matrix: row id -> [{cell: coefficient}, right hand side]
+        self.rows     = {}
+        # Pivot cell -> the one row it appears in, and cell -> every row it appears in
+        self.pivots   = {}
+        self.columns  = {}
+        self.next_row = 0
+
+        # Constraints and rows changed since the last #deduce
+        self.dirty_constraints = set()
+        self.dirty_rows        = set()
+
+        # Work waiting for the next #deduce: constraints to add as rows, and cell values to
+        # substitute into the rows already there
+        self.pending_rows   = set()
+        self.pending_values = {}
+
+        # Undo log of changes since the first live snapshot, or None when there isn't one, and
+        # whether the matrix has been saved in it since the last snapshot; see #snapshot
+        self.journal      = None
+        self.matrix_saved = False
+
+    def snapshot(self):
+        """Take a snapshot of the system that #restore can later return it to.
+
+        As with MineSweeperGame#snapshot, this starts a journal of changes to the constraints
+        rather than copying them, so that observing a few cells change and changing them back
+        costs in proportion to those cells.  The reduced matrix, and the work waiting for
+        #deduce, are copied into the journal on the first #deduce after a snapshot instead, as
+        undoing an elimination would cost as much.  Call #forget_snapshots when done with them.
+
+        Returns:
+            An opaque token to pass to #restore
+        """
+
+        if self.journal is None:
+            self.journal = []
+        self.matrix_saved = False
+
+        return len(self.journal)
+
+    def restore(self, snapshot):
+        """Return the system to the state it was in when a snapshot was taken.  The snapshot
+        stays live, so it can be restored again after more changes.
+
+        Parameters:
+            snapshot: A token returned by #snapshot
+        """
+
+        if self.journal is None or len(self.journal) < snapshot:
+            raise ValueError("The snapshot is no longer valid")
+
+        while len(self.journal) > snapshot:
+            entry = self.journal.pop()
+            if entry[0] == _ADDED:
+                _, key, pending = entry
+                for cell in self.constraints.pop(key)[0]:
+                    keys = self.constraints_by_cell[cell]
+                    keys.discard(key)
+                    if not keys:
+                        del self.constraints_by_cell[cell]
+                self.dirty_constraints.discard(key)
+                if not pending:
+                    self.pending_rows.discard(key)
+            elif entry[0] == _VALUE:
+                _, cell, value, keys, deleted, dirty, pending = entry
+                self.constraints.update(deleted)
+                self.constraints_by_cell[cell] = keys
+                for key in keys:
+                    constraint = self.constraints[key]
+                    constraint[0].add(cell)
+                    constraint[1] += value
+                self.dirty_constraints -= keys
+                self.dirty_constraints |= dirty
+                if pending is None:
+                    self.pending_values.pop(cell, None)
+                else:
+                    self.pending_values[cell] = pending
+            else:
+                (_, self.rows, self.pivots, self.columns, self.next_row, self.dirty_constraints,
+                 self.dirty_rows, self.pending_rows, self.pending_values) = entry
+
+        self.matrix_saved = False
+
+    def forget_snapshots(self):
+        """Stop journalling changes, invalidating every snapshot taken so far."""
+
+        self.journal = None
+
+    def add(self, key, cells, mines):
+        """Add a constraint that exactly `mines` of `cells` are mines.
+
+        Parameters:
+            key: A hashable name for the constraint, e.g. the index of the number giving it
+            cells: The unknown cells, e.g. flat indices y * width + x; anything orderable will do
+            mines: The number of those cells that are mines
+        """
+
+        if key in self.constraints or not cells:
+            return
+
+        if self.journal is not None:
+            self.journal.append((_ADDED, key, key in self.pending_rows))
+
+        self.constraints[key] = [set(cells), mines]
+        for cell in cells:
+            self.constraints_by_cell.setdefault(cell, set()).add(key)
+        self.dirty_constraints.add(key)
+        self.pending_rows.add(key)
+
+    def set_value(self, cell, value):
+        """Substitute a cell that has become known out of every constraint.
+
+        Parameters:
+            cell: The cell, as given to #add
+            value: 1 if the cell is a mine (flagged), 0 if it is safe (revealed)
+        """
+
+        keys    = self.constraints_by_cell.pop(cell, ())
+        deleted = {}
+        if keys and self.journal is not None:
+            self.journal.append((_VALUE, cell, value, keys, deleted, keys & self.dirty_constraints,
+                                 self.pending_values.get(cell)))
+
+        for key in keys:
+            constraint     = self.constraints[key]
+            constraint[0].discard(cell)
+            constraint[1] -= value
+            if constraint[0]:
+                self.dirty_constraints.add(key)
+            else:
+                deleted[key] = self.constraints.pop(key)
+                self.dirty_constraints.discard(key)
+
+        if cell in self.columns:
+            self.pending_values[cell] = value
+
+    def _substitute(self, cell, value):
+        """Substitute a known cell out of the rows of the matrix."""
+
+        for row in self.columns.pop(cell, ()):
+            coeffs = self.rows[row][0]
+            self.rows[row][1] -= coeffs.pop(cell) * value
+            self.dirty_rows.add(row)
+
+        # The row pivoting on this cell needs a new pivot.  Its other cells are free columns, so
+        # taking it out and inserting it again picks one and clears it from every other row.
+        if cell in self.pivots:
+            row = self.pivots.pop(cell)
+            coeffs, rhs = self._remove_row(row)
+            self._insert_row(coeffs, rhs)
+
+    def _remove_row(self, row):
+        """Take a row out of the matrix, returning its coefficients and right hand side."""
+
+        coeffs, rhs = self.rows.pop(row)
+        for cell in coeffs:
+            self.columns[cell].discard(row)
+            if not self.columns[cell]:
+                del self.columns[cell]
+        self.dirty_rows.discard(row)
+
+        return coeffs, rhs
+
+    @staticmethod
+    def _eliminate(coeffs, rhs, cell, pivot_coeffs, pivot_rhs):
+        """Cancel cell out of a row using a row that pivots on it, working in integers.
+
+        Parameters:
+            coeffs: The coefficients of the row to change, updated in place
+            rhs: The right hand side of the row to change
+            cell: The cell to cancel
+            pivot_coeffs: The coefficients of the row pivoting on cell
+            pivot_rhs: The right hand side of the row pivoting on cell
+
+        Returns:
+            The new right hand side of the row
+        """
+
+        # coeffs * pivot - pivot_coeffs * factor, so that cell cancels exactly
+        pivot  = pivot_coeffs[cell]
+        factor = coeffs[cell]
+        if pivot != 1:
+            for other in coeffs:
+                coeffs[other] *= pivot
+            rhs *= pivot
+
+        for other, value in pivot_coeffs.items():
+            coeffs[other] = coeffs.get(other, 0) - factor * value
+        rhs -= factor * pivot_rhs
+
+        for other in [other for other, value in coeffs.items() if value == 0]:
+            del coeffs[other]
+
+        # Keep the numbers small
+        divisor = gcd(rhs, *coeffs.values())
+        if divisor > 1:
+            for other in coeffs:
+                coeffs[other] //= divisor
+            rhs //= divisor
+
+        return rhs
+
+    def _insert_row(self, coeffs, rhs):
+        """Reduce a new row against the matrix and add it, keeping the matrix in reduced row
+        echelon form."""
+
+        # Clear existing pivots out of the new row.  Pivot rows contain no other pivot cells,
+        # so this cannot introduce any.
+        for cell in [cell for cell in coeffs if cell in self.pivots]:
+            pivot_coeffs, pivot_rhs = self.rows[self.pivots[cell]]
+            rhs = ConstraintSystem._eliminate(coeffs, rhs, cell, pivot_coeffs, pivot_rhs)
+
+        # Linearly dependent on what we already have
+        if not coeffs:
+            return
+
+        # Keep the pivot's coefficient positive
+        pivot = min(coeffs)
+        if coeffs[pivot] < 0:
+            coeffs = {cell: -value for cell, value in coeffs.items()}
+            rhs    = -rhs
+
+        row = self.next_row
+        self.next_row += 1
+        self.rows[row]     = [coeffs, rhs]
+        self.pivots[pivot] = row
+        for cell in coeffs:
+            self.columns.setdefault(cell, set()).add(row)
+        self.dirty_rows.add(row)
+
+        # Clear the new pivot out of every other row
+        for other in list(self.columns[pivot]):
+            if other == row:
+                continue
+
+            other_coeffs, other_rhs = self.rows[other]
+            before = set(other_coeffs)
+            self.rows[other][1] = ConstraintSystem._eliminate(other_coeffs, other_rhs, pivot, coeffs, rhs)
+            for cell in before - other_coeffs.keys():
+                self.columns[cell].discard(other)
+                if not self.columns[cell]:
+                    del self.columns[cell]
+            for cell in other_coeffs.keys() - before:
+                self.columns.setdefault(cell, set()).add(other)
+            self.dirty_rows.add(other)
+
+            if not other_coeffs:
+                self._remove_row(other)
+
+    def _deduce_pairs(self, safe, mines):
+        """Apply the set-difference rule to every dirty constraint and its overlapping
+        neighbours, adding what is found to safe and mines."""
+
+        for key in self.dirty_constraints:
+            cells, count = self.constraints[key]
+
+            # A constraint on its own
+            if count == 0:
+                safe.update(cells)
+            elif count == len(cells):
+                mines.update(cells)
+
+            overlapping = {other for cell in cells for other in self.constraints_by_cell[cell]}
+            overlapping.discard(key)
+            for other in overlapping:
+                other_cells, other_count = self.constraints[other]
+
+                # If `other` needs as many mines beyond `key` as it has cells outside `key`, then
+                # those are all mines, the overlap holds all of key's mines, and the rest of key
+                # is safe.  Likewise the other way around.
+                for a_cells, a_count, b_cells, b_count in ((cells, count, other_cells, other_count),
+                                                           (other_cells, other_count, cells, count)):
+                    b_only = b_cells - a_cells
+                    if b_count - a_count == len(b_only):
+                        mines.update(b_only)
+                        safe.update(a_cells - b_cells)
+
+        self.dirty_constraints = set()
+
+    def _deduce_rows(self, safe, mines):
+        """Check every dirty row of the reduced matrix for cells it pins, adding what is found
+        to safe and mines."""
+
+        for row in self.dirty_rows:
+            coeffs, rhs = self.rows[row]
+
+            lowest  = sum(value for value in coeffs.values() if value < 0)
+            highest = sum(value for value in coeffs.values() if value > 0)
+
+            # Only reachable with every positive cell empty and every negative cell mined
+            if rhs == lowest:
+                safe.update(cell for cell, value in coeffs.items() if value > 0)
+                mines.update(cell for cell, value in coeffs.items() if value < 0)
+            # ...and vice versa
+            elif rhs == highest:
+                mines.update(cell for cell, value in coeffs.items() if value > 0)
+                safe.update(cell for cell, value in coeffs.items() if value < 0)
+
+        self.dirty_rows = set()
+
+    def _save_matrix(self):
+        """Copy the matrix, and the work waiting for #deduce, into the journal for #restore."""
+
+        self.journal.append((_MATRIX,
+                             {row: [dict(coeffs), rhs] for row, (coeffs, rhs) in self.rows.items()},
+                             dict(self.pivots),
+                             {cell: set(rows) for cell, rows in self.columns.items()},
+                             self.next_row, set(self.dirty_constraints), set(self.dirty_rows),
+                             set(self.pending_rows), dict(self.pending_values)))
+        self.matrix_saved = True
+
+    def _flush(self):
+        """Bring the matrix up to date with the constraints."""
+
+        for cell, value in self.pending_values.items():
+            self._substitute(cell, value)
+        self.pending_values = {}
+
+        # Constraints are added as they stand now, with any cells known since already removed
+        for key in sorted(self.pending_rows):
+            if key in self.constraints:
+                cells, mines = self.constraints[key]
+                self._insert_row({cell: 1 for cell in cells}, mines)
+        self.pending_rows = set()
+
+    def deduce(self):
+        """Find every cell whose state is fixed by the constraints that have changed since the
+        last call.
+
+        Returns:
+            (safe, mines): sets of cells that are certainly safe and certainly mines
+        """
+
+        if self.journal is not None and not self.matrix_saved:
+            self._save_matrix()
+        self._flush()
+
+        safe  = set()
+        mines = set()
+        self._deduce_pairs(safe, mines)
+        self._deduce_rows(safe, mines)
+
+        # Only possible if the constraints contradict each other (e.g. a wrongly placed flag)
+        contradictions = safe & mines
+        return safe - contradictions, mines - contradictions
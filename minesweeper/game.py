@@ -3,34 +3,243 @@
 Encodes movement rules, and win/lose conditions."""
 
 from enum import Enum
+from array import array
+from collections.abc import Sequence
+from contextlib import contextmanager
+
+import numpy as np
 
 from .board import BOMB
+from .stats import make_stats
 FLAGGED = "f"
 
+# How cells other than numbers 0-8 appear in MineSweeperGame#observation
+OBSERVED_UNKNOWN = -1
+OBSERVED_FLAGGED = -2
+OBSERVED_BOMB    = -3
+
+# Observation codes to and from the states returned by MineSweeperGame#cell
+OBSERVED_STATES = {OBSERVED_UNKNOWN: None, OBSERVED_FLAGGED: FLAGGED, OBSERVED_BOMB: BOMB}
+OBSERVED_CODES  = {state: code for code, state in OBSERVED_STATES.items()}
+
+# Kinds of entry in a game's journal, see #MineSweeperGame.snapshot
+_REVEAL = 0
+_FLAG   = 1
+
+# Moves revealing at least this many cells update the observation and list their changes in bulk
+BULK_CHANGES = 64
+
+
+class RevealedChanges(Sequence):
+    """The (x, y, state) changes made by a move that revealed many cells at once.
+
+    Reads like a list of tuples, but only builds them when something looks at them, so that big
+    moves nobody is watching don't pay for a tuple per cell."""
+
+    def __init__(self, indices, states, width):
+        """Describe the cells revealed by a move.
+
+        Parameters:
+            indices: A NumPy array of the flat indices, y * width + x, of the cells revealed
+            states: A NumPy int8 array of their numbers, or OBSERVED_BOMB for a bomb
+            width: The width of the board, in cells
+        """
+
+        self.indices = indices
+        self.states  = states
+        self.width   = width
+        self.changes = None
+
+    def _list(self):
+        if self.changes is None:
+            states = self.states.tolist()
+            if (self.states == OBSERVED_BOMB).any():
+                states = [BOMB if state == OBSERVED_BOMB else state for state in states]
+            self.changes = list(zip((self.indices % self.width).tolist(),
+                                    (self.indices // self.width).tolist(), states))
+        return self.changes
+
+    def __len__(self):
+        return len(self.indices)
+
+    def __getitem__(self, i):
+        return self._list()[i]
+
+    def __iter__(self):
+        return iter(self._list())
+
+    def __eq__(self, other):
+        return self._list() == list(other)
+
+    def __repr__(self):
+        return repr(self._list())
+
 class MineSweeperGame:
     """A game played upon a board."""
 
-    def __init__(self, board):
+    def __init__(self, board, stats=False, trace=None):
         """Create a new game for the board given.
 
         Parameters:
             board: The Board object to play upon.
+            stats: True to record timers and counters for clicks and flood fills in self.stats
+                   (see stats.py)
+            trace: A TraceWriter to record every move made in the game to (see trace.py), or
+                   None
         """
 
         self.board = board
-        self.state = [[None
-                       for _ in range(board.width())]
-                       for _ in range(board.height())]
+        # 1 for each revealed cell, indexed by y * width + x
+        self.state = bytearray(board.num_cells())
 
         # Keep a list of bombs for fast lookup, and count revealed cells
         self.flags          = set()
-        self.bomb_index     = {(x, y) for x, y, state in self.board.cell_tuples() if state == BOMB}
+        self.bomb_index     = set(self.board.bomb_tuples())
         self.revealed_count = 0
         self.moves          = 0
 
+        # Running totals for checking the win condition without scanning anything
+        self.correct_flags = 0
+        self.wrong_flags   = 0
+        self.safe_revealed = 0
+
         self.finished = False
         self.won      = False
 
+        # Callables to notify of changes to the visible state, and the objects to snapshot and
+        # restore along with the game for those that gave one, see #subscribe
+        self.observers    = []
+        self.snapshotters = {}
+
+        # The code of every cell as seen by the player, see #observation
+        self.visible = array("b", [OBSERVED_UNKNOWN]) * board.num_cells()
+
+        self.stats = make_stats(stats)
+        self.trace = trace
+
+        # Undo log of changes since the first live snapshot, or None when there isn't one
+        self.journal = None
+
+    @property
+    def observation(self):
+        """The board as the player sees it, as a read-only (height, width) int8 array.
+
+        Each cell holds its number 0-8 if revealed, or OBSERVED_UNKNOWN, OBSERVED_FLAGGED or
+        OBSERVED_BOMB.  The array is a view onto the game's own record, not a copy, so it's free
+        to get and stays up to date as the game is played."""
+
+        observation = np.frombuffer(self.visible, dtype=np.int8).reshape(self.board_height(),
+                                                                          self.board_width())
+        observation.flags.writeable = False
+        return observation
+
+    def subscribe(self, observer, snapshots=None):
+        """Register a callable to be told whenever the visible state of the game changes.
+
+        After every #click or #toggle_flag that changes anything, the observer is called with the
+        same list of changes that the move returns.
+
+        Observers that build up state of their own from the changes (such as MineSweeperAI) can
+        also give an object to take snapshots of that state whenever the game takes one (see
+        #snapshot).  Restoring the game then restores it before the observer is told of the
+        cells changed back, so the observer finds them as it left them and has nothing to work
+        out again.
+
+        Parameters:
+            observer: A callable taking a list of (x, y, state) tuples
+            snapshots: An object with snapshot(), restore(token) and forget_snapshots() methods
+                       like the game's own, or None
+        """
+
+        self.observers.append(observer)
+        if snapshots is not None:
+            self.snapshotters[observer] = snapshots
+
+    def unsubscribe(self, observer):
+        """Stop notifying an observer registered with #subscribe."""
+
+        self.observers.remove(observer)
+        self.snapshotters.pop(observer, None)
+
+    def _snapshot_observers(self):
+        """Take a snapshot of every observer that asked for them, for #snapshot."""
+
+        return [(snapshotter, snapshotter.snapshot()) for snapshotter in self.snapshotters.values()]
+
+    def _restore_observers(self, snapshots):
+        """Restore the observers' snapshots taken by #_snapshot_observers, for #restore."""
+
+        for snapshotter, snapshot in snapshots:
+            snapshotter.restore(snapshot)
+
+    def _notify(self, coords):
+        """Turn a list of (x, y) coordinates whose visible state has changed into a list of
+        (x, y, state) changes, pass them to any observers, and return them."""
+
+        changes = [(x, y, self.cell(x, y)) for x, y in coords]
+        self._observe(changes)
+        for observer in self.observers:
+            observer(changes)
+
+        return changes
+
+    def _notify_revealed(self, spans):
+        """Notify observers of the cells revealed by #_click, as #_notify does, and return the
+        changes.
+
+        Big moves (i.e. flood fills) bring the observation up to date with a few array
+        operations over all of the cells at once, and only build a tuple for each cell if an
+        observer needs them.
+
+        Parameters:
+            spans: A list of (start, end) ranges of flat indices of the cells revealed, which
+                   may include cells revealed underneath their flags
+        """
+
+        if sum(end - start for start, end in spans) < BULK_CHANGES:
+            return self._notify(self._unflagged_coords(spans))
+
+        starts, ends = np.array(spans, dtype=np.int64).T
+        lengths = ends - starts
+        indices = np.repeat(starts - (np.cumsum(lengths) - lengths), lengths) \
+                  + np.arange(lengths.sum())
+
+        # Flagged cells keep showing their flag; everything else shows its number, or the bomb
+        # that ended the game
+        visible = np.frombuffer(self.visible, dtype=np.int8)
+        if self.flags:
+            indices = indices[visible[indices] != OBSERVED_FLAGGED]
+        states = np.frombuffer(self.board.flat_counts, dtype=np.uint8)[indices].astype(np.int8)
+        states[np.frombuffer(self.board.flat_bombs, dtype=np.bool_)[indices]] = OBSERVED_BOMB
+        visible[indices] = states
+
+        changes = RevealedChanges(indices, states, self.board_width())
+        if self.observers:
+            changes = list(changes)
+            for observer in self.observers:
+                observer(changes)
+
+        return changes
+
+    def _unflagged_coords(self, spans):
+        """List the (x, y) coordinates of the cells in spans of flat indices, leaving out any
+        that are flagged."""
+
+        width  = self.board_width()
+        flags  = self.flags
+        coords = [(i % width, i // width) for start, end in spans for i in range(start, end)]
+
+        return [cell for cell in coords if cell not in flags] if flags else coords
+
+    def _observe(self, changes):
+        """Bring the observation up to date with a list of (x, y, state) changes."""
+
+        visible = self.visible
+        width   = self.board_width()
+        codes   = OBSERVED_CODES
+        for x, y, state in changes:
+            visible[y * width + x] = codes.get(state, state)
+
     def cell_flagged(self, x, y):
         """Has the cell at x, y been flagged?
 
@@ -43,22 +252,209 @@ class MineSweeperGame:
     def cell_revealed(self, x, y):
         """Has the cell at x, y been revealed?"""
 
-        if x < 0 or x >= len(self.state[0]):
+        if x < 0 or x >= self.board.width():
             return None
-        if y < 0 or y >= len(self.state):
+        if y < 0 or y >= self.board.height():
             return None
 
-        return self.state[y][x]
+        return self.state[y * self.board.width() + x] == 1
+
+    def _set_revealed(self, x, y):
+        """Mark the cell at x, y as revealed, without counting it or checking anything."""
+
+        i = y * self.board.width() + x
+        self.state[i] = 1
+        self._journal_reveal(i, i + 1)
+
+    def _journal_reveal(self, start, end):
+        """Record in the journal, if there is one, that the cells with flat indices start to end
+        have been revealed, for #restore to hide again with #_unreveal."""
+
+        if self.journal is not None:
+            self.journal.append((_REVEAL, start, end))
+
+    def _unreveal(self, start, end):
+        """Hide the cells with flat indices start to end again, for #restore."""
+
+        self.state[start:end] = bytes(end - start)
+
+    def snapshot(self):
+        """Take a snapshot of the game that #restore can later return it to.
+
+        Rather than copying the game, this starts a journal of every change made from now on,
+        and #restore undoes the journal back to the snapshot, so both cost in proportion to the
+        number of cells changed in between.  Observers subscribed with a snapshots object take
+        snapshots of their own at the same time.  Snapshots nest: several can be live at once, and
+        restoring one invalidates any taken after it.  Call #forget_snapshots when done with them
+        to stop journalling.
+
+        Returns:
+            An opaque token to pass to #restore
+        """
+
+        if self.journal is None:
+            self.journal = []
+
+        snapshot = (len(self.journal), self.revealed_count, self.moves, self.correct_flags,
+                    self.wrong_flags, self.safe_revealed, self.finished, self.won,
+                    self._snapshot_observers())
+        if self.trace is not None:
+            self.trace.snapshot(snapshot)
+
+        return snapshot
+
+    def restore(self, snapshot):
+        """Return the game to the state it was in when a snapshot was taken.
+
+        Observers are notified of every cell whose visible state changes back, as for a move.
+        The snapshot stays live, so it can be restored again after more changes.
+
+        Parameters:
+            snapshot: A token returned by #snapshot
+
+        Returns:
+            A list of (x, y, state) tuples for the cells whose visible state changed.
+        """
+
+        position = snapshot[0]
+        if self.journal is None or len(self.journal) < position:
+            raise ValueError("The snapshot is no longer valid")
+        if self.trace is not None:
+            self.trace.restore(snapshot)
+
+        width   = self.board.width()
+        changed = {}
+        while len(self.journal) > position:
+            kind, a, b = self.journal.pop()
+            if kind == _REVEAL:
+                self._unreveal(a, b)
+                changed.update(((i % width, i // width), None) for i in range(a, b))
+            else:
+                self._undo_flag(a, b)
+                changed[(a, b)] = None
+
+        (_, self.revealed_count, self.moves, self.correct_flags, self.wrong_flags,
+         self.safe_revealed, self.finished, self.won, observers) = snapshot
+        self._restore_observers(observers)
+
+        self.stats.count("restores")
+
+        return self._notify(list(changed)) if changed else []
+
+    def forget_snapshots(self):
+        """Stop journalling changes, invalidating every snapshot taken so far."""
+
+        if self.trace is not None:
+            self.trace.forget_snapshots()
+        for snapshotter in self.snapshotters.values():
+            snapshotter.forget_snapshots()
+        self.journal = None
+
+    def _snapshotting(self):
+        """Is there a live snapshot, i.e. one taken since #forget_snapshots was last called?"""
+
+        return self.journal is not None
+
+    @contextmanager
+    def trial(self):
+        """A context manager that undoes whatever is done to the game inside it, e.g. to try a
+        move and see what happens:
+
+            with game.trial():
+                game.click(x, y)
+                ...
+
+        Trials can be nested."""
+
+        outermost = not self._snapshotting()
+        snapshot  = self.snapshot()
+        try:
+            yield self
+        finally:
+            self.restore(snapshot)
+            if outermost:
+                self.forget_snapshots()
 
     def toggle_flag(self, x, y):
+        """Flag cell x, y as a bomb, or remove the flag if it already has one.
+
+        Parameters:
+            x: The row to flag
+            y: The column to flag
+
+        Returns:
+            A list of (x, y, state) tuples for the cells whose visible state changed, where state
+            is the new value of #cell(x, y).  Empty if x, y is off the board.
+        """
+
+        # As for #click, there's nothing to do off the board
+        if self.cell_revealed(x, y) is None:
+            return []
+
+        if self.trace is not None:
+            self.trace.toggle_flag(x, y)
+        self.stats.count("flags")
+        self._toggle_flag(x, y)
+        self._check_win()
+
+        return self._notify([(x, y)])
+
+    def flag_many(self, cells):
+        """Flag every cell in a list that is not already flagged or revealed.
+
+        Equivalent to calling #toggle_flag on each, but checks for a win and notifies observers
+        once, at the end.  Cells off the board are ignored.
+
+        Parameters:
+            cells: An iterable of (x, y) tuples
+
+        Returns:
+            A list of (x, y, state) tuples for the cells whose visible state changed.
+        """
+
+        if self.trace is not None:
+            cells = [(x, y) for x, y in cells if self.cell_revealed(x, y) is not None]
+            self.trace.flag_many(cells)
+
+        changed = []
+        for x, y in cells:
+            revealed = self.cell_revealed(x, y)
+            if revealed or revealed is None or self.cell_flagged(x, y):
+                continue
+            self._toggle_flag(x, y)
+            changed.append((x, y))
+
+        self.stats.count("flags", len(changed))
+        self._check_win()
+
+        return self._notify(changed) if changed else []
+
+    def _toggle_flag(self, x, y):
+        """Flag or unflag cell x, y, keeping the flag counters up to date."""
+
         self.moves += 1
+        if self.journal is not None:
+            self.journal.append((_FLAG, x, y))
 
         if self.cell_flagged(x, y):
             self.flags.remove((x, y))
+            change = -1
         else:
             self.flags.add((x, y))
+            change = 1
 
-        self._check_win()
+        if self.board.is_bomb(x, y):
+            self.correct_flags += change
+        else:
+            self.wrong_flags   += change
+
+    def _undo_flag(self, x, y):
+        """Undo a flag toggled on cell x, y, for #restore; the counters are restored separately."""
+
+        if (x, y) in self.flags:
+            self.flags.remove((x, y))
+        else:
+            self.flags.add((x, y))
 
     def click(self, x, y):
         """Reveal cell at x, y.
@@ -66,73 +462,200 @@ class MineSweeperGame:
         Parameters:
             x: The row to reveal
             y: The column to reveal
+
+        Returns:
+            A list of (x, y, state) tuples for the cells whose visible state changed, where state
+            is the new value of #cell(x, y).  Empty if the click did nothing.  For clicks that
+            reveal many cells, a RevealedChanges that reads like such a list.
+        """
+
+        if self.trace is not None:
+            self.trace.click(x, y)
+        with self.stats.timer("click"):
+            revealed = self._click(x, y)
+        if not revealed:
+            return []
+
+        # We may have won!
+        self._check_win()
+
+        return self._notify_revealed(revealed)
+
+    def click_many(self, cells):
+        """Reveal every cell in a list, stopping early if one of them is a bomb.
+
+        Equivalent to calling #click on each, but checks for a win and notifies observers once, at
+        the end.
+
+        Parameters:
+            cells: An iterable of (x, y) tuples
+
+        Returns:
+            A list of (x, y, state) tuples for the cells whose visible state changed, or a
+            RevealedChanges as for #click.
+        """
+
+        if self.trace is not None:
+            cells = list(cells)
+            self.trace.click_many(cells)
+
+        revealed = []
+        with self.stats.timer("click"):
+            for x, y in cells:
+                if self.finished:
+                    break
+                revealed += self._click(x, y)
+
+        self._check_win()
+
+        return self._notify_revealed(revealed) if revealed else []
+
+    def _click(self, x, y):
+        """Reveal cell at x, y, without checking for a win or notifying anyone.
+
+        Returns:
+            A list of (start, end) ranges of the flat indices of the cells revealed, as for
+            #_fill_spans.
         """
 
         # Don't permit people to take actions over and over on
         # the same cell
         if self.cell_revealed(x, y) or self.cell_flagged(x, y):
-            return
+            return []
 
         self.moves += 1
+        self.stats.count("clicks")
 
         # Lose if clicking on a bomb
         if self.board.is_bomb(x, y):
-            self.state[y][x]     = True
+            self._set_revealed(x, y)
             self.revealed_count += 1
             self.finished = True
             self.won      = False
-            return
+            i = y * self.board_width() + x
+            return [(i, i + 1)]
 
         # If the number is not 0, don't fill
+        revealed_before = self.revealed_count
         if self.board.cell(x, y) > 0:
-            self.state[y][x] = True
+            self._set_revealed(x, y)
             self.revealed_count += 1
+            i = y * self.board_width() + x
+            revealed = [(i, i + 1)]
 
         # If clicking a number of 0, spider out and clear other cells
         elif self.board.cell(x, y) == 0:
-            self._fill_click(x, y)
+            with self.stats.timer("fill_click"):
+                revealed = self._fill_click(x, y)
 
-        # We may have won!
-        self._check_win()
+        self.safe_revealed += self.revealed_count - revealed_before
+        self.stats.observe("revealed_per_click", self.revealed_count - revealed_before)
+
+        return revealed
 
     def _fill_click(self, init_x, init_y):
         """Fill an area around the clicked area, revealing all cells that have 0 adjacent bombs.
 
-        Iterative to prevent recursion issues with large maps.
-
         Parameters:
             init_x: The initial x-location (row) to start filling from
             init_y: The initial y-location (column) to start filling from
+
+        Returns:
+            A list of (start, end) ranges of the flat indices of the cells revealed, as for
+            #_fill_spans.  Flagged cells are revealed underneath their flag.
         """
 
-        # Start looking all around the cell
-        cell_stack = set([(init_x, init_y)])
+        return self._fill_spans(init_y * self.board.width() + init_x)
 
-        while len(cell_stack) > 0:
-            x, y = cell_stack.pop()
+    def _fill_spans(self, init):
+        """Reveal the region opened by clicking on the 0 at flat index init, as a scanline fill.
 
-            # Skip when exceeding board bounds
-            if x < 0 or y < 0 \
-               or x >= self.board.width() or y >= self.board.height():
-                continue
-            # Skip over already revealed cells
-            if self.state[y][x]:
-                continue
+        The region is worked through a horizontal run of 0s at a time.  Each run reveals the
+        rows above, on and below it, one cell wider at each end, and any unrevealed runs of 0s
+        found in the rows above and below are queued in turn.  Runs are found and revealed
+        with bytes searches and slice assignments over the flat state, so the Python loop runs
+        once per run rather than once per cell, and no cell is queued twice.
 
-            # Set cell to be clicked
-            self.state[y][x]     = True
-            self.revealed_count += 1
+        Parameters:
+            init: The flat index, y * width + x, of a 0 that has not been revealed
 
-            # If the cell state is 0, add immediate surroundings to cell_stack
-            if not self.board.is_bomb(x, y) and self.board.cell(x, y) == 0:
-                cell_stack.add((x-1, y-1))
-                cell_stack.add((x  , y-1))
-                cell_stack.add((x+1, y-1))
-                cell_stack.add((x-1, y  ))
-                cell_stack.add((x+1, y  ))
-                cell_stack.add((x-1, y+1))
-                cell_stack.add((x  , y+1))
-                cell_stack.add((x+1, y+1))
+        Returns:
+            A list of (start, end) ranges of flat indices, each within a single row, covering
+            exactly the cells newly revealed (including any under flags).
+        """
+
+        width = self.board.width()
+        size  = len(self.state)
+        zeros = self.board.flat_zeros
+        state = self.state
+        spans = []
+        ones  = memoryview(b"\x01" * (width + 2))
+
+        def reveal(start, end):
+            # Record the unrevealed stretches of [start, end) and then reveal all of it
+            pos = state.find(0, start, end)
+            while pos != -1:
+                stop = state.find(1, pos, end)
+                if stop == -1:
+                    stop = end
+                spans.append((pos, stop))
+                pos = state.find(0, stop, end)
+            state[start:end] = ones[:end - start]
+
+        def run(i):
+            # The whole horizontal run of 0s containing the 0 at i
+            row   = i - i % width
+            start = zeros.rfind(0, row, i)
+            end   = zeros.find(0, i, row + width)
+            return (row if start == -1 else start + 1), (row + width if end == -1 else end)
+
+        # Every run of 0s is revealed in full as it is queued, so an unrevealed 0 is always
+        # part of a run that hasn't been queued yet
+        start, end = run(init)
+        reveal(start, end)
+        stack = [(start, end)]
+
+        while stack:
+            start, end = stack.pop()
+            row = start - start % width
+            lo  = max(start - 1, row)
+            hi  = min(end + 1, row + width)
+
+            for a in (lo - width, lo + width):
+                if a < 0 or a >= size:
+                    continue
+                b = a + hi - lo
+
+                pos = zeros.find(1, a, b)
+                while pos != -1:
+                    run_start, run_end = run(pos)
+                    if not state[pos]:
+                        reveal(run_start, run_end)
+                        stack.append((run_start, run_end))
+                    pos = zeros.find(1, run_end, b)
+
+                reveal(a, b)
+
+            # The numbers at either end of the run itself
+            for i in (start - 1, end):
+                if lo <= i < hi and not state[i]:
+                    state[i] = 1
+                    spans.append((i, i + 1))
+
+        # The region is found a few cells at a time, so join up the spans that meet along each row
+        if len(spans) >= BULK_CHANGES:
+            ordered = np.array(spans, dtype=np.int64)
+            ordered = ordered[np.argsort(ordered[:, 0])]
+            joins   = (ordered[1:, 0] == ordered[:-1, 1]) & (ordered[1:, 0] % width != 0)
+            breaks  = np.flatnonzero(~joins) + 1
+            spans   = list(zip(ordered[np.r_[0, breaks], 0].tolist(),
+                               ordered[np.r_[breaks - 1, len(ordered) - 1], 1].tolist()))
+
+        self.revealed_count += sum(end - start for start, end in spans)
+        if self.journal is not None:
+            self.journal.extend((_REVEAL, start, end) for start, end in spans)
+
+        return spans
 
     def board_width(self):
         return self.board.width()
@@ -140,6 +663,11 @@ class MineSweeperGame:
     def board_height(self):
         return self.board.height()
 
+    def num_bombs(self):
+        """Returns the number of bombs hidden on the board, as shown on a minesweeper counter."""
+
+        return len(self.bomb_index)
+
     def cell(self, x, y):
         """Return this game's view of cell x, y."""
 
@@ -159,12 +687,15 @@ class MineSweeperGame:
         return tuples
 
     def _check_win(self):
-        """Scan through the bomb index and ensure all are unrevealed, but
-        all other cells revealed."""
+        """Check whether every bomb, and nothing else, is flagged and every other cell revealed.
+
+        Works from the running totals kept by #_toggle_flag and #_click, so costs the same
+        however many flags and cells there are."""
 
-        if self.flags != self.bomb_index:
+        if self.finished:
             return False
 
-        if self.revealed_count == self.board.num_cells() - len(self.bomb_index):
+        if self.wrong_flags == 0 and self.correct_flags == self.num_bombs() \
+           and self.safe_revealed == self.board.num_cells() - self.num_bombs():
             self.finished = True
             self.won = True
@@ -0,0 +1,117 @@
+"""Precomputed neighbour lookups for boards of a given size.
+
+Cells are addressed by their flat, row-major index i = y * width + x.  The table for a size holds
+the flat indices of the up-to-8 neighbours of every cell, so finding a cell's neighbours is plain
+array indexing with no bounds checks:
+
+    table = neighbour_table(width, height)
+    for k in range(8 * i, 8 * i + table.counts[i]):
+        j = table.indices[k]
+
+Tables are cached by size, so every board, game and AI of the same size shares one.  Boards of
+more than TABLE_LIMIT cells are too big to tabulate (the table costs 33 bytes a cell), so
+neighbour_lookup gives them a ComputedNeighbours instead, which has the same #neighbours method."""
+
+from array import array
+from functools import lru_cache
+
+import numpy as np
+
+# The most cells a board may have for neighbour_lookup to tabulate its neighbours
+TABLE_LIMIT = 1 << 22
+
+
+class NeighbourTable:
+    """The neighbours of every cell of a width x height board.
+
+    Attributes:
+        width: The width of the board, in cells
+        height: The height of the board, in cells
+        indices: An array of 8 entries per cell, the first counts[i] of which (starting at 8 * i)
+                 are the flat indices of cell i's neighbours; the rest are -1
+        counts: A bytes object giving the number of neighbours of each cell, 3 to 8
+    """
+
+    def __init__(self, width, height):
+        """Build the table for a board of the size given.
+
+        Parameters:
+            width: The width of the board, in cells
+            height: The height of the board, in cells
+        """
+
+        self.width  = width
+        self.height = height
+
+        # Pad the grid of indices with -1 and read the 8 shifted views around every cell
+        padded = np.pad(np.arange(width * height, dtype=np.int32).reshape(height, width), 1,
+                        constant_values=-1)
+        table  = np.stack([padded[dy:dy+height, dx:dx+width].ravel()
+                           for dy in (0, 1, 2) for dx in (0, 1, 2) if not (dx == 1 and dy == 1)], axis=1)
+
+        # Move the off-board -1s to the end of each cell's entries, keeping the rest in order
+        order = np.argsort(table < 0, axis=1, kind="stable")
+        table = np.take_along_axis(table, order, axis=1)
+
+        self.indices = array("i", table.tobytes())
+        self.counts  = (table >= 0).sum(axis=1).astype(np.uint8).tobytes()
+
+    def as_array(self):
+        """The indices as a (cells, 8) NumPy array, sharing memory with the table."""
+
+        return np.frombuffer(self.indices, dtype=np.int32).reshape(-1, 8)
+
+    def neighbours(self, i):
+        """Return the flat indices of the neighbours of cell i, as an array slice."""
+
+        return self.indices[8 * i:8 * i + self.counts[i]]
+
+
+@lru_cache(maxsize=8)
+def neighbour_table(width, height):
+    """Return the (shared) NeighbourTable for boards of the size given."""
+
+    return NeighbourTable(width, height)
+
+
+def neighbour_lookup(width, height):
+    """Return the shared NeighbourTable for boards of the size given, or a ComputedNeighbours if
+    they have more than TABLE_LIMIT cells."""
+
+    if width * height > TABLE_LIMIT:
+        return ComputedNeighbours(width, height)
+    return neighbour_table(width, height)
+
+
+class ComputedNeighbours:
+    """Works out the neighbours of a cell when asked, for boards too big to tabulate.
+
+    Has the same #neighbours method as NeighbourTable, returning neighbours in the same order,
+    but holds nothing per cell."""
+
+    def __init__(self, width, height):
+        """Create a lookup for a board of the size given.
+
+        Parameters:
+            width: The width of the board, in cells
+            height: The height of the board, in cells
+        """
+
+        self.width  = width
+        self.height = height
+
+    def neighbours(self, i):
+        """Return the flat indices of the neighbours of cell i, as a list."""
+
+        width = self.width
+        x, y  = i % width, i // width
+
+        # Nearly every cell is away from the edges
+        if 0 < x < width - 1 and 0 < y < self.height - 1:
+            return [i - width - 1, i - width, i - width + 1, i - 1, i + 1,
+                    i + width - 1, i + width, i + width + 1]
+
+        xs = [dx for dx in (-1, 0, 1) if 0 <= x + dx < width]
+
+        return [i + dy * width + dx for dy in (-1, 0, 1) if 0 <= y + dy < self.height
+                for dx in xs if dx or dy]
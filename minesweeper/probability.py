@@ -0,0 +1,321 @@
+"""Computes exact probabilities that unknown cells contain mines.
+
+The unknown cells next to revealed numbers (the frontier) are tied together by the constraints
+those numbers give.  Cells that share no constraint, directly or through other cells, are
+independent of each other except through the total number of mines left on the board, so the
+frontier is split into connected components that are solved separately:
+
+ 1. Every valid assignment of mines within a component is counted, grouped by how many mines it
+    uses, along with how many of those assignments put a mine in each cell.
+ 2. The components are combined with each other and with the unconstrained cells off the
+    frontier, weighting every combination by the number of ways the remaining mines can be
+    spread over those unconstrained cells.
+
+The cost of (1) grows with the size of the largest component rather than the whole frontier,
+and components are cached so that those untouched by a move are not solved again."""
+
+import math
+
+
+class _Intractable(Exception):
+    """Raised when a component needs more search states than we are prepared to spend."""
+
+
+def _log(n):
+    """Natural log of a non-negative (possibly very large) integer, -inf for 0."""
+
+    return math.log(n) if n > 0 else -math.inf
+
+
+def _log_comb(n, r):
+    """Natural log of n choose r, -inf where that is 0."""
+
+    if r < 0 or r > n:
+        return -math.inf
+    return math.lgamma(n + 1) - math.lgamma(r + 1) - math.lgamma(n - r + 1)
+
+
+def _log_sum_exp(values):
+    """Compute log(sum(exp(v) for v in values)) without overflow."""
+
+    top = max(values, default=-math.inf)
+    if top == -math.inf:
+        return -math.inf
+    return top + math.log(sum(math.exp(v - top) for v in values))
+
+
+def _convolve(a, b):
+    """Multiply two polynomials given as (offset, coefficients) pairs."""
+
+    a_offset, a_coeffs = a
+    b_offset, b_coeffs = b
+
+    coeffs = [0] * (len(a_coeffs) + len(b_coeffs) - 1)
+    for i, x in enumerate(a_coeffs):
+        if x == 0:
+            continue
+        for j, y in enumerate(b_coeffs):
+            coeffs[i + j] += x * y
+
+    return a_offset + b_offset, coeffs
+
+
+def _divide(a, b):
+    """Divide polynomial a by polynomial b, both (offset, coefficients) pairs, where b is known
+    to divide a exactly and b's lowest coefficient is non-zero."""
+
+    a_offset, a_coeffs = a
+    b_offset, b_coeffs = b
+
+    quotient = [0] * (len(a_coeffs) - len(b_coeffs) + 1)
+    for j in range(len(quotient)):
+        remainder = a_coeffs[j]
+        for t in range(1, min(j, len(b_coeffs) - 1) + 1):
+            remainder -= b_coeffs[t] * quotient[j - t]
+        quotient[j] = remainder // b_coeffs[0]
+
+    return a_offset - b_offset, quotient
+
+
+def _order_cells(cells, constraints):
+    """Order the cells of a component breadth-first through their shared constraints.
+
+    Keeping neighbouring cells close together in the order keeps few constraints 'open' (part
+    assigned) at any depth of the search, which is what keeps the memo table small."""
+
+    touching = {cell: [] for cell in cells}
+    for members, _ in constraints:
+        for cell in members:
+            touching[cell].append(members)
+
+    start = min(cells, key=lambda cell: (len(touching[cell]), cell))
+    order = [start]
+    seen  = {start}
+    for cell in order:
+        for members in touching[cell]:
+            for other in sorted(members):
+                if other not in seen:
+                    seen.add(other)
+                    order.append(other)
+
+    return order
+
+
+def _enumerate_component(cells, constraints, max_states):
+    """Count the valid mine assignments of one component.
+
+    Cells are assigned in order, pruning as soon as any constraint is over- or under-filled.
+    Once a cell has been assigned, the only thing that affects how the remaining cells can be
+    filled is the partial sums of the constraints still open, so results are memoised on those.
+
+    Parameters:
+        cells: A list of the component's cells, in search order
+        constraints: A list of (cells, mines) tuples, all cells being within this component
+        max_states: Give up (raise _Intractable) after memoising this many search states
+
+    Returns:
+        A dict mapping a number of mines k to (count, tallies), where count is the number of
+        valid assignments using k mines and tallies[i] the number of those with a mine in cells[i]
+    """
+
+    index = {cell: i for i, cell in enumerate(cells)}
+    rhs   = [mines for _, mines in constraints]
+
+    # For each cell, the constraints it is in, and how many of their cells come after it
+    touching = [[] for _ in cells]
+    # For each depth, the constraints with some cells assigned and some not
+    active   = [[] for _ in range(len(cells) + 1)]
+    for c, (members, _) in enumerate(constraints):
+        positions = sorted(index[cell] for cell in members)
+        for n, position in enumerate(positions):
+            touching[position].append((c, len(positions) - n - 1))
+        for depth in range(positions[0] + 1, positions[-1] + 1):
+            active[depth].append(c)
+
+    sums = [0] * len(constraints)
+    memo = {}
+
+    def solve(depth):
+        if depth == len(cells):
+            return {0: (1, [])}
+
+        key = (depth, tuple(sums[c] for c in active[depth]))
+        if key in memo:
+            return memo[key]
+        if len(memo) >= max_states:
+            raise _Intractable()
+
+        result = {}
+        for mine in (0, 1):
+
+            # Prune if this would over- or under-fill any constraint
+            if any(sums[c] + mine > rhs[c] or sums[c] + mine + left < rhs[c]
+                   for c, left in touching[depth]):
+                continue
+
+            for c, _ in touching[depth]:
+                sums[c] += mine
+            rest = solve(depth + 1)
+            for c, _ in touching[depth]:
+                sums[c] -= mine
+
+            for k, (count, tallies) in rest.items():
+                here = count if mine else 0
+                if k + mine in result:
+                    old_count, old_tallies = result[k + mine]
+                    result[k + mine] = (old_count + count,
+                                        [old_tallies[0] + here] + [a + b for a, b in zip(old_tallies[1:], tallies)])
+                else:
+                    result[k + mine] = (count, [here] + tallies)
+
+        memo[key] = result
+        return result
+
+    return solve(0)
+
+
+class ProbabilityEngine:
+    """Exact mine probabilities for the unknown cells of a board, given the constraints from
+    its revealed numbers."""
+
+    def __init__(self, max_states=50000, max_component_cells=400):
+        """Create a new engine.
+
+        Parameters:
+            max_states: The most memoised search states to spend on one component before giving
+                        up on exact inference
+            max_component_cells: The largest component (in cells) to attempt at all
+        """
+
+        self.max_states          = max_states
+        self.max_component_cells = max_component_cells
+
+        # Solved components, keyed by their constraints
+        self.cache = {}
+
+    def _components(self, constraints):
+        """Split constraints into groups that share no cells, returning a list of
+        (cells, constraints) pairs."""
+
+        parent = {}
+
+        def find(cell):
+            while parent[cell] != cell:
+                parent[cell] = parent[parent[cell]]
+                cell = parent[cell]
+            return cell
+
+        for members, _ in constraints:
+            for cell in members:
+                parent.setdefault(cell, cell)
+            first = find(next(iter(members)))
+            for cell in members:
+                parent[find(cell)] = first
+
+        groups = {}
+        for members, mines in constraints:
+            groups.setdefault(find(next(iter(members))), []).append((members, mines))
+
+        return [({cell for members, _ in group for cell in members}, group) for group in groups.values()]
+
+    def _solve(self, cells, constraints):
+        """Solve one component, from the cache if possible.
+
+        Returns:
+            (cells, distribution) with cells in search order and distribution as returned by
+            _enumerate_component, or None if the component is too big to solve.
+        """
+
+        key = frozenset(constraints)
+        if key in self.cache:
+            return self.cache[key]
+
+        solution = None
+        if len(cells) <= self.max_component_cells:
+            order = _order_cells(cells, constraints)
+            try:
+                solution = (order, _enumerate_component(order, constraints, self.max_states))
+            except _Intractable:
+                pass
+
+        self.cache[key] = solution
+        return solution
+
+    def probabilities(self, constraints, num_unknown, mines_left):
+        """Compute the probability that each unknown cell contains a mine.
+
+        Parameters:
+            constraints: An iterable of (cells, mines) tuples, each saying that exactly `mines`
+                         of the unknown cells in the collection `cells` are mines
+            num_unknown: The number of unknown cells on the whole board, constrained or not
+            mines_left: The number of mines not yet flagged on the whole board
+
+        Returns:
+            (probabilities, other) where probabilities maps each constrained cell to its
+            probability of being a mine, and other is the probability for every unconstrained
+            unknown cell.  Cells certain to be safe or mined get exactly 0 or 1.  Returns None if
+            a component was too big to solve exactly or the constraints cannot be satisfied.
+        """
+
+        constraints = {(frozenset(members), mines) for members, mines in constraints if members}
+
+        solved = []
+        used   = {}
+        for cells, group in self._components(constraints):
+            solution = self._solve(cells, group)
+            used[frozenset(group)] = solution
+            if solution is None or not solution[1]:
+                self.cache = used
+                return None
+            solved.append(solution)
+
+        # Only keep components still on the frontier, so the cache does not grow without bound
+        self.cache = used
+
+        # Unconstrained cells, and the weight of putting the remaining mines in them
+        num_other = num_unknown - sum(len(order) for order, _ in solved)
+        log_other = lambda k: _log_comb(num_other, mines_left - k)
+
+        # Polynomials in the number of mines for each component, and for all of them together
+        polys = []
+        for _, distribution in solved:
+            low = min(distribution)
+            polys.append((low, [distribution.get(k, (0, None))[0] for k in range(low, max(distribution) + 1)]))
+        total = (0, [1])
+        for poly in polys:
+            total = _convolve(total, poly)
+
+        offset, coeffs = total
+        log_weights    = [_log(count) + log_other(offset + k) for k, count in enumerate(coeffs)]
+        log_z          = _log_sum_exp(log_weights)
+        if log_z == -math.inf:
+            return None
+
+        other = 0
+        if num_other > 0:
+            other = sum(math.exp(w - log_z) * (mines_left - offset - k) / num_other
+                        for k, w in enumerate(log_weights) if w > -math.inf)
+
+        probabilities = {}
+        for (order, distribution), poly in zip(solved, polys):
+
+            # The number of ways the other components can hold j mines, for each j
+            rest_offset, rest = _divide(total, poly)
+
+            # Relative weight of this component holding k mines, per valid assignment
+            log_weights = {k: _log_sum_exp([_log(count) + log_other(k + rest_offset + j)
+                                            for j, count in enumerate(rest) if count > 0])
+                           for k in distribution}
+            weights     = {k: math.exp(log_weight - log_z) for k, log_weight in log_weights.items()}
+
+            for i, cell in enumerate(order):
+                possible = [(count, tallies[i]) for k, (count, tallies) in distribution.items()
+                            if log_weights[k] > -math.inf]
+                if all(tally == 0 for _, tally in possible):
+                    probabilities[cell] = 0
+                elif all(tally == count for count, tally in possible):
+                    probabilities[cell] = 1
+                else:
+                    probabilities[cell] = sum(tallies[i] * weights[k] for k, (_, tallies) in distribution.items())
+
+        return probabilities, other
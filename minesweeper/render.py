@@ -1,17 +1,41 @@
 """Renders a board/game state, and offers a method to gather input to drive the game.
 
 Uses pygame/SDL to plot the board on a window that is created when render_interactive_board is
-called."""
+called.
 
+The window is a viewport onto the board, which can be panned and zoomed, so boards of millions of
+cells can be played.  Only what is in view is drawn: the visible part of the board is turned into
+pixels with one NumPy lookup and put on the screen with one surfarray blit, with the numbers
+blitted over it once cells are big enough to read them.  Zoomed out past a pixel per cell, the
+view becomes a minimap, each pixel showing one of the cells under it.
+
+Between those full redraws, only the cells that change are drawn again: the renderer subscribes to
+the game, collects the cells it reports as changed between frames, redraws just those and pushes
+just their rectangles to the screen.  The numbers are rendered once per cell size and blitted from
+then on."""
+
+import math
+from collections import deque
+from contextlib import nullcontext
+
+import numpy as np
 import pygame
 
+from .autoplay import AutoPlayer
 from .board import BOMB
+from .game import FLAGGED, OBSERVED_UNKNOWN, OBSERVED_FLAGGED, OBSERVED_BOMB, OBSERVED_CODES
 
 # Run until the user asks to quit
-HIDDEN_COLOUR   = (128, 128, 128)
-FLAG_COLOUR     = (0, 255, 0)
-REVEALED_COLOUR = (50, 50, 50)
-BOMB_COLOUR     = (255, 0, 0)
+HIDDEN_COLOUR     = (128, 128, 128)
+FLAG_COLOUR       = (0, 255, 0)
+REVEALED_COLOUR   = (50, 50, 50)
+BOMB_COLOUR       = (255, 0, 0)
+BACKGROUND_COLOUR = (0, 0, 0)
+
+# Unknown cells on the probability overlay shade from the first colour (certainly safe) to the
+# second (certainly a mine), in this many steps
+HEAT_COLOURS = ((0, 64, 255), (255, 160, 0))
+HEAT_LEVELS  = 64
 
 ADJACENCY_COLOURS = [(0, 0, 0), (0, 0, 128), (0, 128, 0), (0, 128, 128), (128, 0, 0),
                     (0, 0, 255), (0, 255, 0), (0, 255, 255), (255, 0, 0)]
@@ -19,63 +43,449 @@ ADJACENCY_COLOURS = [(0, 0, 0), (0, 0, 128), (0, 128, 0), (0, 128, 128), (128, 0
 # FIXME: may vary by platform
 FONT = "dejavusans"
 
-def render_interactive_board(game, ai):
+# The most time the AI works for at a stretch before seeing to moves from the user, in seconds
+AI_TIME_SLICE = 0.01
+
+# Frames per second to draw at, at most
+FRAME_RATE = 60
+
+# Below this many pixels per cell the view is a minimap, and numbers aren't drawn below GLYPH_SCALE
+MINIMAP_SCALE = 1.0
+GLYPH_SCALE   = 6.0
+
+# The most pixels per cell, how much each step of the mouse wheel zooms by, and how far the
+# arrow keys pan, in pixels
+MAX_SCALE = 64.0
+ZOOM_STEP = 1.25
+PAN_STEP  = 64
+
+# How far the mouse must move with a button down before it drags the view rather than clicks
+DRAG_THRESHOLD = 4
+
+# Redraw everything in view, rather than cell by cell, when more cells than this change at once
+DIRTY_LIMIT = 2000
+
+PAN_KEYS = {pygame.K_LEFT: (1, 0), pygame.K_RIGHT: (-1, 0), pygame.K_UP: (0, 1), pygame.K_DOWN: (0, -1)}
+ZOOM_KEYS = {pygame.K_EQUALS: ZOOM_STEP, pygame.K_PLUS: ZOOM_STEP, pygame.K_KP_PLUS: ZOOM_STEP,
+             pygame.K_MINUS: 1 / ZOOM_STEP, pygame.K_KP_MINUS: 1 / ZOOM_STEP}
+FIT_KEYS = {pygame.K_0, pygame.K_HOME}
+
+# Starts and stops the AI playing on by itself, and shows or hides the probability overlay
+AUTOPLAY_KEY = pygame.K_SPACE
+OVERLAY_KEY  = pygame.K_h
+
+MOUSE_BUTTONS = {pygame.BUTTON_LEFT: "left", pygame.BUTTON_RIGHT: "right", pygame.BUTTON_MIDDLE: "middle"}
+
+
+class BoardView:
+    """Draws the part of a game in view onto a surface, keeping track of which cells need drawing
+    again."""
+
+    def __init__(self, game, surface, ai=None, lock=None):
+        """Create a view of the whole of the game given, and start listening for changes to it.
+
+        Parameters:
+            game: The game to draw
+            surface: The pygame Surface to draw on, usually the display
+            ai: The MineSweeperAI playing the game, if any, to show the probability map of
+            lock: A lock held while the game is changed on another thread (see AutoPlayer),
+                  which is held while reading the game in turn, or None
+        """
+
+        self.game    = game
+        self.surface = surface
+        self.ai      = ai
+        self.lock    = lock if lock is not None else nullcontext()
+
+        # Pixels per cell, and the pixel the top left corner of the board is drawn at (which may
+        # well be off the surface).  Cell x starts at pixel offset_x + floor(x * scale).
+        self.scale    = 1.0
+        self.offset_x = 0
+        self.offset_y = 0
+        self.fitted   = True
+        self.fit()
+
+        # Lists of (x, y, state) changes not yet drawn, as the game reported them, and whether
+        # everything needs drawing.  The game may be played on another thread (see autoplay.py),
+        # so changes are queued by the game and taken off by #draw, which deque does safely.
+        self.changes     = deque()
+        self.full_redraw = True
+
+        # Numbers rendered for the current cell size; see #_glyphs
+        self.glyph_size = None
+        self.glyphs     = None
+
+        # Whether unknown cells are coloured by the AI's probability map, the map drawn, and its
+        # colours as mapped for the surface; see #_heat_palette
+        self.show_probabilities = False
+        self.shown_map          = None
+        self.heat_palette       = None
+
+        self.game.subscribe(self._changed)
+
+    def close(self):
+        """Stop listening for changes to the game."""
+
+        self.game.unsubscribe(self._changed)
+
+    def _changed(self, changes):
+        self.changes.append(changes)
+
+    def _take_changes(self):
+        """Take the changes queued so far, as a dict of (x, y) -> latest state."""
+
+        changed = {}
+        while True:
+            try:
+                changes = self.changes.popleft()
+            except IndexError:
+                return changed
+            changed.update(((x, y), state) for x, y, state in changes)
+
+    def resize(self, surface):
+        """Draw onto a new (or resized) surface, from scratch, still showing the whole board if
+        it was before."""
+
+        self.surface = surface
+        if self.fitted:
+            self.fit()
+        self.full_redraw = True
+
+    def fit(self):
+        """Zoom and pan so that the whole board is in view, in the middle of the surface."""
+
+        width, height = self.surface.get_size()
+        self.scale    = min(width / self.game.board_width(), height / self.game.board_height())
+        self.offset_x = (width - math.floor(self.game.board_width() * self.scale)) // 2
+        self.offset_y = (height - math.floor(self.game.board_height() * self.scale)) // 2
+
+        self.fitted      = True
+        self.full_redraw = True
+
+    def pan(self, dx, dy):
+        """Move the board dx, dy pixels across the surface."""
+
+        self.offset_x   += int(dx)
+        self.offset_y   += int(dy)
+        self.fitted      = False
+        self.full_redraw = True
+
+    def zoom(self, factor, around=None):
+        """Scale the board by factor, keeping the pixel around (by default the middle of the
+        surface) over the same point of the board.  Can't zoom out to less than half the size
+        that fits the surface, nor in past MAX_SCALE."""
+
+        width, height = self.surface.get_size()
+        if around is None:
+            around = (width // 2, height // 2)
+
+        fit   = min(width / self.game.board_width(), height / self.game.board_height())
+        scale = min(max(self.scale * factor, fit / 2), max(MAX_SCALE, fit))
+        if scale == self.scale:
+            return
+
+        factor        = scale / self.scale
+        self.offset_x = around[0] - round((around[0] - self.offset_x) * factor)
+        self.offset_y = around[1] - round((around[1] - self.offset_y) * factor)
+        self.scale    = scale
+
+        self.fitted      = False
+        self.full_redraw = True
+
+    def minimap(self):
+        """Is the view zoomed out so far that cells are smaller than pixels?"""
+
+        return self.scale < MINIMAP_SCALE
+
+    def cell_at(self, pos):
+        """The (x, y) cell under a pixel position, or None if it's off the board."""
+
+        x = self._pixel_cells(np.array([pos[0]]), self.offset_x, self.game.board_width())[0]
+        y = self._pixel_cells(np.array([pos[1]]), self.offset_y, self.game.board_height())[0]
+        if x < 0 or y < 0:
+            return None
+
+        return int(x), int(y)
+
+    def cell_rect(self, x, y):
+        """The rectangle covered by cell x, y, rounded so that neighbouring cells meet exactly."""
+
+        left  = self.offset_x + math.floor(x * self.scale)
+        top   = self.offset_y + math.floor(y * self.scale)
+        return pygame.Rect(left, top, self.offset_x + math.floor((x + 1) * self.scale) - left,
+                           self.offset_y + math.floor((y + 1) * self.scale) - top)
+
+    def _pixel_cells(self, pixels, offset, num_cells):
+        """The cell along one axis under each of an array of pixels, or -1 for pixels off the
+        board.  Where cells are smaller than pixels, this is the last cell starting in it."""
+
+        scale = self.scale
+        first = max(int((pixels.min() - offset) / scale) - 1, 0)
+        last  = min(int((pixels.max() + 1 - offset) / scale) + 1, num_cells)
+        if first >= last:
+            return np.full(len(pixels), -1)
+
+        edges = offset + np.floor(np.arange(first, last + 1) * scale).astype(np.int64)
+        cells = first + np.searchsorted(edges, pixels, side="right") - 1
+        cells[(cells < first) | (cells >= last)] = -1
+
+        return cells
+
+    def _glyphs(self):
+        """The numbers 1-8 rendered for the current cell size, rendering them if it's changed."""
+
+        size = int(self.scale)
+        if size != self.glyph_size:
+            font            = pygame.font.SysFont(FONT, max(size, 1))
+            self.glyphs     = [None] + [font.render(str(n), False, ADJACENCY_COLOURS[n]) for n in range(1, 9)]
+            self.glyph_size = size
+
+        return self.glyphs
+
+    def _region(self, columns, rows):
+        """Observation codes (see MineSweeperGame#observation) for the cells in the sorted arrays
+        of columns and rows given, as a (len(rows), len(columns)) array."""
+
+        observation = getattr(self.game, "observation", None)
+        if observation is not None:
+            with self.lock:
+                return observation[np.ix_(rows, columns)]
+
+        # Games without an observation only give their visible cells as a list, built from sets
+        # and dicts that mustn't change size while it's built
+        region = np.full((len(rows), len(columns)), OBSERVED_UNKNOWN, dtype=np.int8)
+        with self.lock:
+            cells = [(x, y, FLAGGED) for x, y in self.game.flags] + self.game.revealed_cell_tuples()
+        if cells:
+            xs, ys, states = zip(*cells)
+            i = np.minimum(np.searchsorted(rows, ys), len(rows) - 1)
+            j = np.minimum(np.searchsorted(columns, xs), len(columns) - 1)
+            for k in np.flatnonzero((rows[i] == ys) & (columns[j] == xs)).tolist():
+                region[i[k], j[k]] = OBSERVED_CODES.get(states[k], states[k])
+
+        return region
+
+    def toggle_probabilities(self):
+        """Show or hide the AI's probability map over the unknown cells."""
+
+        self.show_probabilities = not self.show_probabilities
+        self.full_redraw        = True
+
+    def _probability_map(self):
+        """The AI's latest probability map if it's to be shown, else None."""
+
+        if not self.show_probabilities or self.ai is None:
+            return None
+        return self.ai.probability_map
+
+    def _heat_palette(self):
+        """HEAT_LEVELS colours shading between the HEAT_COLOURS, then HIDDEN_COLOUR for cells with
+        no estimate, all mapped for the surface."""
+
+        low, high = np.array(HEAT_COLOURS, dtype=np.float64)
+        ramp      = low + np.linspace(0, 1, HEAT_LEVELS)[:, None] * (high - low)
+        colours   = [tuple(colour) for colour in ramp.round().astype(int).tolist()] + [HIDDEN_COLOUR]
+        return np.array([self.surface.map_rgb(colour) for colour in colours], dtype=np.uint32)
+
+    @staticmethod
+    def _heat_levels(probabilities):
+        """Which of the heat palette's colours each of an array of probabilities gets."""
+
+        levels = np.clip(np.round(np.nan_to_num(probabilities, nan=0) * (HEAT_LEVELS - 1)), 0, HEAT_LEVELS - 1)
+        return np.where(np.isnan(probabilities), HEAT_LEVELS, levels).astype(np.intp)
+
+    def draw_cell(self, x, y, state):
+        """Draw one cell given its state, as from MineSweeperGame#cell.  Returns its rectangle."""
+
+        rect = self.cell_rect(x, y)
+        if state is None and self.shown_map is not None:
+            colour = int(self.heat_palette[self._heat_levels(np.float64(self.shown_map.estimate(x, y)))])
+        elif state is None:
+            colour = HIDDEN_COLOUR
+        elif state == FLAGGED:
+            colour = FLAG_COLOUR
+        elif state == BOMB:
+            colour = BOMB_COLOUR
+        else:
+            colour = REVEALED_COLOUR
+        self.surface.fill(colour, rect)
+
+        if state not in (None, FLAGGED, BOMB) and state > 0 and self.scale >= GLYPH_SCALE:
+            number = self._glyphs()[state]
+            self.surface.blit(number, number.get_rect(center=rect.center))
+
+        return rect
+
+    def draw_all(self):
+        """Draw everything in view, with one blit of the cells' colours and one of the numbers.
+
+        With the probability overlay on, unknown cells are coloured from the AI's probability
+        map in the same pass."""
+
+        surface       = self.surface
+        width, height = surface.get_size()
+
+        self.shown_map = self._probability_map()
+        if self.shown_map is not None:
+            self.heat_palette = self._heat_palette()
+
+        # Colour of every observation code from OBSERVED_BOMB up to 8, mapped for the surface
+        colours = {OBSERVED_BOMB: BOMB_COLOUR, OBSERVED_FLAGGED: FLAG_COLOUR, OBSERVED_UNKNOWN: HIDDEN_COLOUR}
+        palette = np.array([surface.map_rgb(colours.get(code, REVEALED_COLOUR)) for code in range(OBSERVED_BOMB, 9)],
+                           dtype=np.uint32)
+
+        # Which cell each column and row of pixels shows
+        xs = self._pixel_cells(np.arange(width), self.offset_x, self.game.board_width())
+        ys = self._pixel_cells(np.arange(height), self.offset_y, self.game.board_height())
+        shown_x, shown_y = np.flatnonzero(xs >= 0), np.flatnonzero(ys >= 0)
+
+        pixels = np.full((width, height), surface.map_rgb(BACKGROUND_COLOUR), dtype=np.uint32)
+        if len(shown_x) and len(shown_y):
+            columns, pixel_columns = np.unique(xs[shown_x], return_inverse=True)
+            rows, pixel_rows       = np.unique(ys[shown_y], return_inverse=True)
+            region  = self._region(columns, rows)
+            colours = palette[region - OBSERVED_BOMB]
+            if self.shown_map is not None:
+                unknown          = region == OBSERVED_UNKNOWN
+                levels           = self._heat_levels(self.shown_map.window(columns, rows)[unknown])
+                colours[unknown] = self.heat_palette[levels]
+            pixels[shown_x[0]:shown_x[-1] + 1, shown_y[0]:shown_y[-1] + 1] = \
+                colours[np.ix_(pixel_rows, pixel_columns)].T
+        pygame.surfarray.blit_array(surface, pixels)
+
+        # Every number in view, centred in its cell
+        if len(shown_x) and len(shown_y) and self.scale >= GLYPH_SCALE:
+            glyphs   = self._glyphs()
+            i, j     = np.nonzero(region > 0)
+            numbers  = region[i, j].tolist()
+            x, y     = columns[j], rows[i]
+            centre_x = self.offset_x + (np.floor(x * self.scale) + np.floor((x + 1) * self.scale)) // 2
+            centre_y = self.offset_y + (np.floor(y * self.scale) + np.floor((y + 1) * self.scale)) // 2
+            surface.blits([(glyphs[n], glyphs[n].get_rect(center=(x, y)))
+                           for n, x, y in zip(numbers, centre_x.tolist(), centre_y.tolist())],
+                          doreturn=False)
+
+    def draw(self):
+        """Draw whatever has changed since the last call, and put it on the screen."""
+
+        # Changes to a minimap, or too many to draw one at a time, are drawn by redrawing the lot.
+        # Changes made while drawing stay queued for next time.
+        changed = self._take_changes()
+        if changed and (self.minimap() or len(changed) > DIRTY_LIMIT):
+            self.full_redraw = True
+        if self._probability_map() is not self.shown_map:
+            self.full_redraw = True
+
+        if self.full_redraw:
+            self.draw_all()
+            self.full_redraw = False
+            pygame.display.flip()
+            return
+
+        if changed:
+            screen = self.surface.get_rect()
+            rects  = [self.draw_cell(x, y, state) for (x, y), state in changed.items()
+                      if self.cell_rect(x, y).colliderect(screen)]
+            if rects:
+                pygame.display.update(rects)
+
+
+def render_interactive_board(game, ai, moves_per_second=None, autoplay=False):
     """Create a window showing this Minesweeper board, to play this game, using this AI.
 
     This function returns when the game ends (win or lose)
 
+    The game is played on a thread of its own (see autoplay.py), so the window keeps drawing and
+    answering the user however long the AI takes.  Space starts and stops the AI playing on by
+    itself, H shows or hides the AI's probability map over the unknown cells, and any other key
+    that doesn't move the view has the AI make one move.
+
     Parameters:
       game (MineSweeperGame): The game in play at the moment.  Controls what is shown to the user.
       ai (MineSweeperAI): The AI to request actions of when the 'ai key' is pressed.
+      moves_per_second (float): The most moves the AI makes per second when playing by itself,
+                                None for as fast as it can.
+      autoplay (bool): Start with the AI playing by itself.
     """
 
     pygame.init()
+    pygame.key.set_repeat(250, 30)
 
     # Set up the drawing window
     screen = pygame.display.set_mode([1000, 1000], pygame.RESIZABLE)
+    player = AutoPlayer(game, ai, moves_per_second, AI_TIME_SLICE)
+    view   = BoardView(game, screen, ai, player.lock)
+    clock  = pygame.time.Clock()
+    player.start()
+    if autoplay:
+        player.play()
 
     running = True
     mouse_button_down = None
+    mouse_down_at     = None
+    dragging          = False
     while running:
 
-        # Compute sizes of elements on the display for this refresh
-        surface = pygame.display.get_surface() #get the surface of the current active display
-        cell_width = surface.get_width() / game.board_width()
-        cell_height = surface.get_height() / game.board_height()
-        number_font = pygame.font.SysFont(FONT, int(min(cell_width, cell_height)))
-
         # Did the user click the window close button?
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
                 running = False
 
-            if event.type == pygame.KEYUP:
-                ai.move()
-
-            if event.type == pygame.MOUSEBUTTONDOWN:
-                left, _, right = pygame.mouse.get_pressed()
-                if left:
-                    mouse_button_down = "left"
-                elif right:
-                    mouse_button_down = "right"
-
-            if event.type == pygame.MOUSEBUTTONUP:
-                pos = pygame.mouse.get_pos()
-                cell_x = int(pos[0] / cell_width)
-                cell_y = int(pos[1] / cell_height)
-
-                if mouse_button_down == "left":
-                    game.click(cell_x, cell_y)
-                elif mouse_button_down == "right":
-                    game.toggle_flag(cell_x, cell_y)
+            if event.type == pygame.VIDEORESIZE:
+                view.resize(pygame.display.get_surface())
+
+            # Arrow keys pan, +/- zoom and 0 or home fit the board to the window
+            if event.type == pygame.KEYDOWN:
+                if event.key in PAN_KEYS:
+                    dx, dy = PAN_KEYS[event.key]
+                    view.pan(dx * PAN_STEP, dy * PAN_STEP)
+                elif event.key in ZOOM_KEYS:
+                    view.zoom(ZOOM_KEYS[event.key])
+                elif event.key in FIT_KEYS:
+                    view.fit()
+                elif event.key == AUTOPLAY_KEY:
+                    player.toggle()
+                elif event.key == OVERLAY_KEY:
+                    view.toggle_probabilities()
+
+            if event.type == pygame.KEYUP and event.key not in PAN_KEYS and event.key not in ZOOM_KEYS \
+                    and event.key not in FIT_KEYS and event.key not in (AUTOPLAY_KEY, OVERLAY_KEY):
+                player.step()
+
+            if event.type == pygame.MOUSEWHEEL:
+                view.zoom(ZOOM_STEP ** event.y, pygame.mouse.get_pos())
+
+            if event.type == pygame.MOUSEBUTTONDOWN and event.button in MOUSE_BUTTONS:
+                mouse_button_down = MOUSE_BUTTONS[event.button]
+                mouse_down_at     = event.pos
+                dragging          = mouse_button_down == "middle"
+
+            # Dragging with the left or middle button pans
+            if event.type == pygame.MOUSEMOTION and mouse_button_down in ("left", "middle"):
+                if not dragging and max(abs(event.pos[0] - mouse_down_at[0]),
+                                        abs(event.pos[1] - mouse_down_at[1])) > DRAG_THRESHOLD:
+                    dragging = True
+                    view.pan(event.pos[0] - mouse_down_at[0], event.pos[1] - mouse_down_at[1])
+                elif dragging:
+                    view.pan(*event.rel)
+
+            if event.type == pygame.MOUSEBUTTONUP and MOUSE_BUTTONS.get(event.button) == mouse_button_down:
+                cell = None if dragging else view.cell_at(event.pos)
+
+                if cell is not None and mouse_button_down == "left":
+                    player.click(*cell)
+                elif cell is not None and mouse_button_down == "right":
+                    player.toggle_flag(*cell)
                 mouse_button_down = None
+                dragging          = False
 
-        # Fill the background with hidden
-        screen.fill(HIDDEN_COLOUR)
+        # Draw whatever changed
+        view.draw()
 
         # Check if we've won a print a message
         # TODO
         if game.finished:
+            player.stop()
             print(f"Game finished.")
             if game.won:
                 print(f"You won!")
@@ -84,36 +494,9 @@ def render_interactive_board(game, ai):
             print(f"Moves: {game.moves}")
             running = False
 
-        # Iterate over cells in the game and render them
-        # Plot any flagged cells
-        for x, y in game.flags:
-            cell_rect = pygame.Rect(x * cell_width, y * cell_height, cell_width, cell_height)
-            pygame.draw.rect(screen, FLAG_COLOUR, cell_rect)
-
-        for x, y, state in game.revealed_cell_tuples():
-
-            # Cell shading
-            number = None
-
-            if state == BOMB:
-                colour = BOMB_COLOUR
-            else:
-                colour = REVEALED_COLOUR
-
-            # If the state is a certain annotation
-            if state != BOMB and state > 0:
-                number = number_font.render(str(state), False, ADJACENCY_COLOURS[state])
-
-            cell_rect = pygame.Rect(x * cell_width, y * cell_height, cell_width, cell_height)
-            pygame.draw.rect(screen, colour, cell_rect)
-
-            if number:
-                # Render the number centred at the point given
-                screen.blit(number, ((x+1) * cell_width - (cell_width / 2 + number.get_width() / 2),
-                                     (y+1) * cell_height - (cell_width / 2 + number.get_height() / 2)) )
-
-        # Flip the display
-        pygame.display.flip()
+        clock.tick(FRAME_RATE)
 
     # Done! Time to quit.
+    player.stop()
+    view.close()
     pygame.quit()
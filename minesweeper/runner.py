@@ -0,0 +1,145 @@
+"""Plays many games of minesweeper with the AI, spread across a pool of worker processes.
+
+Each game gets its own seed derived from a base seed and the game's index, so the boards played
+(and therefore the results) are the same however many workers are used."""
+
+import multiprocessing
+import os
+
+import numpy as np
+
+from .board import Board
+from .game import MineSweeperGame
+from .bitboard import BitboardGame
+from .chunked import ChunkedBoard, ChunkedGame
+from .corpus import open_corpus
+from .ai import MineSweeperAI
+from .trace import TraceWriter
+
+
+def play_game(index, width, height, density, seed, heuristic="local", bitboard=False, stats=False,
+              chunk_size=None, corpus=None, trace_dir=None):
+    """Play a single game to completion with the AI.
+
+    Parameters:
+        index: The number of this game within its batch
+        width: The width of the board, in cells
+        height: The height of the board, in cells
+        density: The density of bombs on the board, 0-1
+        seed: The seed for the board, anything accepted by Board
+        heuristic: The heuristic stage for the AI to use, see MineSweeperAI
+        bitboard: True to play a BitboardGame rather than a MineSweeperGame
+        stats: True to record timers and counters for the game and AI (see stats.py)
+        chunk_size: If given, play a ChunkedGame on a ChunkedBoard generated in chunks of this
+                    size, rather than generating the whole board up front
+        corpus: If given, the path of a corpus file (see corpus.py) to play board number index
+                of, rather than generating one.  width, height, density and seed are ignored.
+        trace_dir: If given, a directory to record every move of the game to, in a trace file
+                   (see trace.py) named for the game's index
+
+    Returns:
+        A dict describing the outcome, with keys index, seed, won and moves.  With stats on, a
+        stats key holds {"game": ..., "ai": ...}, each as returned by Stats.as_dict.  With a
+        trace_dir, a trace key holds the path of the trace file.
+    """
+
+    if corpus:
+        boards = open_corpus(corpus)
+        board  = boards[index]
+    elif chunk_size:
+        board = ChunkedBoard(width, height, density, seed=seed, chunk_size=chunk_size)
+    else:
+        board = Board(width, height, density, seed=seed)
+
+    trace = None
+    if trace_dir:
+        trace_path = os.path.join(trace_dir, f"game-{index:06d}.mstrace")
+        if corpus:
+            trace = TraceWriter(trace_path, board, corpus_index=index, density=boards.density,
+                                corpus_seed=boards.seed)
+        else:
+            trace = TraceWriter(trace_path, board, seed=seed, density=density)
+
+    if chunk_size and not corpus:
+        game = ChunkedGame(board, stats=stats, trace=trace)
+    elif bitboard:
+        game = BitboardGame(board, stats=stats, trace=trace)
+    else:
+        game = MineSweeperGame(board, stats=stats, trace=trace)
+    ai = MineSweeperAI(game, heuristic=heuristic, stats=stats)
+
+    try:
+        while not game.finished:
+            ai.move()
+    finally:
+        if trace is not None:
+            trace.end(game)
+            trace.close()
+
+    result = {"index": index, "seed": seed, "won": game.won, "moves": game.moves}
+    if stats:
+        result["stats"] = {"game": game.stats.as_dict(), "ai": ai.stats.as_dict()}
+    if trace is not None:
+        result["trace"] = trace_path
+
+    return result
+
+
+def _play_game(args):
+    """Unpack a tuple of arguments for #play_game, for use with Pool.imap_unordered."""
+
+    return play_game(*args)
+
+
+def run_batch(num_games, width, height, density, workers=None, seed=None, heuristic="local",
+              bitboard=False, stats=False, chunk_size=None, corpus=None, trace_dir=None):
+    """Play a batch of games, yielding each result as soon as its game finishes.
+
+    Game i is played on a board seeded with [seed, i], or board i of a corpus, so a batch is
+    reproducible given its base seed regardless of the number of workers.  Results arrive in
+    order of completion, not index; use the index key to put them back in order if needed.
+
+    Parameters:
+        num_games: The number of games to play
+        width: The width of each board, in cells
+        height: The height of each board, in cells
+        density: The density of bombs on each board, 0-1
+        workers: The number of processes to play games in.  None uses one per CPU, and 1 plays
+                 every game in this process without starting a pool.
+        seed: The base seed for the batch, an int.  None picks one at random.
+        heuristic: The heuristic stage for the AI to use, see MineSweeperAI
+        bitboard: True to play BitboardGames rather than MineSweeperGames
+        stats: True to record timers and counters for every game, see #play_game
+        chunk_size: If given, play on boards generated in chunks of this size, see #play_game
+        corpus: If given, the path of a corpus file to play the first num_games boards of,
+                rather than generating boards.  width, height, density and seed are ignored.
+        trace_dir: If given, a directory to record every game's moves to, see #play_game.  It
+                   is made if it doesn't exist.
+
+    Yields:
+        One dict per game, as returned by #play_game
+    """
+
+    if corpus:
+        # Every worker maps the same file, so the boards are shared rather than copied to each
+        num_games = min(num_games, len(open_corpus(corpus)))
+        seed      = None
+    elif seed is None:
+        seed = int(np.random.SeedSequence().entropy % 2**63)
+
+    if trace_dir:
+        os.makedirs(trace_dir, exist_ok=True)
+
+    jobs = [(i, width, height, density, None if corpus else [seed, i], heuristic, bitboard, stats,
+             chunk_size, corpus, trace_dir)
+            for i in range(num_games)]
+
+    if workers == 1:
+        for job in jobs:
+            yield _play_game(job)
+        return
+
+    with multiprocessing.Pool(workers) as pool:
+        # One game per task: games vary wildly in length, so bigger chunks leave workers idle
+        # at the end of the batch
+        yield from pool.imap_unordered(_play_game, jobs, chunksize=1)
@@ -0,0 +1,248 @@
+"""Estimates the probability that unknown cells contain mines by sampling, for frontiers too big
+to solve exactly (see probability.py).
+
+Many Markov chains are run side by side, each holding a guess at where the mines on the frontier
+are, and nudged towards guesses that agree with the revealed numbers:
+
+ 1. Every number's constraint is allowed to be broken, at a cost of `penalty` per mine too many
+    or too few, and every guess is weighted by the number of ways the remaining mines can be
+    spread over the unconstrained cells off the frontier.
+ 2. The frontier cells are coloured so that no two cells of a colour share a constraint.  A cell's
+    chance of holding a mine then depends only on cells of other colours, so every cell of a
+    colour, in every chain, can be resampled at once with a handful of array operations.
+ 3. After each sweep over the colours, the frontier is split into the same independent
+    components as probability.py uses, and each component of each chain that satisfies every
+    one of its constraints is counted as a sample of that component.
+
+Samples that satisfy their constraints are distributed exactly as the valid mine layouts are
+(the penalty only changes how often the chains find one), except that the weight given to the
+mines left off the frontier is worked out from each chain as a whole, and a sweep treats the
+number of mines on the frontier as fixed while it runs.  Both matter little unless very few
+unknown cells are left off the frontier.
+
+Sampling stops as soon as every component has enough samples or the time budget runs out, so the
+cost of an estimate is bounded however big the board."""
+
+import time
+
+import numpy as np
+
+from .probability import _log_comb
+
+
+class MonteCarloEstimator:
+    """Estimated mine probabilities for the unknown cells of a board, from random mine layouts
+    that agree with its revealed numbers."""
+
+    def __init__(self, samples=1000, time_budget=0.2, max_sweeps=None, chains=128, penalty=1.5,
+                 seed=0):
+        """Create a new estimator.
+
+        Parameters:
+            samples: Stop once every component of the frontier has this many samples
+            time_budget: Stop after this many seconds, None for no limit.  Results then depend on
+                         how fast the machine is, so leave this None and set max_sweeps for
+                         reproducible runs.
+            max_sweeps: Stop after this many sweeps over the frontier, None for no limit.  At
+                        least one sweep is always made.
+            chains: The number of chains to run side by side
+            penalty: The cost, as a log weight, of each mine too many or too few for a number
+            seed: Seeds the random numbers used for each estimate; the same constraints and
+                  budget always give the same estimate.  None picks them at random.
+        """
+
+        if time_budget is None and max_sweeps is None and not samples:
+            raise ValueError("An estimator needs a sample, time or sweep budget")
+
+        self.samples     = samples
+        self.time_budget = time_budget
+        self.max_sweeps  = max_sweeps
+        self.chains      = chains
+        self.penalty     = penalty
+        self.seed        = seed
+
+        # How the last estimate went, for anyone curious: sweeps made and the fewest samples of
+        # any component
+        self.last_sweeps  = 0
+        self.last_samples = 0
+
+    @staticmethod
+    def _components(cell_rows, num_rows):
+        """Label each constraint with the component it belongs to, by union-find over the cells
+        they share.  Returns a list of labels, one per constraint."""
+
+        parent = list(range(num_rows))
+
+        def find(row):
+            while parent[row] != row:
+                parent[row] = parent[parent[row]]
+                row = parent[row]
+            return row
+
+        for rows in cell_rows:
+            first = find(rows[0])
+            for row in rows[1:]:
+                parent[find(row)] = first
+
+        return [find(row) for row in range(num_rows)]
+
+    @staticmethod
+    def _colour(cell_rows, row_cells):
+        """Greedily colour the cells so that no two sharing a constraint get the same colour.
+        Returns a list of colours, one per cell."""
+
+        colours = [-1] * len(cell_rows)
+        for cell, rows in enumerate(cell_rows):
+            taken = {colours[other] for row in rows for other in row_cells[row]}
+            colour = 0
+            while colour in taken:
+                colour += 1
+            colours[cell] = colour
+
+        return colours
+
+    def probabilities(self, constraints, num_unknown, mines_left):
+        """Estimate the probability that each unknown cell contains a mine.
+
+        Takes the same arguments, and gives the same results, as
+        ProbabilityEngine#probabilities, except that the probabilities are estimates; a cell
+        with an estimate of 0 or 1 was simply never seen otherwise, so is not certain.
+
+        Returns:
+            (probabilities, other) as for ProbabilityEngine#probabilities, or None if the
+            constraints plainly cannot be satisfied.  See last_samples for how well the estimate
+            was founded.
+        """
+
+        start = time.perf_counter()
+
+        constraints = sorted({(frozenset(members), mines) for members, mines in constraints if members},
+                             key=lambda constraint: (min(constraint[0]), constraint[1]))
+        if not constraints:
+            return {}, (mines_left / num_unknown if num_unknown else 0)
+        if any(mines < 0 or mines > len(members) for members, mines in constraints):
+            return None
+
+        # Order the constraints, and then the cells, component by component, so that each
+        # component's constraints and cells are contiguous in the arrays below
+        cells     = sorted({cell for members, _ in constraints for cell in members})
+        index     = {cell: i for i, cell in enumerate(cells)}
+        cell_rows = [[] for _ in cells]
+        for row, (members, _) in enumerate(constraints):
+            for cell in members:
+                cell_rows[index[cell]].append(row)
+
+        labels      = self._components(cell_rows, len(constraints))
+        rank        = {label: i for i, label in enumerate(dict.fromkeys(labels))}
+        row_order   = sorted(range(len(constraints)), key=lambda row: rank[labels[row]])
+        new_row     = {row: i for i, row in enumerate(row_order)}
+        cell_order  = sorted(range(len(cells)), key=lambda i: (rank[labels[cell_rows[i][0]]], cells[i]))
+        constraints = [constraints[row] for row in row_order]
+        cells       = [cells[i] for i in cell_order]
+        cell_rows   = [sorted(new_row[row] for row in cell_rows[i]) for i in cell_order]
+        components  = [rank[labels[row]] for row in row_order]
+
+        num_cells = len(cells)
+        num_rows  = len(constraints)
+        num_other = max(num_unknown - num_cells, 0)
+
+        # The first constraint of each component, and how many cells each has
+        row_starts  = np.flatnonzero(np.diff(components, prepend=-1))
+        comp_cells  = np.bincount([components[rows[0]] for rows in cell_rows], minlength=len(row_starts))
+
+        # Each cell's constraints, padded with a dummy constraint num_rows that is never broken
+        width   = max(len(rows) for rows in cell_rows)
+        rows    = np.full((num_cells, width), num_rows, dtype=np.intp)
+        for i, members in enumerate(cell_rows):
+            rows[i, :len(members)] = members
+        padding = (rows == num_rows).sum(axis=1)[:, None]
+        targets = np.array([mines for _, mines in constraints], dtype=np.int8)
+
+        # For every number of mines k on the frontier: the log of the number of ways of spreading
+        # the rest off it, and how many mines too many or too few that leaves if there are none
+        k_range   = np.arange(num_cells + 1)
+        log_other = np.array([_log_comb(num_other, mines_left - k) for k in k_range])
+        if not np.isfinite(log_other).any():
+            return None
+        log_other = np.where(np.isfinite(log_other), log_other, 0)
+        overflow  = np.maximum(k_range - mines_left, 0) + np.maximum(mines_left - k_range - num_other, 0)
+
+        row_cells = [[] for _ in constraints]
+        for i, members in enumerate(cell_rows):
+            for row in members:
+                row_cells[row].append(i)
+        colours = np.array(self._colour(cell_rows, row_cells))
+        classes = [np.flatnonzero(colours == colour) for colour in range(colours.max() + 1)]
+
+        # Start each cell with the average density its numbers ask for.  Arrays hold one column
+        # per chain, so that everything about one cell or constraint is contiguous.
+        rng     = np.random.default_rng(self.seed)
+        chains  = self.chains
+        density = np.array([sum(constraints[row][1] / len(constraints[row][0]) for row in members) / len(members)
+                            for members in cell_rows])
+        mines   = rng.random((num_cells, chains)) < density[:, None]
+
+        # How many mines too many (or too few) each chain has for each constraint
+        broken = np.zeros((num_rows + 1, chains), dtype=np.int8)
+        for j in range(width):
+            np.add.at(broken, rows[:, j], mines.view(np.int8))
+        broken[:num_rows] -= targets[:, None]
+        broken[num_rows]   = 0
+        on_frontier = mines.sum(axis=0)
+
+        mine_tally = np.zeros(num_cells, dtype=np.int64)
+        comp_tally = np.zeros(len(row_starts), dtype=np.int64)
+        soft_tally = np.zeros(num_cells, dtype=np.int64)
+        sweeps     = 0
+        while True:
+            for members in classes:
+                members_rows = rows[members]
+
+                # Change in penalty and weight of flipping each cell, in every chain.  Flipping
+                # always puts the dummy constraint out by one, hence the padding.
+                change = 1 - 2 * mines[members].view(np.int8)
+                before = broken[members_rows]
+                worse  = (np.abs(before + change[:, None, :]) - np.abs(before)).sum(axis=1) - padding[members]
+                k      = on_frontier + change
+                log_odds = (log_other[k] - log_other[on_frontier]
+                            - self.penalty * (worse + overflow[k] - overflow[on_frontier]))
+
+                # Resample each cell given the rest: flip it with probability e^x / (1 + e^x).
+                # No two cells of a colour share a constraint, so the updates don't collide,
+                # other than in the dummy constraint.
+                flip   = rng.random(change.shape) < 0.5 * (1 + np.tanh(0.5 * log_odds))
+                change = change * flip
+                mines[members]        ^= flip
+                broken[members_rows]  += change[:, None, :]
+                broken[num_rows]       = 0
+                on_frontier           += change.sum(axis=0)
+
+            sweeps += 1
+
+            # Count every component that agrees with all of its numbers as a sample
+            valid       = np.add.reduceat(np.abs(broken[:num_rows]), row_starts, axis=0) == 0
+            mine_tally += (mines & np.repeat(valid, comp_cells, axis=0)).sum(axis=1)
+            comp_tally += valid.sum(axis=1)
+            soft_tally += mines.sum(axis=1)
+
+            if self.samples and comp_tally.min() >= self.samples:
+                break
+            if self.time_budget is not None and time.perf_counter() - start >= self.time_budget:
+                break
+            if self.max_sweeps is not None and sweeps >= self.max_sweeps:
+                break
+
+        self.last_sweeps  = sweeps
+        self.last_samples = int(comp_tally.min())
+
+        # Components that never agreed with all their numbers fall back on every layout the
+        # chains visited, which treats their numbers as a strong hint rather than a rule
+        samples   = np.repeat(comp_tally, comp_cells)
+        estimates = np.where(samples > 0, mine_tally / np.maximum(samples, 1), soft_tally / (sweeps * chains))
+        probabilities = dict(zip(cells, estimates.tolist()))
+
+        other = 0
+        if num_other > 0:
+            other = min(max((mines_left - estimates.sum()) / num_other, 0.0), 1.0)
+
+        return probabilities, other
@@ -0,0 +1,290 @@
+"""Hosts games of minesweeper for other processes to play, over TCP or a Unix socket.
+
+Every game lives in one asyncio event loop, so a server can hold thousands of them at once.
+Clients send one JSON object per line and get one back per line, in the same order.  Requests
+have an "op", and an optional "id" that is copied into the response so that clients can send
+several requests without waiting:
+
+    {"op": "new", "width": 30, "height": 16, "density": 0.2, "seed": 1}
+        Start a game.  seed may be omitted for a random board.  Boards of more than the
+        server's limit on cells (MAX_CELLS unless it was started with another) are refused.
+        -> {"game": 7, "width": 30, "height": 16, "bombs": 96}
+
+    {"op": "click", "game": 7, "x": 3, "y": 4}
+    {"op": "click", "game": 7, "cells": [[3, 4], [5, 6]]}
+        Reveal a cell, or a list of cells (stopping at the first bomb).
+
+    {"op": "flag", "game": 7, "x": 3, "y": 4}
+    {"op": "flag", "game": 7, "cells": [[3, 4], [5, 6]]}
+        Toggle the flag on a cell, or flag every cell in a list that isn't already.
+
+    {"op": "observe", "game": 7}
+    {"op": "observe", "game": 7, "full": true}
+        Fetch the changes made to the game since it was last responded about, or with full,
+        every flagged and revealed cell.
+
+    {"op": "close", "game": 7}
+        Stop the game.  Games are closed anyway when the connection that started them closes.
+
+Responses about a game give every change to it since the last response about it, as a list of
+[x, y, state] (state as returned by MineSweeperGame#cell: a number, "b" for a bomb, "f" for a
+flag or null for a hidden cell), along with the game's progress:
+
+    -> {"changes": [[3, 4, 1]], "finished": false, "won": false, "moves": 1}
+
+Anything that goes wrong gets {"error": "message"} in place of a result.
+
+The load generator in client.py plays MineSweeperAI against a server to measure it."""
+
+import argparse
+import asyncio
+import json
+import sys
+
+from .board import Board
+from .game import MineSweeperGame
+
+
+DEFAULT_PORT = 8642
+
+# The longest request line accepted, in bytes
+LINE_LIMIT = 2**20
+
+# The most cells a game's board may have unless told otherwise, so that one request can't have
+# the server allocate a board bigger than it can hold
+MAX_CELLS = 2**22
+
+# Wait for the client to read its responses once this many bytes are waiting to be sent
+WRITE_HIGH_WATER = 2**16
+
+
+class GameServer:
+    """Holds the games being played, and answers requests about them."""
+
+    def __init__(self, max_games=None, max_cells=MAX_CELLS):
+        """Create a server with no games.
+
+        Parameters:
+            max_games: The most games to host at once, None for no limit
+            max_cells: The most cells a game's board may have, None for no limit
+        """
+
+        self.max_games = max_games
+        self.max_cells = max_cells
+
+        # game id -> (game, list of changes not yet sent)
+        self.games   = {}
+        self.next_id = 0
+
+        self.requests_handled = 0
+
+    def _new(self, request):
+        width   = int(request["width"])
+        height  = int(request["height"])
+        density = float(request.get("density", 0.2))
+        if width <= 0 or height <= 0 or not 0 <= density <= 1:
+            raise ValueError("Bad board size or density")
+        if self.max_cells is not None and width * height > self.max_cells:
+            raise ValueError(f"Boards may have at most {self.max_cells} cells")
+        if self.max_games is not None and len(self.games) >= self.max_games:
+            raise ValueError("Too many games")
+
+        game    = MineSweeperGame(Board(width, height, density, seed=request.get("seed")))
+        changes = []
+        game.subscribe(changes.extend)
+
+        game_id = self.next_id
+        self.next_id += 1
+        self.games[game_id] = (game, changes)
+
+        return {"game": game_id, "width": width, "height": height, "bombs": game.num_bombs()}
+
+    @staticmethod
+    def _cells(game, request):
+        """The cells a request is about, as a list of (x, y) tuples."""
+
+        cells = [(int(x), int(y)) for x, y in request["cells"]] if "cells" in request \
+                else [(int(request["x"]), int(request["y"]))]
+        width, height = game.board_width(), game.board_height()
+        if not all(0 <= x < width and 0 <= y < height for x, y in cells):
+            raise ValueError("Cell off the board")
+
+        return cells
+
+    def handle(self, request, owned=None):
+        """Carry out one request and return the response, both as dicts.
+
+        Parameters:
+            request: The request, see the module docs
+            owned: A set of game ids to add new games to, for closing with their connection
+        """
+
+        self.requests_handled += 1
+        if not isinstance(request, dict):
+            raise ValueError("Requests must be JSON objects")
+        op = request.get("op")
+
+        if op == "new":
+            response = self._new(request)
+            if owned is not None:
+                owned.add(response["game"])
+            return response
+
+        game_id = request.get("game")
+        if game_id not in self.games:
+            raise ValueError(f"No game {game_id}")
+        game, changes = self.games[game_id]
+
+        if op == "click":
+            cells = self._cells(game, request)
+            if "cells" in request:
+                game.click_many(cells)
+            else:
+                game.click(*cells[0])
+        elif op == "flag":
+            cells = self._cells(game, request)
+            if "cells" in request:
+                game.flag_many(cells)
+            else:
+                game.toggle_flag(*cells[0])
+        elif op == "observe":
+            if request.get("full"):
+                changes[:] = [(x, y, game.cell(x, y)) for x, y in game.flags]
+                changes   += game.revealed_cell_tuples()
+        elif op == "close":
+            self.close_game(game_id)
+            if owned is not None:
+                owned.discard(game_id)
+            return {}
+        else:
+            raise ValueError(f"Unknown op {op!r}")
+
+        response = {"changes": changes[:], "finished": game.finished, "won": game.won,
+                    "moves": game.moves}
+        changes.clear()
+        return response
+
+    def handle_line(self, line, owned=None):
+        """Carry out a request given as a line of JSON, returning the response as one."""
+
+        request = None
+        try:
+            request  = json.loads(line)
+            response = self.handle(request, owned)
+        except KeyError as e:
+            response = {"error": f"Missing {e}"}
+        except (ValueError, TypeError) as e:
+            response = {"error": str(e) or type(e).__name__}
+
+        if isinstance(request, dict) and "id" in request:
+            response["id"] = request["id"]
+
+        return json.dumps(response, separators=(",", ":")).encode() + b"\n"
+
+    def close_game(self, game_id):
+        """Stop hosting a game."""
+
+        self.games.pop(game_id, None)
+
+    async def _serve_connection(self, reader, writer):
+        owned = set()
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except (ValueError, ConnectionError):
+                    break
+                if not line:
+                    break
+
+                writer.write(self.handle_line(line, owned))
+                if writer.transport.get_write_buffer_size() > WRITE_HIGH_WATER:
+                    await writer.drain()
+        finally:
+            for game_id in owned:
+                self.close_game(game_id)
+            writer.close()
+
+    async def start(self, host="127.0.0.1", port=DEFAULT_PORT, path=None):
+        """Start listening for connections, returning the asyncio Server.
+
+        Parameters:
+            host: The address to listen on, for TCP
+            port: The port to listen on, for TCP; 0 picks a free one
+            path: If given, listen on a Unix socket at this path instead of TCP
+        """
+
+        if path:
+            return await asyncio.start_unix_server(self._serve_connection, path, limit=LINE_LIMIT)
+        return await asyncio.start_server(self._serve_connection, host, port, limit=LINE_LIMIT)
+
+
+async def serve(host="127.0.0.1", port=DEFAULT_PORT, path=None, max_games=None, max_cells=MAX_CELLS):
+    """Run a GameServer until cancelled."""
+
+    server = await GameServer(max_games, max_cells).start(host, port, path)
+    async with server:
+        await server.serve_forever()
+
+
+def _size(text):
+    width, _, height = text.partition("x")
+    return int(width), int(height or width)
+
+
+def main(argv=None):
+    """Command line entry point: run a server, or a load generator against one."""
+
+    from .client import run_load
+
+    parser = argparse.ArgumentParser(description="Host minesweeper games over a socket")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    for name, help_text in (("serve", "host games until interrupted"),
+                            ("load", "play games with the AI against a server and report on it")):
+        command = commands.add_parser(name, help=help_text)
+        command.add_argument("--host", default="127.0.0.1", help="TCP address")
+        command.add_argument("--port", type=int, default=DEFAULT_PORT, help="TCP port")
+        command.add_argument("--unix", default=None, help="Unix socket path, instead of TCP")
+
+    serve_command = commands.choices["serve"]
+    serve_command.add_argument("--max-games", type=int, default=None,
+                               help="the most games to host at once")
+    serve_command.add_argument("--max-cells", type=int, default=MAX_CELLS,
+                               help="the most cells a game's board may have")
+
+    load_command = commands.choices["load"]
+    load_command.add_argument("--games", type=int, default=1000, help="how many games to play")
+    load_command.add_argument("--concurrency", type=int, default=100,
+                              help="how many games to play at once")
+    load_command.add_argument("--connections", type=int, default=8,
+                              help="how many connections to share the games between")
+    load_command.add_argument("--size", type=_size, default=(30, 16), help="board size, as WIDTHxHEIGHT")
+    load_command.add_argument("--density", type=float, default=0.2, help="bomb density, 0-1")
+    load_command.add_argument("--seed", type=int, default=0, help="the base seed")
+    load_command.add_argument("--heuristic", default="local", help="see MineSweeperAI")
+    load_command.add_argument("--local", action="store_true",
+                              help="start a server in this process rather than connecting to one")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "serve":
+        try:
+            asyncio.run(serve(args.host, args.port, args.unix, args.max_games, args.max_cells))
+        except KeyboardInterrupt:
+            pass
+        return 0
+
+    width, height = args.size
+    summary = asyncio.run(run_load(args.games, width, height, args.density, seed=args.seed,
+                                   concurrency=args.concurrency, connections=args.connections,
+                                   heuristic=args.heuristic, host=args.host, port=args.port,
+                                   path=args.unix, local=args.local))
+    for key, value in summary.items():
+        print(f"{key:>16}: {value:.2f}" if isinstance(value, float) else f"{key:>16}: {value}")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
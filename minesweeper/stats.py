@@ -0,0 +1,122 @@
+"""Optional timers and counters for finding out where the time goes in a game.
+
+Games and AIs are given a Stats object if asked for one, and the shared NO_STATS otherwise.
+Both have the same interface, but NO_STATS ignores everything it is told, so instrumented code
+doesn't need to check whether stats are on:
+
+    with self.stats.timer("heuristic"):
+        ...
+    self.stats.count("cells_scanned", len(cells))
+    self.stats.observe("revealed_per_click", revealed)
+
+Instrumentation is kept to once per phase (a move, a pass, a click) rather than once per cell,
+so that leaving it off costs next to nothing."""
+
+import time
+
+
+class _Timer:
+    """Context manager adding the time spent inside it to one of a Stats object's timers."""
+
+    __slots__ = ("timing", "start")
+
+    def __init__(self, timing):
+        self.timing = timing
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.timing[0] += 1
+        self.timing[1] += time.perf_counter() - self.start
+
+
+class _NullTimer:
+    """A context manager that does nothing, shared by every timer of NO_STATS."""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+class Stats:
+    """Timers, counters and distributions of values, recorded by name."""
+
+    enabled = True
+
+    def __init__(self):
+        # name -> [calls, seconds]
+        self.timings       = {}
+        # name -> total
+        self.counters      = {}
+        # name -> [count, total, min, max]
+        self.distributions = {}
+
+    def timer(self, name):
+        """A context manager that adds the time spent inside it to the named timer."""
+
+        timing = self.timings.get(name)
+        if timing is None:
+            timing = self.timings[name] = [0, 0.0]
+        return _Timer(timing)
+
+    def count(self, name, amount=1):
+        """Add amount to the named counter."""
+
+        self.counters[name] = self.counters.get(name, 0) + amount
+
+    def observe(self, name, value):
+        """Record one value of the named distribution, e.g. the cells revealed by one click."""
+
+        distribution = self.distributions.get(name)
+        if distribution is None:
+            self.distributions[name] = [1, value, value, value]
+        else:
+            distribution[0] += 1
+            distribution[1] += value
+            distribution[2]  = min(distribution[2], value)
+            distribution[3]  = max(distribution[3], value)
+
+    def as_dict(self):
+        """Return everything recorded as a dict of plain values, ready to be dumped as JSON."""
+
+        return {
+            "timers":        {name: {"calls": calls, "seconds": seconds}
+                              for name, (calls, seconds) in self.timings.items()},
+            "counters":      dict(self.counters),
+            "distributions": {name: {"count": count, "total": total, "mean": total / count,
+                                     "min": low, "max": high}
+                              for name, (count, total, low, high) in self.distributions.items()},
+        }
+
+
+class NullStats(Stats):
+    """Stats that records nothing, for when instrumentation is switched off."""
+
+    enabled = False
+
+    _null_timer = _NullTimer()
+
+    def timer(self, name):
+        return self._null_timer
+
+    def count(self, name, amount=1):
+        pass
+
+    def observe(self, name, value):
+        pass
+
+
+# Shared by everything that isn't recording stats
+NO_STATS = NullStats()
+
+
+def make_stats(enabled):
+    """Return a new Stats object if enabled is true, else NO_STATS."""
+
+    return Stats() if enabled else NO_STATS
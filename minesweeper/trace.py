@@ -0,0 +1,434 @@
+"""Records every move made in a game to a compact binary file, and plays the moves back.
+
+A trace holds what's needed to make the board again and the moves made on it, so a game can be
+replayed exactly, without the AI that played it: to reproduce a game that went wrong, or to time
+the game engine on its own.
+
+The file is a fixed-size header, then (only for boards with no seed to make them from) the
+board's bombs, then one fixed-size record per move:
+
+    magic      8 bytes   b"MSTRACE\\0"
+    version    uint32    currently 1
+    flags      uint32    bit 0 set if every record ends with a timestamp
+    width      uint32    the width of the board, in cells
+    height     uint32    the height of the board, in cells
+    source     uint32    how to make the board: one of the SOURCE_ constants below
+    chunk_size uint32    the chunk size of a ChunkedBoard, else 0
+    density    float64   the bomb density of the board
+    seed       int64     the seed of the board, or the base seed of a corpus if known, else -1
+    index      int64     with a seed, the board was made with the seed [seed, index] (as by
+                         run_batch), or just seed if this is -1; from a corpus, the board's index
+
+all little-endian.  SOURCE_BOMBS boards are followed by ceil(width * height / 8) bytes holding one
+bit per cell, row by row, least significant bit first, as in a corpus file.
+
+Each record is an op (uint8) and two coordinates, x and y, as uint16 if the board is no more than
+65536 cells across and down, else as uint32.  With timestamps, a uint32 follows: the microseconds
+since the record before.  Counts and other numbers too big for one coordinate are split across
+both, the low bits in x.
+
+    OP_CLICK        x, y                 MineSweeperGame#click
+    OP_FLAG         x, y                 MineSweeperGame#toggle_flag
+    OP_CLICK_MANY   count                MineSweeperGame#click_many, of the count OP_CELL
+    OP_FLAG_MANY    count                records that follow (and MineSweeperGame#flag_many)
+    OP_CELL         x, y                 one of the cells of a _MANY op
+    OP_SNAPSHOT     n                    MineSweeperGame#snapshot, numbered after the snapshots
+                                         still live (see below)
+    OP_RESTORE      n                    MineSweeperGame#restore to snapshot n
+    OP_FORGET                            MineSweeperGame#forget_snapshots
+    OP_END          moves << 2 | won << 1 | finished
+                                         How the game stood when the trace was ended, so that a
+                                         replay can be checked against it
+
+Restoring a snapshot drops every snapshot taken after it, and forgetting snapshots drops the lot,
+as the game does; the next snapshot is numbered after those left, so numbers count up from 0 again
+after OP_FORGET.
+
+Records are written to a buffer of bounded size and the buffer to the file whenever it fills, so
+tracing costs a little memory however long the game, and a trace cut short (say by a crash) still
+replays up to its last full buffer."""
+
+import argparse
+import numbers
+import struct
+import sys
+import time
+
+import numpy as np
+
+from .board import Board
+from .game import MineSweeperGame
+from .bitboard import BitboardGame
+from .chunked import ChunkedBoard, ChunkedGame
+from .corpus import BoardCorpus
+
+
+MAGIC   = b"MSTRACE\0"
+VERSION = 1
+HEADER  = struct.Struct("<8sIIIIIIdqq")
+
+# Bits of the header's flags
+TIMESTAMPS = 1
+
+# How to make the board again
+SOURCE_BOMBS   = 0
+SOURCE_SEED    = 1
+SOURCE_CORPUS  = 2
+SOURCE_CHUNKED = 3
+
+OP_CLICK      = 0
+OP_FLAG       = 1
+OP_CLICK_MANY = 2
+OP_FLAG_MANY  = 3
+OP_CELL       = 4
+OP_SNAPSHOT   = 5
+OP_RESTORE    = 6
+OP_FORGET     = 7
+OP_END        = 8
+
+# Write the buffer out once it holds this many bytes
+BUFFER_SIZE = 2**16
+
+
+def _coordinate_bits(width, height):
+    return 16 if max(width, height) <= 2**16 else 32
+
+
+def _record_format(coordinate_bits, timestamps):
+    return "<B" + ("HH" if coordinate_bits == 16 else "II") + ("I" if timestamps else "")
+
+
+def _record_dtype(coordinate_bits, timestamps):
+    coordinate = "<u2" if coordinate_bits == 16 else "<u4"
+    fields     = [("op", "u1"), ("x", coordinate), ("y", coordinate)]
+    if timestamps:
+        fields.append(("time", "<u4"))
+    return np.dtype(fields)
+
+
+class TraceWriter:
+    """Writes the moves made in a game to a trace file as they're made.
+
+    Pass one to a game as its trace (see MineSweeperGame) and the game records every move in
+    it; call #end once the game is over, and #close when done."""
+
+    def __init__(self, path, board, seed=None, corpus_index=None, density=None, corpus_seed=-1,
+                 timestamps=False, buffer_size=BUFFER_SIZE):
+        """Start a trace file for a game on the board given.
+
+        The board is identified by its seed or its place in a corpus if given, and otherwise
+        its bombs are written into the trace.
+
+        Parameters:
+            path: The file to write
+            board: The Board (or ChunkedBoard) to be played on
+            seed: The seed the board was made with: an int, or a pair of ints [seed, index] as
+                  used by run_batch.  None if not known, and other seeds (such as a SeedSequence
+                  or a Generator) are treated as unknown.  Needed for a ChunkedBoard.
+            corpus_index: The index of the board in a corpus, if it came from one; the corpus
+                          itself must be given to replay the trace
+            density: The bomb density of the board, needed with a seed to make it again from the
+                     seed; a ChunkedBoard's own is used if not given
+            corpus_seed: The base seed of the corpus, recorded for information, -1 if not known
+            timestamps: True to record the time of every move
+            buffer_size: Write to the file whenever this many bytes are waiting
+        """
+
+        width, height = board.width(), board.height()
+        chunk_size    = 0
+        bombs         = None
+        if corpus_index is not None:
+            source, base, index = SOURCE_CORPUS, corpus_seed, corpus_index
+        elif isinstance(seed, numbers.Integral):
+            source, base, index = SOURCE_SEED, seed, -1
+        elif (isinstance(seed, (list, tuple, np.ndarray)) and len(seed) == 2
+              and all(isinstance(part, numbers.Integral) for part in seed)):
+            source, (base, index) = SOURCE_SEED, seed
+        elif isinstance(board, ChunkedBoard):
+            raise ValueError("A ChunkedBoard can only be traced with its seed, an int or a pair of ints")
+        else:
+            source, base, index = SOURCE_BOMBS, -1, -1
+            bombs = np.packbits(board.bombs.ravel(), bitorder="little").tobytes()
+
+        if isinstance(board, ChunkedBoard):
+            source, chunk_size = SOURCE_CHUNKED, board.chunk_size
+            if density is None:
+                density = board.density
+        if source == SOURCE_SEED and density is None:
+            raise ValueError("The density of a board traced by its seed must be given, to make it again")
+
+        self.bits        = _coordinate_bits(width, height)
+        self.mask        = (1 << self.bits) - 1
+        self.record      = struct.Struct(_record_format(self.bits, timestamps))
+        self.timestamps  = timestamps
+        self.buffer_size = buffer_size
+        self.buffer      = bytearray()
+        self.last_time   = time.perf_counter()
+
+        # Tokens of the live snapshots given to #snapshot -> their number, for #restore to refer
+        # to, in the order they were taken
+        self.snapshots = {}
+
+        self.file = open(path, "wb")
+        self.file.write(HEADER.pack(MAGIC, VERSION, TIMESTAMPS if timestamps else 0, width, height,
+                                    source, chunk_size, density or 0.0, int(base), int(index)))
+        if bombs is not None:
+            self.file.write(bombs)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _write(self, op, x=0, y=0):
+        if self.timestamps:
+            now = time.perf_counter()
+            self.buffer += self.record.pack(op, x, y, min(int((now - self.last_time) * 1e6), 2**32 - 1))
+            self.last_time = now
+        else:
+            self.buffer += self.record.pack(op, x, y)
+
+        if len(self.buffer) >= self.buffer_size:
+            self.flush()
+
+    def _write_number(self, op, number):
+        self._write(op, number & self.mask, number >> self.bits)
+
+    def click(self, x, y):
+        self._write(OP_CLICK, x, y)
+
+    def toggle_flag(self, x, y):
+        self._write(OP_FLAG, x, y)
+
+    def click_many(self, cells):
+        self._write_number(OP_CLICK_MANY, len(cells))
+        for x, y in cells:
+            self._write(OP_CELL, x, y)
+
+    def flag_many(self, cells):
+        self._write_number(OP_FLAG_MANY, len(cells))
+        for x, y in cells:
+            self._write(OP_CELL, x, y)
+
+    def snapshot(self, token):
+        """Record a snapshot, keeping hold of its token so that #restore knows which it was."""
+
+        number = len(self.snapshots)
+        self.snapshots[id(token)] = (number, token)
+        self._write_number(OP_SNAPSHOT, number)
+
+    def restore(self, token):
+        """Record a restore, dropping the snapshots taken since the one restored: the game can't
+        restore them any more, and their tokens' ids may be reused."""
+
+        number = self.snapshots[id(token)][0]
+        while len(self.snapshots) > number + 1:
+            self.snapshots.popitem()
+        self._write_number(OP_RESTORE, number)
+
+    def forget_snapshots(self):
+        self._write(OP_FORGET)
+        self.snapshots.clear()
+
+    def end(self, game):
+        """Record how a game stands, for a replay to be checked against."""
+
+        self._write_number(OP_END, game.moves << 2 | game.won << 1 | game.finished)
+
+    def flush(self):
+        """Write out every record so far."""
+
+        self.file.write(self.buffer)
+        self.buffer.clear()
+
+    def close(self):
+        """Write out every record so far and close the file."""
+
+        if self.file.closed:
+            return
+        self.flush()
+        self.file.close()
+        self.snapshots.clear()
+
+
+class Trace:
+    """A trace file, read back in."""
+
+    def __init__(self, path):
+        """Read a trace file.
+
+        Parameters:
+            path: The file to read, as written by TraceWriter
+        """
+
+        with open(path, "rb") as handle:
+            data = handle.read()
+
+        (magic, version, flags, self.width, self.height, self.source, self.chunk_size, self.density,
+         self.seed, self.index) = HEADER.unpack_from(data, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a version {VERSION} move trace")
+
+        self.path       = path
+        self.timestamps = bool(flags & TIMESTAMPS)
+        self.bits       = _coordinate_bits(self.width, self.height)
+
+        offset     = HEADER.size
+        self.bombs = None
+        if self.source == SOURCE_BOMBS:
+            cells      = self.width * self.height
+            size       = (cells + 7) // 8
+            bits       = np.frombuffer(data, dtype=np.uint8, count=size, offset=offset)
+            self.bombs = np.unpackbits(bits, count=cells, bitorder="little").view(bool) \
+                           .reshape(self.height, self.width)
+            offset    += size
+
+        # Every whole record; a trace cut short may end part way through one
+        dtype        = _record_dtype(self.bits, self.timestamps)
+        count        = (len(data) - offset) // dtype.itemsize
+        self.records = np.frombuffer(data, dtype=dtype, count=count, offset=offset)
+
+    def __len__(self):
+        return len(self.records)
+
+    def _number(self, x, y):
+        return x | y << self.bits
+
+    def result(self):
+        """How the game stood when the trace was ended, as a dict with keys moves, won and
+        finished, or None if it never was."""
+
+        ends = np.flatnonzero(self.records["op"] == OP_END)
+        if not len(ends):
+            return None
+
+        record = self.records[ends[-1]]
+        value  = self._number(int(record["x"]), int(record["y"]))
+        return {"moves": value >> 2, "won": bool(value & 2), "finished": bool(value & 1)}
+
+    def seconds(self):
+        """The time from the start of the trace to its last record, or None without timestamps."""
+
+        if not self.timestamps:
+            return None
+        return self.records["time"].sum(dtype=np.int64) / 1e6
+
+    def board(self, corpus=None):
+        """Make the board the game was played on.
+
+        Parameters:
+            corpus: The BoardCorpus, or the path of the corpus file, the board came from, if it
+                    came from one
+        """
+
+        seed = self.seed if self.index == -1 else [self.seed, self.index]
+        if self.source == SOURCE_BOMBS:
+            return Board.from_bombs(self.bombs)
+        if self.source == SOURCE_SEED:
+            return Board(self.width, self.height, self.density, seed=seed)
+        if self.source == SOURCE_CHUNKED:
+            return ChunkedBoard(self.width, self.height, self.density, seed=seed,
+                                chunk_size=self.chunk_size)
+
+        if corpus is None:
+            raise ValueError(f"{self.path} was played on board {self.index} of a corpus, "
+                             "which must be given to replay it")
+        if isinstance(corpus, str):
+            corpus = BoardCorpus(corpus)
+        if (corpus.width, corpus.height) != (self.width, self.height):
+            raise ValueError("The corpus given holds boards of a different size to the trace's")
+        return corpus[self.index]
+
+    def game(self, corpus=None, bitboard=False):
+        """Make a new game on the board the trace was played on, ready to #replay."""
+
+        board = self.board(corpus)
+        if isinstance(board, ChunkedBoard):
+            return ChunkedGame(board)
+        return BitboardGame(board) if bitboard else MineSweeperGame(board)
+
+    def replay(self, game):
+        """Make every move of the trace on a game, as it was made.
+
+        Parameters:
+            game: A new game on the trace's board, e.g. from #game
+
+        Returns:
+            The game
+        """
+
+        records   = self.records[["op", "x", "y"]].tolist()
+        snapshots = {}
+        i = 0
+        while i < len(records):
+            op, x, y = records[i]
+            i += 1
+
+            if op == OP_CLICK:
+                game.click(x, y)
+            elif op == OP_FLAG:
+                game.toggle_flag(x, y)
+            elif op == OP_CLICK_MANY or op == OP_FLAG_MANY:
+                count = self._number(x, y)
+                cells = [(cx, cy) for _, cx, cy in records[i:i + count]]
+                i    += count
+                if op == OP_CLICK_MANY:
+                    game.click_many(cells)
+                else:
+                    game.flag_many(cells)
+            elif op == OP_SNAPSHOT:
+                snapshots[self._number(x, y)] = game.snapshot()
+            elif op == OP_RESTORE:
+                # Snapshots taken since the one restored are dropped, as they were when recorded
+                number = self._number(x, y)
+                game.restore(snapshots[number])
+                for later in [n for n in snapshots if n > number]:
+                    del snapshots[later]
+            elif op == OP_FORGET:
+                game.forget_snapshots()
+                snapshots.clear()
+
+        return game
+
+
+def main(argv=None):
+    """Command line entry point: replay trace files and check they come out as recorded."""
+
+    parser = argparse.ArgumentParser(description="Replay minesweeper move traces without the AI")
+    parser.add_argument("traces", nargs="+", help="the trace files to replay")
+    parser.add_argument("--corpus", default=None,
+                        help="the corpus file the boards came from, for traces of corpus boards")
+    parser.add_argument("--bitboard", action="store_true",
+                        help="replay on BitboardGames rather than MineSweeperGames")
+    parser.add_argument("--repeat", type=int, default=1,
+                        help="replay each trace this many times, for timing the game engine")
+    args = parser.parse_args(argv)
+
+    corpus   = BoardCorpus(args.corpus) if args.corpus else None
+    mismatch = 0
+    moves    = 0
+    seconds  = 0.0
+    for path in args.traces:
+        trace = Trace(path)
+        for _ in range(max(1, args.repeat)):
+            game  = trace.game(corpus, args.bitboard)
+            start = time.perf_counter()
+            trace.replay(game)
+            seconds += time.perf_counter() - start
+            moves   += game.moves
+
+        expected = trace.result()
+        replayed = {"moves": game.moves, "won": game.won, "finished": game.finished}
+        status   = "no result recorded" if expected is None else \
+                   "ok" if expected == replayed else f"MISMATCH, recorded {expected}"
+        mismatch += expected is not None and expected != replayed
+        print(f"{path}: {len(trace)} records, won? {game.won}, moves: {game.moves} ({status})")
+
+    print(f"{moves} moves replayed in {seconds:.3f}s ({moves / seconds if seconds else 0:.0f} moves/s)")
+
+    return 1 if mismatch else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -119,7 +119,7 @@ setup(
     #
     # For an analysis of "install_requires" vs pip's requirements files see:
     # https://packaging.python.org/en/latest/requirements.html
-    install_requires=['pygame>=2.0.0'],  # Optional
+    install_requires=['pygame>=2.0.0', 'numpy>=1.17'],  # Optional
 
     # List additional groups of dependencies here (e.g. development
     # dependencies). Users will be able to install these using the "extras"
@@ -144,6 +144,10 @@ setup(
     entry_points={  # Optional
         'console_scripts': [
             'minesweeper=minesweeper:interactive',
+            'minesweeper-benchmark=minesweeper.benchmark:main',
+            'minesweeper-corpus=minesweeper.corpus:main',
+            'minesweeper-server=minesweeper.server:main',
+            'minesweeper-replay=minesweeper.trace:main',
         ],
     },
 
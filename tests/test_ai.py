@@ -0,0 +1,132 @@
+"""Tests for MineSweeperAI."""
+
+import copy
+
+import numpy as np
+
+from minesweeper import Board, MineSweeperGame, BitboardGame, ChunkedBoard, ChunkedGame, MineSweeperAI
+
+
+def _played(cls=MineSweeperGame, size=60, revealed=1500, seed=4):
+    """A game part way through, with an AI that has been playing it."""
+
+    board = Board(size, size, 0.1, seed=seed)
+    game  = cls(board)
+    ai    = MineSweeperAI(game)
+    while game.revealed_count < revealed and not game.finished:
+        ai.move(max_actions=20)
+    assert not game.finished
+
+    return board, game, ai
+
+
+def _ai_state(ai):
+    """Everything the AI knows, copied for comparison."""
+
+    system = ai.constraint_system
+    return copy.deepcopy((ai.view, ai.frontier, ai.worklist, ai.unknown_count, ai.flag_count,
+                          ai.pending_flags, ai.pending_clicks,
+                          system.constraints, system.constraints_by_cell, system.rows,
+                          system.pivots, system.columns, system.dirty_constraints,
+                          system.dirty_rows, system.pending_rows, system.pending_values))
+
+
+def _unknown_cells(board, game):
+    return [(x, y) for y in range(board.height()) for x in range(board.width())
+            if not game.cell_revealed(x, y) and not game.cell_flagged(x, y)]
+
+
+def test_trial_restores_ai_without_rebuilding():
+    for cls in (MineSweeperGame, BitboardGame):
+        board, game, ai = _played(cls)
+        before  = _ai_state(ai)
+        numbers = [cell for cell in _unknown_cells(board, game) if board.cell(*cell) not in (0, "b")]
+
+        rebuilds = []
+        rebuild  = ai._rebuild_constraints
+        ai._rebuild_constraints = lambda: rebuilds.append(1) or rebuild()
+
+        for cell in numbers[:20]:
+            with game.trial():
+                game.click(*cell)
+                # The AI's journal holds what changed, not what it knows
+                assert len(ai.journal) < 20
+            assert _ai_state(ai) == before
+
+        assert rebuilds == []
+        assert ai.journal is None and ai.constraint_system.journal is None
+
+
+def test_rollouts_leave_ai_as_it_was():
+    board, game, ai = _played()
+    before  = _ai_state(ai)
+    unknown = _unknown_cells(board, game)
+
+    for cell in unknown[:10]:
+        with game.trial():
+            game.click(*cell)
+            with game.trial():
+                ai.move(max_actions=5)
+            ai.move()
+        assert _ai_state(ai) == before
+
+
+def test_trials_do_not_change_play():
+    results = []
+    for lookahead in (False, True):
+        board = Board(30, 30, 0.15, seed=7)
+        game  = MineSweeperGame(board)
+        ai    = MineSweeperAI(game, heuristic="exact")
+        while not game.finished:
+            if lookahead:
+                for cell in _unknown_cells(board, game)[:3]:
+                    with game.trial():
+                        game.click(*cell)
+                        if not game.finished:
+                            ai.move(max_actions=3)
+            ai.move(max_actions=7)
+        results.append((game.won, game.moves, game.flags))
+
+    assert results[0] == results[1]
+
+
+def test_probability_map_on_a_huge_board():
+    # 10^10 cells: a map with an entry for every cell would need tens of gigabytes
+    for heuristic in ("local", "exact", "sampled"):
+        game = ChunkedGame(ChunkedBoard(100000, 100000, 0.1, seed=1))
+        ai   = MineSweeperAI(game, heuristic=heuristic)
+        ai.sampler.time_budget = 0.01
+        for _ in range(5):
+            ai.move(max_actions=50)
+        assert not game.finished
+        estimates = ai.probability_map
+        assert estimates is not None
+
+        # The overlay draws a window of the map over the part of the board in view
+        columns = np.arange(49900, 50100)
+        rows    = np.arange(49900, 50100)
+        window  = estimates.window(columns, rows)
+        assert window.shape == (200, 200)
+        for cell, p in estimates.probabilities.items():
+            y, x = divmod(cell, 100000)
+            assert estimates.estimate(x, y) == p
+            if x in columns and y in rows:
+                assert window[y - 49900, x - 49900] == p
+        assert np.count_nonzero(window == estimates.other) >= 200 * 200 - len(estimates.probabilities)
+
+
+def test_heuristic_with_every_number_satisfied_by_flags():
+    # A number whose mines are all flagged says nothing about the cells left around it
+    board = Board(6, 6, 0.2, seed=2)
+    x, y  = next((x, y) for y in range(1, 5) for x in range(1, 5)
+                 if not board.is_bomb(x, y) and board.cell(x, y) == 1)
+    game  = MineSweeperGame(board)
+    ai    = MineSweeperAI(game)
+    game.click(x, y)
+    game.toggle_flag(x - 1, y - 1)
+
+    # As if the number had reached the frontier but not yet been acted on
+    ai._resync()
+    ai.frontier |= ai.worklist
+    assert ai._move_heuristic()
+    assert game.moves == 3
@@ -0,0 +1,22 @@
+"""Tests for the batched engine."""
+
+from minesweeper import Board, MineSweeperGame, MineSweeperAI, BatchedGames, BatchedAI
+from minesweeper.batched import simulate
+
+
+def test_plays_as_the_scalar_ai_does():
+    for seed, density in ((1, 0.1), (2, 0.15), (3, 0.2)):
+        games = BatchedGames.generate(30, 16, 16, density, seed=seed)
+        BatchedAI(games).play()
+
+        won = []
+        for i in range(30):
+            game = MineSweeperGame(Board(16, 16, density, seed=[seed, i]))
+            ai   = MineSweeperAI(game, linear_deduction=False)
+            while not game.finished:
+                ai.move()
+            won.append(game.won)
+
+        assert games.won.tolist() == won
+        assert 0 < sum(won) < 30
+        assert simulate(30, 16, 16, density, seed=seed)["wins"] == sum(won)
@@ -0,0 +1,40 @@
+"""Tests for lazily generated chunked boards."""
+
+import numpy as np
+
+from minesweeper import ChunkedBoard
+from minesweeper.board import BOMB
+
+
+def test_same_board_whatever_order_chunks_are_made_in():
+    width, height = 70, 45
+    cells = [(x, y) for y in range(height) for x in range(width)]
+    order = np.random.default_rng(1).permutation(len(cells)).tolist()
+
+    boards = [ChunkedBoard(width, height, 0.2, seed=[7, 3], chunk_size=16) for _ in range(3)]
+    first  = [boards[0].cell(x, y) for x, y in cells]
+    boards[1].num_bombs()
+    second = {cells[i]: boards[1].cell(*cells[i]) for i in order}
+    third  = {cells[i]: boards[2].is_bomb(*cells[i]) for i in reversed(order)}
+
+    assert first == [second[cell] for cell in cells]
+    assert [value == BOMB for value in first] == [third[cell] for cell in cells]
+    assert boards[0].num_chunks_generated() == 5 * 3
+
+    # The numbers agree with the bombs, across the edges of chunks too
+    board = boards[0]
+    for x, y in cells:
+        if first[y * width + x] != BOMB:
+            assert first[y * width + x] == sum(board.is_bomb(x + dx, y + dy)
+                                               for dx in (-1, 0, 1) for dy in (-1, 0, 1))
+    assert board.num_bombs() == sum(value == BOMB for value in first)
+
+
+def test_chunks_are_only_made_when_looked_at():
+    board = ChunkedBoard(10**6, 10**6, 0.2, seed=1)
+    assert board.num_chunks_generated() == 0
+
+    board.cell(500000, 500000)
+    assert board.num_chunks_generated() == 1
+    # The chunk's cells needed its neighbours' bombs, but not their cells
+    assert len(board.bomb_chunks) == 9
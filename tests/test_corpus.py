@@ -0,0 +1,43 @@
+"""Tests for board corpus files."""
+
+import pytest
+
+from minesweeper import Board, BoardCorpus
+from minesweeper.corpus import HEADER, generate_corpus, write_corpus
+
+
+def test_boards_come_back_as_written(tmp_path):
+    path = tmp_path / "boards.msc"
+    generate_corpus(str(path), 5, 13, 7, 0.2, seed=9)
+
+    with BoardCorpus(str(path)) as corpus:
+        assert len(corpus) == 5
+        assert (corpus.width, corpus.height, corpus.density, corpus.seed) == (13, 7, 0.2, 9)
+        for i, board in enumerate(corpus):
+            expected = Board(13, 7, 0.2, seed=[9, i])
+            assert (board.bombs == expected.bombs).all()
+            assert (board.counts == expected.counts).all()
+        assert (corpus[3].bombs == Board(13, 7, 0.2, seed=[9, 3]).bombs).all()
+
+
+def test_writing_checks_the_boards(tmp_path):
+    with pytest.raises(ValueError):
+        write_corpus(str(tmp_path / "mixed.msc"), [Board(5, 5, seed=1), Board(6, 5, seed=2)])
+    with pytest.raises(ValueError):
+        write_corpus(str(tmp_path / "empty.msc"), [])
+
+
+def test_reading_checks_the_header(tmp_path):
+    path = tmp_path / "boards.msc"
+    generate_corpus(str(path), 3, 10, 10, 0.2, seed=1)
+    data = path.read_bytes()
+
+    bad = {"empty":     b"",
+           "short":     data[:HEADER.size - 1],
+           "magic":     b"NOTBOARD" + data[8:],
+           "version":   data[:8] + (2).to_bytes(4, "little") + data[12:],
+           "truncated": data[:-1]}
+    for name, contents in bad.items():
+        (tmp_path / name).write_bytes(contents)
+        with pytest.raises(ValueError):
+            BoardCorpus(str(tmp_path / name))
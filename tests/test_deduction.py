@@ -0,0 +1,116 @@
+"""Tests for the linear constraint system."""
+
+import copy
+
+import numpy as np
+
+from minesweeper import Board
+from minesweeper.deduction import ConstraintSystem
+
+
+def _state(system):
+    """Everything the system holds, copied for comparison."""
+
+    return copy.deepcopy((system.constraints, system.constraints_by_cell, system.rows, system.pivots,
+                          system.columns, system.dirty_constraints, system.dirty_rows,
+                          system.pending_rows, system.pending_values))
+
+
+def _reveal(system, board, known, x, y):
+    """Reveal the safe cell x, y to the system, as the AI does: substitute it out, then add the
+    constraint its number gives about the cells around it not yet known."""
+
+    width, height = board.width(), board.height()
+    i = y * width + x
+    known[i] = 0
+    system.set_value(i, 0)
+
+    unknowns, mines = [], board.cell(x, y)
+    for dx in (-1, 0, 1):
+        for dy in (-1, 0, 1):
+            if 0 <= x + dx < width and 0 <= y + dy < height:
+                j = (y + dy) * width + x + dx
+                if j not in known:
+                    unknowns.append(j)
+                elif known[j] == 1:
+                    mines -= 1
+    system.add(i, unknowns, mines)
+
+
+def test_classic_patterns():
+    # 1-2-1 along a wall, over cells 0-4: the pairwise rule pins the two mines and the ends, and
+    # substituting those in pins the middle
+    system = ConstraintSystem()
+    system.add("a", [0, 1, 2], 1)
+    system.add("b", [1, 2, 3], 2)
+    system.add("c", [2, 3, 4], 1)
+    assert system.deduce() == ({0, 4}, {1, 3})
+    for cell, value in ((0, 0), (1, 1), (3, 1), (4, 0)):
+        system.set_value(cell, value)
+    assert system.deduce() == ({2}, set())
+
+    # Only the sum of the first two constraints, taken from the third, pins cell 4
+    system = ConstraintSystem()
+    system.add("a", [0, 1], 1)
+    system.add("b", [2, 3], 1)
+    system.add("c", [0, 1, 2, 3, 4], 2)
+    assert system.deduce() == ({4}, set())
+
+
+def test_deductions_are_sound():
+    found = 0
+    for seed in range(20):
+        board  = Board(16, 16, 0.2, seed=seed)
+        rng    = np.random.default_rng(seed)
+        system = ConstraintSystem()
+        known  = {}
+
+        safe = [(x, y) for y in range(16) for x in range(16) if not board.is_bomb(x, y)]
+        for k in rng.permutation(len(safe))[:60].tolist():
+            x, y = safe[k]
+            if y * 16 + x not in known:
+                _reveal(system, board, known, x, y)
+
+            safe_cells, mines = system.deduce()
+            assert not any(board.bombs.flat[i] for i in safe_cells)
+            assert all(board.bombs.flat[i] for i in mines)
+            found += len(safe_cells) + len(mines)
+
+            # Act on what was found, as the AI would
+            for i in mines - known.keys():
+                known[i] = 1
+                system.set_value(i, 1)
+            for i in sorted(safe_cells - known.keys()):
+                _reveal(system, board, known, i % 16, i // 16)
+
+    assert found > 100
+
+
+def test_restore_brings_back_the_earlier_system():
+    board  = Board(20, 20, 0.2, seed=3)
+    safe   = [(x, y) for y in range(20) for x in range(20) if not board.is_bomb(x, y)]
+    rng    = np.random.default_rng(3)
+    order  = [safe[k] for k in rng.permutation(len(safe)).tolist()]
+    system = ConstraintSystem()
+    known  = {}
+    for x, y in order[:80]:
+        _reveal(system, board, known, x, y)
+    system.deduce()
+    for x, y in order[80:90]:
+        _reveal(system, board, known, x, y)
+
+    before   = _state(system)
+    snapshot = system.snapshot()
+    for rest in (order[90:100], order[100:140]):
+        trial = dict(known)
+        for x, y in rest:
+            if y * 20 + x not in trial:
+                _reveal(system, board, trial, x, y)
+            system.deduce()
+        system.restore(snapshot)
+        assert _state(system) == before
+    system.forget_snapshots()
+
+    # And it carries on as if the trials never happened
+    fresh = copy.deepcopy(system)
+    assert system.deduce() == fresh.deduce()
@@ -0,0 +1,81 @@
+"""Tests for MineSweeperGame and the games built on it."""
+
+import numpy as np
+
+from minesweeper import Board, MineSweeperGame, BitboardGame, ChunkedBoard, ChunkedGame
+from minesweeper.game import OBSERVED_UNKNOWN, OBSERVED_FLAGGED
+
+
+def test_flags_off_the_board_are_ignored():
+    for game in (MineSweeperGame(Board(10, 10, 0.2, seed=1)),
+                 BitboardGame(Board(10, 10, 0.2, seed=1)),
+                 ChunkedGame(ChunkedBoard(10, 10, 0.2, seed=1, chunk_size=4))):
+        for x, y in ((-1, 0), (10, 3), (0, 10), (0, -1)):
+            assert game.toggle_flag(x, y) == []
+        assert game.flag_many([(-1, -1), (10, 0), (1, 1)]) == [(1, 1, "f")]
+
+        assert game.flags == {(1, 1)}
+        assert game.moves == 1
+        if game.observation is not None:
+            assert (game.observation == OBSERVED_UNKNOWN).sum() == 99
+
+
+def _reference_fill(board, revealed, x, y):
+    """The cells a click on x, y reveals, found a cell at a time as the original game did: every
+    cell reached is revealed, and 0s spread to the cells around them, but nothing spreads through
+    a cell already revealed."""
+
+    width, height = board.width(), board.height()
+    new   = set()
+    stack = [(x, y)]
+    while stack:
+        x, y = stack.pop()
+        if x < 0 or y < 0 or x >= width or y >= height or (x, y) in revealed or (x, y) in new:
+            continue
+        new.add((x, y))
+        if not board.is_bomb(x, y) and board.cell(x, y) == 0:
+            stack.extend((x + dx, y + dy) for dx in (-1, 0, 1) for dy in (-1, 0, 1))
+
+    return new
+
+
+def test_clicks_reveal_what_a_cell_by_cell_fill_would():
+    for cls in (MineSweeperGame, BitboardGame):
+        for size, density, seed in ((12, 0.15, 1), (40, 0.05, 2), (60, 0.02, 3), (50, 0.2, 4)):
+            board = Board(size, size, density, seed=seed)
+            game  = cls(board)
+            rng   = np.random.default_rng(seed)
+            cells = [(x, y) for y in range(size) for x in range(size)]
+
+            # Changes are built differently for observers, so watch half the games
+            observed = []
+            if seed % 2:
+                game.subscribe(observed.append)
+
+            revealed, flags = set(), set()
+            for _ in range(40):
+                unknown = [cell for cell in cells if cell not in revealed]
+                x, y    = unknown[rng.integers(len(unknown))]
+                if rng.random() < 0.4:
+                    game.toggle_flag(x, y)
+                    flags ^= {(x, y)}
+                    continue
+                if (x, y) in flags or board.is_bomb(x, y):
+                    continue
+
+                new = _reference_fill(board, revealed, x, y)
+                revealed |= new
+                changes = game.click(x, y)
+                assert sorted(changes) == sorted((cx, cy, board.cell(cx, cy)) for cx, cy in new
+                                                 if (cx, cy) not in flags)
+                assert game.revealed_count == len(revealed)
+                if seed % 2:
+                    assert observed.pop() == list(changes)
+
+                expected = np.full((size, size), OBSERVED_UNKNOWN, dtype=np.int8)
+                for cx, cy in revealed:
+                    expected[cy, cx] = board.cell(cx, cy)
+                for cx, cy in flags:
+                    expected[cy, cx] = OBSERVED_FLAGGED
+                assert (game.observation == expected).all()
+                assert all(game.cell_revealed(cx, cy) == ((cx, cy) in revealed) for cx, cy in cells)
@@ -0,0 +1,84 @@
+"""Tests for the exact probability engine."""
+
+import itertools
+import math
+
+import numpy as np
+import pytest
+
+from minesweeper import Board
+from minesweeper.probability import ProbabilityEngine
+
+
+def _frontier(seed):
+    """The constraints from some revealed safe cells of a small random board, with the number of
+    unknown cells and mines on it."""
+
+    rng      = np.random.default_rng(seed)
+    board    = Board(7, 6, 0.25, seed=seed)
+    safe     = [(x, y) for y in range(6) for x in range(7) if not board.is_bomb(x, y)]
+    picked   = rng.choice(len(safe), size=rng.integers(2, 9), replace=False)
+    revealed = {safe[i] for i in picked.tolist()}
+
+    constraints = []
+    for x, y in revealed:
+        unknowns = [(x + dx, y + dy) for dx in (-1, 0, 1) for dy in (-1, 0, 1)
+                    if 0 <= x + dx < 7 and 0 <= y + dy < 6 and (x + dx, y + dy) not in revealed]
+        constraints.append((unknowns, board.cell(x, y)))
+
+    return constraints, 7 * 6 - len(revealed), int(board.bombs.sum())
+
+
+def _brute_force(constraints, num_unknown, mines_left):
+    """The same probabilities as ProbabilityEngine#probabilities, by weighing every arrangement of
+    mines on the constrained cells by the ways to put the rest on the unconstrained ones."""
+
+    cells     = sorted({cell for members, _ in constraints for cell in members})
+    num_other = num_unknown - len(cells)
+    total, other, tallies = 0, 0, dict.fromkeys(cells, 0)
+    for mines in itertools.product((0, 1), repeat=len(cells)):
+        arrangement = dict(zip(cells, mines))
+        if any(sum(arrangement[cell] for cell in members) != count for members, count in constraints):
+            continue
+        k = sum(mines)
+        if not 0 <= mines_left - k <= num_other:
+            continue
+        weight = math.factorial(num_other) // math.factorial(mines_left - k) // math.factorial(num_other - mines_left + k)
+        total += weight
+        other += weight * (mines_left - k)
+        for cell in cells:
+            tallies[cell] += weight * arrangement[cell]
+
+    if total == 0:
+        return None
+    return {cell: tally / total for cell, tally in tallies.items()}, \
+           (other / total / num_other if num_other else 0)
+
+
+def test_matches_brute_force():
+    engine = ProbabilityEngine()
+    tested = 0
+    for seed in range(300):
+        constraints, num_unknown, mines_left = _frontier(seed)
+        if len({cell for members, _ in constraints for cell in members}) > 14:
+            continue
+        tested += 1
+
+        expected = _brute_force(constraints, num_unknown, mines_left)
+        # Twice, the second time from the engine's cache of components
+        for _ in range(2):
+            probabilities, other = engine.probabilities(constraints, num_unknown, mines_left)
+            assert other == pytest.approx(expected[1])
+            assert probabilities.keys() == expected[0].keys()
+            for cell, p in probabilities.items():
+                assert p == pytest.approx(expected[0][cell])
+                if expected[0][cell] in (0, 1):
+                    assert p == expected[0][cell]
+
+    assert tested > 40
+
+
+def test_unsatisfiable_constraints():
+    engine = ProbabilityEngine()
+    assert engine.probabilities([([(0, 0), (1, 0)], 1), ([(0, 0)], 1), ([(1, 0)], 1)], 10, 3) is None
+    assert engine.probabilities([([(0, 0), (1, 0)], 2)], 10, 1) is None
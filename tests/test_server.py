@@ -0,0 +1,18 @@
+"""Tests for the game server."""
+
+import json
+
+from minesweeper import GameServer
+
+
+def _request(server, **request):
+    return json.loads(server.handle_line(json.dumps(request).encode()))
+
+
+def test_boards_too_big_are_refused():
+    server = GameServer()
+    assert "error" in _request(server, op="new", width=100000, height=100000)
+    assert not server.games
+
+    assert "error" in _request(GameServer(max_cells=100), op="new", width=11, height=10)
+    assert _request(GameServer(max_cells=100), op="new", width=10, height=10)["width"] == 10
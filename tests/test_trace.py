@@ -0,0 +1,68 @@
+"""Tests for move traces."""
+
+import numpy as np
+import pytest
+
+from minesweeper import Board, MineSweeperGame, BitboardGame, MineSweeperAI, Trace, TraceWriter
+
+
+def test_snapshots_are_dropped_and_replayed_as_recorded(tmp_path):
+    for bitboard in (False, True):
+        board  = Board(30, 30, 0.15, seed=2)
+        path   = tmp_path / f"game-{bitboard}.mstrace"
+        writer = TraceWriter(path, board, seed=2, density=0.15)
+        game   = (BitboardGame if bitboard else MineSweeperGame)(board, trace=writer)
+        ai     = MineSweeperAI(game)
+
+        live = 0
+        while not game.finished:
+            ai.move(max_actions=5)
+            unknown = [(x, y) for y in range(30) for x in range(30)
+                       if not game.cell_revealed(x, y) and not game.cell_flagged(x, y)]
+            outer = game.snapshot()
+            for cell in unknown[:4]:
+                with game.trial():
+                    game.click(*cell)
+                    live = max(live, len(writer.snapshots))
+                game.restore(outer)
+                assert len(writer.snapshots) == 1
+            game.forget_snapshots()
+            assert not writer.snapshots
+        writer.end(game)
+        writer.close()
+        assert live == 2
+
+        trace  = Trace(path)
+        replay = trace.replay(trace.game(bitboard=bitboard))
+        assert (replay.moves, replay.won) == (game.moves, game.won)
+        assert replay.flags == game.flags
+
+
+def _traced(path, board, **kwargs):
+    """Play a game on the board to the end with the AI, tracing it, and replay the trace."""
+
+    writer = TraceWriter(path, board, **kwargs)
+    game   = MineSweeperGame(board, trace=writer)
+    ai     = MineSweeperAI(game)
+    while not game.finished:
+        ai.move()
+    writer.end(game)
+    writer.close()
+
+    trace = Trace(path)
+    return game, trace.replay(trace.game())
+
+
+def test_seeds_of_every_kind(tmp_path):
+    seeds = [np.int64(5), [np.int64(5), 3], np.random.SeedSequence(5), np.random.default_rng(5)]
+    for i, seed in enumerate(seeds):
+        board        = Board(20, 20, 0.15, seed=seed)
+        game, replay = _traced(tmp_path / f"{i}.mstrace", board, seed=seed, density=0.15)
+        assert (replay.board.bombs == board.bombs).all()
+        assert (replay.moves, replay.won) == (game.moves, game.won)
+
+
+def test_seed_needs_density(tmp_path):
+    board = Board(20, 20, 0.15, seed=5)
+    with pytest.raises(ValueError):
+        TraceWriter(tmp_path / "game.mstrace", board, seed=5)